@@ -90,6 +90,37 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'backend.wsgi.application'
+ASGI_APPLICATION = 'backend.asgi.application'
+
+# Channel layer for the real-time gateway, and the cache holding presence,
+# story trays and recommendation feeds. The in-memory versions need no broker
+# but are private to one process: events only fan out within it and other
+# processes never see its cache writes or invalidations. Set REDIS_URL when
+# running more than one process (several workers or an ASGI and a WSGI server).
+if os.getenv('REDIS_URL'):
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [os.getenv('REDIS_URL')]},
+        }
+    }
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        }
+    }
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
 
 
 # Database
@@ -278,6 +309,16 @@ DEFAULT_MAX_DISTANCE = 50  # kilometers
 LOCATION_UPDATE_FREQUENCY = 'manual'  # manual, hourly, daily, realtime
 LOCATION_HISTORY_RETENTION_DAYS = 30
 
+# Recommendation feed cache (invalidated on location/preference/profile updates)
+RECOMMENDATION_CACHE_TTL = 15 * 60  # seconds
+
+# Payment webhook signatures (see webhook_utils); events of an unconfigured provider are rejected
+STRIPE_WEBHOOK_SECRET = os.getenv('STRIPE_WEBHOOK_SECRET', '')
+PAYPAL_API_BASE = os.getenv('PAYPAL_API_BASE', 'https://api-m.paypal.com')
+PAYPAL_CLIENT_ID = os.getenv('PAYPAL_CLIENT_ID', '')
+PAYPAL_CLIENT_SECRET = os.getenv('PAYPAL_CLIENT_SECRET', '')
+PAYPAL_WEBHOOK_ID = os.getenv('PAYPAL_WEBHOOK_ID', '')
+
 # API Documentation Configuration
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Bondah Dating API',
@@ -1,15 +1,15 @@
 from django.contrib import admin
 from .models import (
-    User, NewsletterSubscriber, PuzzleVerification, CoinTransaction, Waitlist, 
+    User, NewsletterSubscriber, NewsletterCampaign, PuzzleVerification, CoinTransaction, Waitlist, 
     EmailLog, Job, JobApplication, AdminUser, AdminOTP, TranslationLog,
     SocialAccount, DeviceRegistration, LocationHistory, UserMatch, LocationPermission,
     LivenessVerification, UserVerificationStatus, EmailVerification, PhoneVerification, UserRoleSelection,
-    UserInterest, UserProfileView, UserInteraction, SearchQuery, RecommendationEngine,
+    UserInterest, InterestTag, UserInterestTag, UserProfileView, UserInteraction, SearchQuery, RecommendationEngine,
     # Chat and Messaging Models (NEW)
     Chat, Message, VoiceNote, Call, ChatParticipant, ChatReport,
     # Social Feed and Story Models (NEW)
     Post, PostComment, PostInteraction, CommentInteraction, PostReport,
-    Story, StoryView, StoryReaction, PostShare, FeedSearch,
+    Story, StoryView, StoryReaction, PostShare, FeedSearch, Hashtag,
     # Live Session Models (NEW)
     LiveSession, LiveParticipant,
     # New Figma Features
@@ -61,9 +61,22 @@ class JobApplicationAdmin(admin.ModelAdmin):
 
 @admin.register(EmailLog)
 class EmailLogAdmin(admin.ModelAdmin):
-    list_display = ('email_type', 'recipient_email', 'is_sent', 'sent_at')
-    list_filter = ('email_type', 'is_sent', 'sent_at')
+    list_display = ('email_type', 'recipient_email', 'status', 'attempts', 'sent_at')
+    list_filter = ('email_type', 'status', 'sent_at')
     search_fields = ('recipient_email',)
+    
+    def get_exclude(self, request, obj=None):
+        # Never show OTP codes or verification/reset links
+        from .email_utils import SENSITIVE_EMAIL_TYPES
+        if obj is not None and obj.email_type in SENSITIVE_EMAIL_TYPES:
+            return ('message',)
+        return super().get_exclude(request, obj)
+
+@admin.register(NewsletterCampaign)
+class NewsletterCampaignAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'status', 'recipients_queued', 'created_at', 'completed_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('subject',)
 
 @admin.register(AdminUser)
 class AdminUserAdmin(admin.ModelAdmin):
@@ -233,6 +246,18 @@ class UserInterestAdmin(admin.ModelAdmin):
     search_fields = ('name',)
     ordering = ('name',)
 
+@admin.register(InterestTag)
+class InterestTagAdmin(admin.ModelAdmin):
+    list_display = ('name', 'created_at')
+    search_fields = ('name',)
+    ordering = ('name',)
+
+@admin.register(UserInterestTag)
+class UserInterestTagAdmin(admin.ModelAdmin):
+    list_display = ('user', 'tag', 'tag_type')
+    list_filter = ('tag_type',)
+    search_fields = ('user__email', 'tag__name')
+
 @admin.register(UserProfileView)
 class UserProfileViewAdmin(admin.ModelAdmin):
     list_display = ('viewer', 'viewed_user', 'source', 'viewed_at')
@@ -625,6 +650,12 @@ class FeedSearchAdmin(admin.ModelAdmin):
         })
     )
 
+@admin.register(Hashtag)
+class HashtagAdmin(admin.ModelAdmin):
+    list_display = ('name', 'usage_count', 'last_used_at', 'created_at')
+    search_fields = ('name',)
+    ordering = ('-usage_count',)
+
 
 # =============================================================================
 # LIVE SESSION ADMIN (NEW)
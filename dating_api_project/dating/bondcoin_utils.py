@@ -0,0 +1,146 @@
+"""
+Bondcoin ledger - atomic balance changes for tips, gifts, subscriptions and purchases
+
+Balances are never read, changed in Python and saved back. Every change is
+a single conditional UPDATE of bondcoin_balance with F() expressions, so
+concurrent requests cannot lose updates or spend the same coins twice:
+a debit only applies while the balance still covers it. Each balance change
+and its BondcoinTransaction rows are written in one database transaction.
+"""
+
+from collections import defaultdict
+from typing import Iterable, List, Tuple
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .models import BondcoinTransaction, User
+
+
+class InsufficientBondcoinsError(Exception):
+    """Raised when a debit exceeds the user's current balance"""
+
+    def __init__(self, required, balance):
+        self.required = required
+        self.balance = balance
+        super().__init__(f"Insufficient Bondcoins: {required} required, {balance} available")
+
+
+def get_balance(user_id) -> int:
+    """Current balance read from the database"""
+    return User.objects.filter(id=user_id).values_list('bondcoin_balance', flat=True).get()
+
+
+def debit(user, amount: int, transaction_type: str, description: str, **fields) -> BondcoinTransaction:
+    """
+    Take `amount` Bondcoins from the user if the balance covers it and record
+    the transaction. Raises InsufficientBondcoinsError otherwise.
+    """
+    with transaction.atomic():
+        _debit_balance(user.id, amount)
+        ledger_entry = BondcoinTransaction.objects.create(
+            user=user, transaction_type=transaction_type, amount=-amount,
+            description=description, status='completed', **fields
+        )
+        user.bondcoin_balance = get_balance(user.id)
+    return ledger_entry
+
+
+def credit(user, amount: int, transaction_type: str, description: str, **fields) -> BondcoinTransaction:
+    """
+    Add `amount` Bondcoins to the user and record the transaction
+    """
+    with transaction.atomic():
+        _credit_balances({user.id: amount})
+        ledger_entry = BondcoinTransaction.objects.create(
+            user=user, transaction_type=transaction_type, amount=amount,
+            description=description, status='completed', **fields
+        )
+        user.bondcoin_balance = get_balance(user.id)
+    return ledger_entry
+
+
+def complete_transaction(ledger_entry: BondcoinTransaction) -> bool:
+    """
+    Mark a pending transaction completed and apply its amount to the balance.
+    The status change is conditional, so the amount is applied at most once.
+    Returns whether this call completed it.
+    """
+    with transaction.atomic():
+        completed = BondcoinTransaction.objects.filter(id=ledger_entry.id).exclude(status='completed').update(
+            status='completed'
+        )
+        if not completed:
+            return False
+        if ledger_entry.amount < 0:
+            _debit_balance(ledger_entry.user_id, -ledger_entry.amount)
+        else:
+            _credit_balances({ledger_entry.user_id: ledger_entry.amount})
+    ledger_entry.status = 'completed'
+    return True
+
+
+def transfer(sender, transfers: Iterable[Tuple[User, int]], debit_type: str = 'spend',
+             credit_type: str = 'gift_received', description: str = 'Bondcoins') -> List[BondcoinTransaction]:
+    """
+    Move Bondcoins from the sender to one or more recipients in one database transaction:
+    one conditional debit of the total, one UPDATE crediting every recipient,
+    and one bulk INSERT of the debit and credit rows.
+    Raises InsufficientBondcoinsError (nothing applied) if the sender cannot cover the total.
+    """
+    transfers = [(recipient, amount) for recipient, amount in transfers if amount > 0]
+    if not transfers:
+        return []
+
+    amounts = defaultdict(int)
+    for recipient, amount in transfers:
+        amounts[recipient.id] += amount
+    total = sum(amounts.values())
+
+    # Touch rows in ascending user id order so opposing transfers cannot deadlock
+    lower = {user_id: amount for user_id, amount in amounts.items() if user_id < sender.id}
+    higher = {user_id: amount for user_id, amount in amounts.items() if user_id > sender.id}
+
+    with transaction.atomic():
+        _credit_balances(lower)
+        _debit_balance(sender.id, total)
+        _credit_balances(higher)
+        # A self-transfer nets out to no change
+        _credit_balances({sender.id: amounts[sender.id]} if sender.id in amounts else {})
+
+        ledger_entries = []
+        for recipient, amount in transfers:
+            ledger_entries.append(BondcoinTransaction(
+                user=sender, transaction_type=debit_type, amount=-amount, status='completed',
+                payment_method='bondcoin', description=f"{description} sent to {recipient.name}"
+            ))
+            ledger_entries.append(BondcoinTransaction(
+                user=recipient, transaction_type=credit_type, amount=amount, status='completed',
+                payment_method='bondcoin', description=f"{description} received from {sender.name}"
+            ))
+        BondcoinTransaction.objects.bulk_create(ledger_entries)
+        sender.bondcoin_balance = get_balance(sender.id)
+    return ledger_entries
+
+
+def _debit_balance(user_id, amount: int) -> None:
+    """Conditional decrement: applies only while the balance covers the amount"""
+    if amount <= 0:
+        return
+    debited = User.objects.filter(id=user_id, bondcoin_balance__gte=amount).update(
+        bondcoin_balance=F('bondcoin_balance') - amount
+    )
+    if not debited:
+        raise InsufficientBondcoinsError(amount, get_balance(user_id))
+
+
+def _credit_balances(amounts: dict) -> None:
+    """Increment many balances in one UPDATE: {user_id: amount}"""
+    amounts = {user_id: amount for user_id, amount in amounts.items() if amount}
+    if not amounts:
+        return
+    User.objects.filter(id__in=amounts).update(bondcoin_balance=F('bondcoin_balance') + Case(
+        *[When(id=user_id, then=Value(amount)) for user_id, amount in amounts.items()],
+        default=Value(0),
+        output_field=IntegerField()
+    ))
@@ -0,0 +1,155 @@
+"""
+Chat utilities - denormalized inbox state maintained at write time
+
+The chat list needs, per chat, the last message and the viewer's unread
+count. Instead of computing them per chat on every read, each new message
+updates Chat.last_message and bumps ChatParticipant.unread_count for the
+other participants, so the inbox is a fixed number of queries.
+
+Read receipts are a per-participant cursor, ChatParticipant.last_read_message:
+everything up to it has been read by that participant. Marking a chat read
+is a single-row update of the cursor, and a message's read state is derived
+from the other participants' cursors instead of being stored per message.
+"""
+
+from typing import List, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Chat, ChatParticipant, Message
+from .realtime_utils import broadcast_new_message, broadcast_read_receipt
+
+MESSAGE_PAGE_SIZE = 50
+MAX_MESSAGE_PAGE_SIZE = 100
+
+
+def add_chat_participants(chat, users) -> None:
+    """
+    Add users (or user ids) to a chat: the participants membership and their
+    ChatParticipant rows, which hold per-user inbox state
+    """
+    user_ids = [getattr(user, 'id', user) for user in users]
+    chat.participants.add(*user_ids)
+    ChatParticipant.objects.bulk_create(
+        [ChatParticipant(chat=chat, user_id=user_id) for user_id in user_ids],
+        ignore_conflicts=True
+    )
+
+
+def record_new_message(message) -> None:
+    """
+    Denormalize a newly created message into the inbox: make it the chat's
+    last message and count it as unread for every other active participant
+    """
+    with transaction.atomic():
+        # Never move last_message backwards if a newer message was recorded first
+        Chat.objects.filter(id=message.chat_id).filter(
+            Q(last_message_at__isnull=True) | Q(last_message_at__lte=message.timestamp)
+        ).update(last_message=message, last_message_at=message.timestamp)
+
+        recipients = ChatParticipant.objects.filter(chat_id=message.chat_id, is_active=True)
+        if message.sender_id:
+            recipients = recipients.exclude(user_id=message.sender_id)
+        recipients.update(unread_count=F('unread_count') + 1)
+
+    broadcast_new_message(message)
+
+
+def get_message_page(chat, since: Optional[int] = None, before: Optional[int] = None,
+                     limit: int = MESSAGE_PAGE_SIZE) -> Tuple[List[Message], bool]:
+    """
+    Get one page of a chat's messages relative to anchor message ids, keyed on
+    (timestamp, id) so it is a range scan of the (chat, timestamp) index:
+    - since: the oldest `limit` messages newer than `since` (incremental sync)
+    - before: the newest `limit` messages older than `before` (history paging)
+    Messages are returned oldest first, with whether more exist in that direction.
+    Raises Message.DoesNotExist if an anchor is not a message of this chat.
+    """
+    queryset = Message.objects.filter(chat=chat).select_related('sender', 'reply_to__sender')
+
+    if since is not None:
+        since_timestamp = Message.objects.filter(chat=chat, id=since).values_list('timestamp', flat=True).get()
+        queryset = queryset.filter(
+            Q(timestamp__gt=since_timestamp) | Q(timestamp=since_timestamp, id__gt=since)
+        )
+    if before is not None:
+        before_timestamp = Message.objects.filter(chat=chat, id=before).values_list('timestamp', flat=True).get()
+        queryset = queryset.filter(
+            Q(timestamp__lt=before_timestamp) | Q(timestamp=before_timestamp, id__lt=before)
+        )
+
+    if since is not None:
+        messages = list(queryset.order_by('timestamp', 'id')[:limit + 1])
+        has_more = len(messages) > limit
+        return messages[:limit], has_more
+
+    # Paging backwards: take the newest rows before the anchor, then restore display order
+    messages = list(queryset.order_by('-timestamp', '-id')[:limit + 1])
+    has_more = len(messages) > limit
+    return messages[:limit][::-1], has_more
+
+
+def get_read_cursors(chat) -> dict:
+    """
+    Get {user_id: (timestamp, message_id)} of every active participant's read
+    cursor, None for participants who have not read anything yet
+    """
+    return {
+        user_id: (timestamp, message_id) if message_id else None
+        for user_id, timestamp, message_id in ChatParticipant.objects.filter(
+            chat=chat, is_active=True
+        ).values_list('user_id', 'last_read_message__timestamp', 'last_read_message_id')
+    }
+
+
+def is_message_read(message, read_cursors: dict) -> bool:
+    """
+    Whether every participant other than the sender has read the message
+    """
+    cursors = [cursor for user_id, cursor in read_cursors.items() if user_id != message.sender_id]
+    position = (message.timestamp, message.id)
+    return bool(cursors) and all(cursor is not None and position <= cursor for cursor in cursors)
+
+
+def advance_read_cursor(chat, user, message) -> bool:
+    """
+    Move the user's read cursor forward to the message (never backwards) and
+    recount their unread messages after it, in one single-row UPDATE.
+    Returns whether the cursor moved.
+    """
+    unread_after = Message.objects.filter(chat=chat).filter(
+        Q(timestamp__gt=message.timestamp) | Q(timestamp=message.timestamp, id__gt=message.id)
+    ).exclude(sender=user).values('chat').annotate(count=Count('id')).values('count')
+
+    moved = ChatParticipant.objects.filter(chat=chat, user=user).filter(
+        Q(last_read_message__isnull=True) |
+        Q(last_read_message__timestamp__lt=message.timestamp) |
+        Q(last_read_message__timestamp=message.timestamp, last_read_message_id__lt=message.id)
+    ).update(
+        last_read_message=message,
+        last_seen_at=timezone.now(),
+        unread_count=Coalesce(Subquery(unread_after), 0)
+    ) > 0
+
+    if moved:
+        broadcast_read_receipt(message.chat_id, getattr(user, 'id', user), message.id)
+    return moved
+
+
+def mark_chat_read(chat, user, message_ids=None):
+    """
+    Acknowledge messages for a user: the cursor advances to the newest of the
+    given messages of this chat, or to the chat's last message when none are given.
+    Returns the message the cursor points at after the call (None if the chat is empty).
+    """
+    messages = Message.objects.filter(chat=chat)
+    if message_ids is not None:
+        messages = messages.filter(id__in=message_ids)
+    message = messages.only('id', 'timestamp').order_by('-timestamp', '-id').first()
+
+    if message is not None:
+        advance_read_cursor(chat, user, message)
+    return message
@@ -0,0 +1,67 @@
+"""
+Comment previews - the top few comments of each post on a page
+
+Posts render a bounded preview of their comments instead of every comment:
+the top COMMENT_PREVIEW_SIZE top-level comments of each post (most liked,
+then newest), picked for a whole page of posts with one window-function
+query (ROW_NUMBER() OVER (PARTITION BY post_id ...)). The full thread is
+served page by page by the post's cursor-paginated comment list.
+"""
+
+from typing import Iterable
+
+from django.conf import settings
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+COMMENT_PREVIEW_SIZE = getattr(settings, 'COMMENT_PREVIEW_SIZE', 3)
+MAX_COMMENT_PREVIEW_SIZE = 10
+
+
+def get_comment_previews(post_ids: Iterable[int], limit: int = COMMENT_PREVIEW_SIZE) -> dict:
+    """
+    The top `limit` active top-level comments of each post, in one query.
+    Returns {post_id: [comment, ...]} with every requested post present.
+    """
+    from .models import PostComment
+
+    post_ids = set(post_ids)
+    previews = {post_id: [] for post_id in post_ids}
+    if not post_ids or limit <= 0:
+        return previews
+
+    comments = PostComment.objects.filter(
+        post_id__in=post_ids, is_active=True, parent_comment__isnull=True
+    ).annotate(preview_rank=Window(
+        expression=RowNumber(),
+        partition_by=[F('post_id')],
+        order_by=[F('likes_count').desc(), F('created_at').desc(), F('id').desc()]
+    )).filter(preview_rank__lte=limit).select_related('author').order_by('post_id', 'preview_rank')
+
+    for comment in comments:
+        previews[comment.post_id].append(comment)
+    return previews
+
+
+def get_preview_size(context: dict) -> int:
+    """Preview size requested with ?comment_preview=N (0 disables), clamped to MAX_COMMENT_PREVIEW_SIZE"""
+    request = context.get('request')
+    try:
+        size = int(request.GET.get('comment_preview', COMMENT_PREVIEW_SIZE)) if request else COMMENT_PREVIEW_SIZE
+    except ValueError:
+        size = COMMENT_PREVIEW_SIZE
+    return max(0, min(size, MAX_COMMENT_PREVIEW_SIZE))
+
+
+def preload_comment_previews(context: dict, post_ids: Iterable[int]) -> None:
+    """Load the comment previews of a page of posts into a serializer context, skipping loaded posts"""
+    previews = context.setdefault('comment_previews', {})
+    missing = set(post_ids) - set(previews)
+    if missing:
+        previews.update(get_comment_previews(missing, get_preview_size(context)))
+
+
+def get_context_comment_preview(context: dict, post_id) -> list:
+    """Comment preview of one post from a serializer context, looked up if not preloaded"""
+    preload_comment_previews(context, [post_id])
+    return context['comment_previews'][post_id]
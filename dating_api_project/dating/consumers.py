@@ -0,0 +1,148 @@
+"""
+WebSocket consumers for the real-time gateway
+
+Clients connect to ws/realtime/?token=<access token> and then subscribe to
+the chats they have open:
+
+    {"action": "subscribe", "chat_id": 1}
+    {"action": "unsubscribe", "chat_id": 1}
+    {"action": "typing", "chat_id": 1, "is_typing": true}
+    {"action": "ping"}
+
+The server pushes message.created, chat.read and typing events for
+subscribed chats, and call.state events for the user's calls. An open
+connection counts as online presence; pings refresh the heartbeat, and the
+user goes offline when their last connection closes.
+"""
+
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+
+from .presence_utils import record_connect, record_disconnect, record_heartbeat
+from .realtime_utils import chat_group, user_group
+
+# Close codes (4000-4999 are application defined)
+CLOSE_UNAUTHORIZED = 4401
+
+
+@database_sync_to_async
+def get_user_from_token(token):
+    """
+    Resolve a user from a JWT access token, or a DRF auth token as fallback
+    """
+    from django.contrib.auth import get_user_model
+    from rest_framework.authtoken.models import Token
+    from rest_framework_simplejwt.exceptions import TokenError
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    User = get_user_model()
+    try:
+        user_id = AccessToken(token)['user_id']
+        return User.objects.get(id=user_id, is_active=True)
+    except (TokenError, KeyError, User.DoesNotExist):
+        pass
+
+    try:
+        return Token.objects.select_related('user').get(key=token, user__is_active=True).user
+    except Token.DoesNotExist:
+        return AnonymousUser()
+
+
+class TokenAuthMiddleware(BaseMiddleware):
+    """
+    Authenticate WebSocket connections from a `token` query parameter, since
+    browsers and most mobile clients cannot set headers on the handshake
+    """
+
+    async def __call__(self, scope, receive, send):
+        token = parse_qs(scope.get('query_string', b'').decode()).get('token', [None])[0]
+        scope['user'] = await get_user_from_token(token) if token else AnonymousUser()
+        return await super().__call__(scope, receive, send)
+
+
+class RealtimeConsumer(AsyncJsonWebsocketConsumer):
+    """
+    One connection per client: joins the user's group on connect and the
+    groups of the chats the client subscribes to
+    """
+
+    async def connect(self):
+        self.user = self.scope.get('user')
+        if self.user is None or not self.user.is_authenticated:
+            await self.close(code=CLOSE_UNAUTHORIZED)
+            return
+
+        self.chat_ids = set()
+        await self.channel_layer.group_add(user_group(self.user.id), self.channel_name)
+        await self.accept()
+        await database_sync_to_async(record_connect)(self.user.id)
+
+    async def disconnect(self, close_code):
+        user = getattr(self, 'user', None)
+        if user is None or not user.is_authenticated:
+            return
+        await self.channel_layer.group_discard(user_group(user.id), self.channel_name)
+        for chat_id in self.chat_ids:
+            await self.channel_layer.group_discard(chat_group(chat_id), self.channel_name)
+        await database_sync_to_async(record_disconnect)(user.id)
+
+    async def receive_json(self, content, **kwargs):
+        action = content.get('action') if isinstance(content, dict) else None
+
+        if action == 'ping':
+            await database_sync_to_async(record_heartbeat)(self.user.id)
+            await self.send_json({'type': 'pong'})
+            return
+
+        if action not in ('subscribe', 'unsubscribe', 'typing'):
+            await self.send_json({'type': 'error', 'message': 'Unknown action'})
+            return
+
+        try:
+            chat_id = int(content.get('chat_id'))
+        except (TypeError, ValueError):
+            await self.send_json({'type': 'error', 'message': 'chat_id is required'})
+            return
+
+        if action == 'subscribe':
+            if not await self.is_chat_participant(chat_id):
+                await self.send_json({'type': 'error', 'message': 'Chat not found', 'chat_id': chat_id})
+                return
+            self.chat_ids.add(chat_id)
+            await self.channel_layer.group_add(chat_group(chat_id), self.channel_name)
+            await self.send_json({'type': 'subscribed', 'chat_id': chat_id})
+
+        elif action == 'unsubscribe':
+            self.chat_ids.discard(chat_id)
+            await self.channel_layer.group_discard(chat_group(chat_id), self.channel_name)
+            await self.send_json({'type': 'unsubscribed', 'chat_id': chat_id})
+
+        elif action == 'typing':
+            # Typing state is ephemeral: fanned out to the chat, never stored
+            if chat_id not in self.chat_ids:
+                await self.send_json({'type': 'error', 'message': 'Not subscribed to chat', 'chat_id': chat_id})
+                return
+            await self.channel_layer.group_send(chat_group(chat_id), {
+                'type': 'realtime.event',
+                'event': {
+                    'type': 'typing',
+                    'chat_id': chat_id,
+                    'user_id': self.user.id,
+                    'is_typing': bool(content.get('is_typing', True)),
+                },
+            })
+
+    async def realtime_event(self, message):
+        """Forward an event published to one of this connection's groups"""
+        await self.send_json(message['event'])
+
+    @database_sync_to_async
+    def is_chat_participant(self, chat_id):
+        from .models import ChatParticipant
+        return ChatParticipant.objects.filter(
+            chat_id=chat_id, chat__is_active=True, user=self.user, is_active=True
+        ).exists()
@@ -0,0 +1,116 @@
+"""
+Counter utilities - atomic engagement counters
+
+Likes, shares, bonds, comments, story views and reactions used to be counted
+with a read-modify-write of the row on every request: concurrent requests
+lost updates, and every request on a hot post held that post's row lock
+until its own transaction ended.
+
+Each change is now a single UPDATE setting the column to max(0, column +
+delta) in the database (never read and written back in Python), run once
+the request's transaction commits. A rolled-back interaction is never
+counted, nothing is buffered in a process that could be killed, and a hot
+post's row is locked for that one statement only.
+
+Counters can still drift from the rows they count (bulk deletes and
+cascades skip the views), so recount_counters, run daily by the
+recount_counters management command, rebuilds them from the interaction,
+share, comment, view and reaction rows.
+"""
+
+from collections import defaultdict
+from typing import Dict
+
+from django.db import transaction
+from django.db.models import Count, F, Value
+from django.db.models.functions import Greatest
+
+# Counter columns kept up to date here, per model
+COUNTER_FIELDS = {
+    'Post': ('likes_count', 'comments_count', 'shares_count', 'bonds_count'),
+    'PostComment': ('likes_count',),
+    'Story': ('views_count', 'reactions_count'),
+}
+RECOUNT_BATCH_SIZE = 1000
+
+
+def increment_counter(model, obj_id, field: str, delta: int = 1) -> None:
+    """
+    Add delta to a counter column of one row, once the current transaction
+    commits (straight away outside a transaction)
+    """
+    if field not in COUNTER_FIELDS.get(model.__name__, ()):
+        raise ValueError(f'{model.__name__}.{field} is not a counter column')
+
+    transaction.on_commit(lambda: apply_counter_delta(model, obj_id, field, delta))
+
+
+def apply_counter_delta(model, obj_id, field: str, delta: int) -> int:
+    """One UPDATE: the counter column set to max(0, column + delta). Returns the number of rows updated."""
+    updated = model.objects.filter(id=obj_id).update(**{field: Greatest(F(field) + Value(delta), Value(0))})
+
+    if updated and model.__name__ == 'Post' and field in model.ENGAGEMENT_FIELDS:
+        # update() skips Post.save, so re-rank the post here
+        post = model.objects.only('id', 'created_at', *model.ENGAGEMENT_FIELDS).get(id=obj_id)
+        model.objects.filter(id=obj_id).update(rank_score=post.get_rank_score())
+    return updated
+
+
+def _count_by(queryset, key: str) -> Dict[int, int]:
+    return dict(queryset.values(key).annotate(total=Count('id')).order_by().values_list(key, 'total'))
+
+
+def _recount(model, actual: Dict[str, Dict[int, int]], extra_fields=()) -> int:
+    """Write the actual counts over every row of model whose counters differ. Returns the number of rows corrected."""
+    fields = list(actual)
+    changed = []
+    for obj in model.objects.only('id', *fields, *extra_fields).order_by('id').iterator(chunk_size=RECOUNT_BATCH_SIZE):
+        counts = {field: actual[field].get(obj.id, 0) for field in fields}
+        if any(getattr(obj, field) != count for field, count in counts.items()):
+            for field, count in counts.items():
+                setattr(obj, field, count)
+            changed.append(obj)
+
+    update_fields = fields
+    if model.__name__ == 'Post':
+        for post in changed:
+            post.rank_score = post.get_rank_score()
+        update_fields = fields + ['rank_score']
+    model.objects.bulk_update(changed, update_fields, batch_size=RECOUNT_BATCH_SIZE)
+    return len(changed)
+
+
+def recount_counters() -> Dict[str, int]:
+    """
+    Rebuild every counter column from the rows it counts.
+    Returns the number of rows corrected per model.
+    """
+    from .models import (
+        CommentInteraction, Post, PostComment, PostInteraction, PostShare, Story, StoryReaction, StoryView
+    )
+
+    interactions = defaultdict(dict)
+    rows = PostInteraction.objects.filter(interaction_type__in=['like', 'share', 'bond']).values(
+        'post_id', 'interaction_type'
+    ).annotate(total=Count('id')).order_by()
+    for row in rows:
+        interactions[row['interaction_type']][row['post_id']] = row['total']
+    shares = interactions['share']
+    for post_id, total in _count_by(PostShare.objects.all(), 'post_id').items():
+        shares[post_id] = shares.get(post_id, 0) + total
+
+    return {
+        'Post': _recount(Post, {
+            'likes_count': interactions['like'],
+            'comments_count': _count_by(PostComment.objects.filter(is_active=True), 'post_id'),
+            'shares_count': shares,
+            'bonds_count': interactions['bond'],
+        }, extra_fields=('created_at',)),
+        'PostComment': _recount(PostComment, {
+            'likes_count': _count_by(CommentInteraction.objects.filter(interaction_type='like'), 'comment_id'),
+        }),
+        'Story': _recount(Story, {
+            'views_count': _count_by(StoryView.objects.all(), 'story_id'),
+            'reactions_count': _count_by(StoryReaction.objects.all(), 'story_id'),
+        }),
+    }
@@ -0,0 +1,219 @@
+"""
+Outbound email queue - EmailLog rows delivered by a background worker
+
+Requests only insert a queued EmailLog row; delivery happens on the
+background 'email' job pool, so a request never waits on SMTP and a long
+campaign never holds the default pool's workers. The worker:
+
+- claims due emails in batches by leasing them (next_attempt_at moved past
+  the lease), so concurrent workers never send the same email twice
+- sends every batch over one open SMTP connection instead of connecting
+  per email; at most EMAIL_MAX_CONNECTIONS drains run per process, so a
+  burst of signups shares a connection
+- paces sends to EMAIL_RATE_LIMIT emails per second across the process, and
+  claims transactional emails ahead of newsletter campaign emails. The limit
+  is per process: N web workers send up to N x EMAIL_RATE_LIMIT per second,
+  so set it to the provider's rate divided by the number of processes
+- marks sent emails with one UPDATE per batch and retries failures with
+  exponential backoff up to EMAIL_MAX_ATTEMPTS
+
+Bodies of emails carrying secrets (OTP codes, verification and reset links)
+are only kept until the email is sent or given up on, then replaced with
+REDACTED_MESSAGE.
+
+Queued emails survive restarts: the send_queued_emails management command
+delivers anything a lost job left behind.
+"""
+
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import EmailLog
+from .task_utils import submit_pool_job
+
+logger = logging.getLogger(__name__)
+
+EMAIL_BATCH_SIZE = getattr(settings, 'EMAIL_BATCH_SIZE', 50)
+EMAIL_MAX_ATTEMPTS = getattr(settings, 'EMAIL_MAX_ATTEMPTS', 5)
+EMAIL_RETRY_BASE_DELAY = timedelta(seconds=getattr(settings, 'EMAIL_RETRY_BASE_DELAY', 60))
+EMAIL_RETRY_MAX_DELAY = timedelta(hours=1)
+# How long a claimed email is reserved for the worker sending it
+EMAIL_LEASE = timedelta(minutes=5)
+# Concurrent SMTP connections per process
+EMAIL_MAX_CONNECTIONS = getattr(settings, 'EMAIL_MAX_CONNECTIONS', 2)
+# Emails per second per process (the provider's send rate divided by the
+# number of processes); 0 disables pacing
+EMAIL_RATE_LIMIT = getattr(settings, 'EMAIL_RATE_LIMIT', 14)
+# Email types whose body holds a one-time secret
+SENSITIVE_EMAIL_TYPES = ('admin_otp', 'email_verification', 'password_reset')
+REDACTED_MESSAGE = '[redacted after delivery]'
+
+
+class _RateLimiter:
+    """Spaces calls evenly at `rate` per second across threads"""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self._next_slot = 0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+_drain_slots = threading.BoundedSemaphore(EMAIL_MAX_CONNECTIONS)
+_drain_requested = threading.Event()
+_rate_limiter = _RateLimiter(EMAIL_RATE_LIMIT)
+
+
+def queue_email(email_type: str, recipient_email: str, subject: str, message: str) -> EmailLog:
+    """
+    Queue an email for background delivery and return its log row.
+    Delivery starts once the current transaction commits.
+    """
+    email_log = EmailLog.objects.create(
+        email_type=email_type,
+        recipient_email=recipient_email,
+        subject=subject,
+        message=message,
+        status='queued'
+    )
+    request_delivery()
+    return email_log
+
+
+def request_delivery() -> None:
+    """Start delivering queued emails on the email job pool once the current transaction commits"""
+    submit_pool_job('email', deliver_queued_emails)
+
+
+def deliver_queued_emails(batch_size: int = EMAIL_BATCH_SIZE) -> int:
+    """
+    Send every queued email that is due. Returns the number sent.
+    If EMAIL_MAX_CONNECTIONS drains are already running in this process they
+    pick up the new emails instead of another connection being opened.
+    """
+    sent = 0
+    _drain_requested.set()
+    while _drain_requested.is_set():
+        if not _drain_slots.acquire(blocking=False):
+            return sent
+        try:
+            _drain_requested.clear()
+            sent += _drain(batch_size)
+        finally:
+            _drain_slots.release()
+    return sent
+
+
+def _drain(batch_size: int) -> int:
+    sent = 0
+    connection = None
+    try:
+        while True:
+            batch = claim_email_batch(batch_size)
+            if not batch:
+                return sent
+            if connection is None:
+                connection = get_connection(fail_silently=False)
+            sent += send_email_batch(batch, connection)
+    finally:
+        if connection is not None:
+            connection.close()
+
+
+def claim_email_batch(batch_size: int = EMAIL_BATCH_SIZE):
+    """
+    Lease a batch of due, queued emails to this worker and count the attempt
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            EmailLog.objects.select_for_update(skip_locked=True).filter(
+                Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now),
+                status='queued'
+            ).order_by(F('campaign').asc(nulls_first=True), 'id')[:batch_size]
+        )
+        if batch:
+            EmailLog.objects.filter(id__in=[email_log.id for email_log in batch]).update(
+                attempts=F('attempts') + 1,
+                next_attempt_at=now + EMAIL_LEASE
+            )
+    for email_log in batch:
+        email_log.attempts += 1
+    return batch
+
+
+def send_email_batch(batch, connection) -> int:
+    """
+    Send a claimed batch over one shared connection. Returns the number sent.
+    """
+    sent_ids = []
+    for email_log in batch:
+        email = EmailMessage(
+            subject=email_log.subject,
+            body=email_log.message,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[email_log.recipient_email],
+            connection=connection
+        )
+        try:
+            # open() is a no-op while connected; since the connection was
+            # already open, send_messages leaves it open for the next email
+            connection.open()
+            _rate_limiter.wait()
+            connection.send_messages([email])
+            sent_ids.append(email_log.id)
+        except Exception as e:
+            logger.warning('Email %s to %s failed (attempt %s): %s', email_log.id, email_log.recipient_email, email_log.attempts, e)
+            _record_failure(email_log, e)
+            # The server may have dropped the connection; reconnect on the next email
+            connection.close()
+
+    if sent_ids:
+        # sent_at holds the queue time until now (auto_now_add)
+        EmailLog.objects.filter(id__in=sent_ids).update(
+            status='sent', is_sent=True, sent_at=timezone.now(), error_message=None, next_attempt_at=None
+        )
+        redact_sensitive_emails(sent_ids)
+
+    campaign_ids = {email_log.campaign_id for email_log in batch if email_log.campaign_id}
+    if campaign_ids:
+        from .newsletter_utils import complete_finished_campaigns
+        complete_finished_campaigns(campaign_ids)
+    return len(sent_ids)
+
+
+def redact_sensitive_emails(email_ids) -> int:
+    """Drop the bodies of delivered or failed secret-carrying emails. Returns the number redacted."""
+    return EmailLog.objects.filter(
+        id__in=email_ids, email_type__in=SENSITIVE_EMAIL_TYPES, status__in=('sent', 'failed')
+    ).exclude(message=REDACTED_MESSAGE).update(message=REDACTED_MESSAGE)
+
+
+def _record_failure(email_log, error) -> None:
+    if email_log.attempts >= EMAIL_MAX_ATTEMPTS:
+        EmailLog.objects.filter(id=email_log.id).update(
+            status='failed', is_sent=False, error_message=str(error), next_attempt_at=None
+        )
+        redact_sensitive_emails([email_log.id])
+        return
+    delay = min(EMAIL_RETRY_BASE_DELAY * 2 ** (email_log.attempts - 1), EMAIL_RETRY_MAX_DELAY)
+    EmailLog.objects.filter(id=email_log.id).update(
+        error_message=str(error), next_attempt_at=timezone.now() + delay
+    )
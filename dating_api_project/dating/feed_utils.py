@@ -0,0 +1,197 @@
+"""
+Home feed - materialized timelines with hybrid fan-out and ranked pages
+
+A user follows the people they liked (or super liked) and their matches.
+New public posts are pushed into each follower's timeline (FeedEntry rows)
+on the background job pool: fan-out on write. Authors with at least
+FEED_FANOUT_THRESHOLD followers are not pushed, since one post would write
+that many rows; their recent posts are pulled into followers' feeds at read
+time instead: fan-out on read.
+
+The decision is recorded on the post: Post.fanned_out is set once a post
+has been pushed, and feeds pull every followed author's recent posts that
+were not, whoever the author is now. A post is therefore never lost
+between the two, even if its author crossed the threshold since, and is
+pulled while its fan-out job is still pending. A new follower gets the
+author's recent posts copied into their timeline, so following someone
+does not wait for their next post.
+
+Feeds are ordered by Post.rank_score, which combines the engagement score
+(log scale) with recency and does not depend on the current time, so keyset
+cursors over (rank_score, id) stay valid between pages. Timelines only keep
+FEED_TIMELINE_MAX_AGE of posts, which bounds the work per page; a page costs
+the same small, fixed number of queries however many posts exist.
+"""
+
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import FeedEntry, Post, UserInteraction, UserMatch
+from .task_utils import submit_job
+
+# Authors with this many followers are pulled at read time instead of pushed
+FEED_FANOUT_THRESHOLD = getattr(settings, 'FEED_FANOUT_THRESHOLD', 5000)
+FEED_TIMELINE_MAX_AGE = timedelta(days=getattr(settings, 'FEED_TIMELINE_MAX_AGE_DAYS', 14))
+FEED_FANOUT_BATCH_SIZE = 1000
+# Recency worth one doubling of engagement in the rank score
+FEED_RANK_HALF_LIFE = timedelta(hours=12)
+HIGH_REACH_AUTHORS_CACHE_KEY = 'feed:high_reach_authors'
+HIGH_REACH_AUTHORS_CACHE_TTL = 10 * 60
+# Interactions that make the user a follower of the target
+FOLLOW_INTERACTIONS = ('like', 'super_like')
+
+
+def rank_score(engagement: int, created_at) -> float:
+    """
+    Rank score: log2 of engagement plus age in units of FEED_RANK_HALF_LIFE,
+    so a post needs twice the engagement to outrank one FEED_RANK_HALF_LIFE newer
+    """
+    return math.log2(1 + engagement) + created_at.timestamp() / FEED_RANK_HALF_LIFE.total_seconds()
+
+
+def get_following_ids(user_id) -> set:
+    """Ids of the authors the user follows"""
+    following = set(UserInteraction.objects.filter(
+        user_id=user_id, interaction_type__in=FOLLOW_INTERACTIONS
+    ).values_list('target_user_id', flat=True))
+    for user1_id, user2_id in UserMatch.objects.filter(
+        Q(user1_id=user_id) | Q(user2_id=user_id), status='matched'
+    ).values_list('user1_id', 'user2_id'):
+        following.add(user2_id if user1_id == user_id else user1_id)
+    following.discard(user_id)
+    return following
+
+
+def get_follower_ids(author_id) -> set:
+    """Ids of the users who follow the author"""
+    followers = set(UserInteraction.objects.filter(
+        target_user_id=author_id, interaction_type__in=FOLLOW_INTERACTIONS
+    ).values_list('user_id', flat=True))
+    for user1_id, user2_id in UserMatch.objects.filter(
+        Q(user1_id=author_id) | Q(user2_id=author_id), status='matched'
+    ).values_list('user1_id', 'user2_id'):
+        followers.add(user2_id if user1_id == author_id else user1_id)
+    followers.discard(author_id)
+    return followers
+
+
+def get_high_reach_author_ids() -> set:
+    """
+    Authors with at least FEED_FANOUT_THRESHOLD followers as counted by
+    get_follower_ids (cached). Followers come from interactions and matches;
+    an author reaching the threshold has at least half of it from one source,
+    so only authors over half the threshold in either are counted exactly.
+    """
+    author_ids = cache.get(HIGH_REACH_AUTHORS_CACHE_KEY)
+    if author_ids is None:
+        half, quarter = math.ceil(FEED_FANOUT_THRESHOLD / 2), math.ceil(FEED_FANOUT_THRESHOLD / 4)
+        candidates = set(UserInteraction.objects.filter(interaction_type__in=FOLLOW_INTERACTIONS).values(
+            'target_user_id'
+        ).annotate(followers=Count('user_id', distinct=True)).filter(
+            followers__gte=half
+        ).values_list('target_user_id', flat=True))
+        # Matches are split between user1 and user2: half the threshold in matches is a quarter in one column
+        for side in ('user1_id', 'user2_id'):
+            candidates |= set(UserMatch.objects.filter(status='matched').values(side).annotate(
+                matches=Count('id')
+            ).filter(matches__gte=quarter).values_list(side, flat=True))
+        author_ids = {
+            author_id for author_id in candidates
+            if len(get_follower_ids(author_id)) >= FEED_FANOUT_THRESHOLD
+        }
+        cache.set(HIGH_REACH_AUTHORS_CACHE_KEY, author_ids, HIGH_REACH_AUTHORS_CACHE_TTL)
+    return author_ids
+
+
+def enqueue_fan_out(post) -> None:
+    """Push a new post into its author's followers' timelines in the background"""
+    if post.is_active and post.visibility == 'public':
+        submit_job(fan_out_post, post.id)
+
+
+def fan_out_post(post_id) -> int:
+    """
+    Materialize a post into every follower's timeline, in batched INSERTs,
+    then mark it fanned out. Posts of high-reach authors are left unmarked
+    (they are pulled at read time). Returns the number of timelines written.
+    """
+    post = Post.objects.filter(id=post_id, is_active=True, visibility='public').values('author_id', 'created_at').first()
+    if not post or post['author_id'] in get_high_reach_author_ids():
+        return 0
+
+    follower_ids = sorted(get_follower_ids(post['author_id']))
+    for start in range(0, len(follower_ids), FEED_FANOUT_BATCH_SIZE):
+        FeedEntry.objects.bulk_create([
+            FeedEntry(user_id=follower_id, post_id=post_id, created_at=post['created_at'])
+            for follower_id in follower_ids[start:start + FEED_FANOUT_BATCH_SIZE]
+        ], ignore_conflicts=True)
+    Post.objects.filter(id=post_id).update(fanned_out=True)
+    return len(follower_ids)
+
+
+def enqueue_follow_backfill(follower_id, author_id) -> None:
+    """Copy an author's recent posts into a new follower's timeline in the background"""
+    if follower_id != author_id:
+        submit_job(backfill_follower_timeline, follower_id, author_id)
+
+
+def backfill_follower_timeline(follower_id, author_id) -> int:
+    """
+    Materialize the author's public posts still inside the timeline window
+    into one follower's timeline. Returns the number of posts copied.
+    """
+    since = timezone.now() - FEED_TIMELINE_MAX_AGE
+    posts = list(Post.objects.filter(
+        author_id=author_id, is_active=True, visibility='public', created_at__gte=since
+    ).values_list('id', 'created_at'))
+    FeedEntry.objects.bulk_create([
+        FeedEntry(user_id=follower_id, post_id=post_id, created_at=created_at) for post_id, created_at in posts
+    ], ignore_conflicts=True)
+    return len(posts)
+
+
+def get_feed_queryset(user):
+    """
+    The user's home feed: their timeline, recent posts of followed authors
+    that were not fanned out, their own recent posts and featured posts.
+    Users who follow nobody yet get every public post. Order with
+    ('-rank_score', '-id').
+    """
+    posts = Post.objects.filter(is_active=True, visibility='public')
+    following_ids = get_following_ids(user.id)
+    if not following_ids:
+        return posts
+
+    since = timezone.now() - FEED_TIMELINE_MAX_AGE
+    condition = Q(id__in=FeedEntry.objects.filter(user=user, created_at__gte=since).values('post_id'))
+    condition |= Q(author_id__in=following_ids, fanned_out=False, created_at__gte=since)
+    condition |= Q(author=user, created_at__gte=since)
+    condition |= Q(is_featured=True, created_at__gte=since)
+    return posts.filter(condition)
+
+
+def trim_timelines() -> int:
+    """Delete timeline entries older than FEED_TIMELINE_MAX_AGE. Returns the number deleted."""
+    deleted, _ = FeedEntry.objects.filter(created_at__lt=timezone.now() - FEED_TIMELINE_MAX_AGE).delete()
+    return deleted
+
+
+def backfill_timelines() -> int:
+    """
+    Fan out every public post still inside the timeline window that was not
+    fanned out yet, e.g. after deploying timelines, raising the fan-out
+    threshold or losing fan-out jobs to a restart. Returns the number of
+    posts attempted.
+    """
+    since = timezone.now() - FEED_TIMELINE_MAX_AGE
+    post_ids = list(Post.objects.filter(
+        is_active=True, visibility='public', fanned_out=False, created_at__gte=since
+    ).values_list('id', flat=True))
+    for post_id in post_ids:
+        fan_out_post(post_id)
+    return len(post_ids)
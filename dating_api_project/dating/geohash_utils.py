@@ -0,0 +1,130 @@
+"""
+Geohash utilities for spatial indexing of user locations
+
+A geohash interleaves longitude/latitude bits into a base32 string, so points
+that are close together share a common prefix. Storing the geohash on the user
+row lets nearby-user queries select only the handful of cells that cover the
+search area (an indexed ``LIKE 'prefix%'``) instead of scanning every user.
+"""
+
+import math
+from typing import List, Tuple
+
+GEOHASH_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9  # ~4.8m x 4.8m cells, plenty for matching
+EARTH_RADIUS_KM = 6371
+
+
+def encode_geohash(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    """
+    Encode GPS coordinates as a geohash string of the given precision
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even_bit = True
+
+    while len(geohash) < precision:
+        if even_bit:
+            mid = (lon_range[0] + lon_range[1]) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lon_range[0] = mid
+            else:
+                bits = bits << 1
+                lon_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits = bits << 1
+                lat_range[1] = mid
+
+        even_bit = not even_bit
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(GEOHASH_BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return ''.join(geohash)
+
+
+def geohash_cell_size(precision: int) -> Tuple[float, float]:
+    """
+    Get the (latitude, longitude) size in degrees of a geohash cell
+    """
+    total_bits = precision * 5
+    lon_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lon_bits)
+
+
+def bounding_box(latitude: float, longitude: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """
+    Get the (min_lat, min_lon, max_lat, max_lon) box enclosing a circle of radius_km.
+    Longitudes are not wrapped, so min_lon may be < -180 or max_lon > 180 when the
+    box crosses the antimeridian.
+    """
+    angular_radius = radius_km / EARTH_RADIUS_KM
+    lat_delta = math.degrees(angular_radius)
+    min_lat = latitude - lat_delta
+    max_lat = latitude + lat_delta
+
+    # A circle containing a pole reaches every longitude
+    if min_lat <= -90.0 or max_lat >= 90.0:
+        return max(-90.0, min_lat), -180.0, min(90.0, max_lat), 180.0
+
+    sin_ratio = math.sin(angular_radius) / math.cos(math.radians(latitude))
+    if sin_ratio >= 1.0:
+        return min_lat, -180.0, max_lat, 180.0
+
+    lon_delta = math.degrees(math.asin(sin_ratio))
+    return min_lat, longitude - lon_delta, max_lat, longitude + lon_delta
+
+
+def split_longitude_range(min_lon: float, max_lon: float) -> List[Tuple[float, float]]:
+    """
+    Split an unwrapped longitude range into ranges within [-180, 180]
+    """
+    if min_lon < -180.0:
+        return [(-180.0, max_lon), (min_lon + 360.0, 180.0)]
+    if max_lon > 180.0:
+        return [(min_lon, 180.0), (-180.0, max_lon - 360.0)]
+    return [(min_lon, max_lon)]
+
+
+def geohash_cells_covering(min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+                           max_cells: int = 16) -> List[str]:
+    """
+    Get the geohash prefixes whose cells together cover the given box.
+    Uses the finest precision that needs no more than max_cells cells.
+    """
+    lon_ranges = split_longitude_range(min_lon, max_lon)
+
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lat_size, lon_size = geohash_cell_size(precision)
+        lat_cells = math.floor((max_lat + 90.0) / lat_size) - math.floor((min_lat + 90.0) / lat_size) + 1
+        lon_cells = sum(
+            math.floor((hi + 180.0) / lon_size) - math.floor((lo + 180.0) / lon_size) + 1
+            for lo, hi in lon_ranges
+        )
+        if lat_cells * lon_cells <= max_cells:
+            break
+
+    cells = set()
+    lat_start = math.floor((min_lat + 90.0) / lat_size)
+    for lat_index in range(lat_start, lat_start + lat_cells):
+        cell_lat = min(89.999999, -90.0 + (lat_index + 0.5) * lat_size)
+        for lo, hi in lon_ranges:
+            lon_start = math.floor((lo + 180.0) / lon_size)
+            lon_end = math.floor((hi + 180.0) / lon_size)
+            for lon_index in range(lon_start, lon_end + 1):
+                cell_lon = min(179.999999, -180.0 + (lon_index + 0.5) * lon_size)
+                cells.add(encode_geohash(cell_lat, cell_lon, precision))
+
+    return sorted(cells)
@@ -0,0 +1,190 @@
+"""
+Hashtag utilities - normalized hashtag table for Bond Story posts
+
+Post.hashtags is a free-form JSON list. Every searchable post's hashtags are
+stored once in Hashtag and linked through PostHashtag, so "posts tagged #x"
+is an indexed join instead of a text scan of every post.
+
+Each Hashtag also carries a usage count maintained on every link change, so
+typeahead suggestions are a prefix range scan over the unique name index and
+popular/trending hashtags never touch the posts table.
+"""
+
+from datetime import timedelta
+from typing import Iterable, List
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .models import Hashtag, PostHashtag
+
+HASHTAG_SUGGESTION_CACHE_TTL = getattr(settings, 'HASHTAG_SUGGESTION_CACHE_TTL', 60)
+TRENDING_HASHTAGS_CACHE_TTL = getattr(settings, 'TRENDING_HASHTAGS_CACHE_TTL', 5 * 60)
+TRENDING_WINDOW = timedelta(hours=24)
+
+
+def normalize_hashtag(value) -> str:
+    """
+    Normalize a hashtag: leading '#' and whitespace removed, casefolded
+    """
+    return ''.join(str(value).split()).lstrip('#').casefold()[:100]
+
+
+def format_hashtag(name: str) -> str:
+    """Display form of a normalized hashtag name, as clients send and show it ('#name')"""
+    return f'#{name}'
+
+
+def normalize_hashtags(values: Iterable) -> List[str]:
+    """
+    Normalize a list of hashtags, dropping empty values and duplicates (order preserved)
+    """
+    hashtags = []
+    for value in values or []:
+        hashtag = normalize_hashtag(value)
+        if hashtag and hashtag not in hashtags:
+            hashtags.append(hashtag)
+    return hashtags
+
+
+def get_or_create_hashtags(names: Iterable[str]) -> dict:
+    """
+    Get {name: hashtag_id} for the given normalized names, creating missing hashtags in bulk
+    """
+    names = set(names)
+    if not names:
+        return {}
+
+    hashtag_ids = dict(Hashtag.objects.filter(name__in=names).values_list('name', 'id'))
+    missing = names - set(hashtag_ids)
+    if missing:
+        Hashtag.objects.bulk_create([Hashtag(name=name) for name in missing], ignore_conflicts=True)
+        hashtag_ids.update(Hashtag.objects.filter(name__in=missing).values_list('name', 'id'))
+    return hashtag_ids
+
+
+def sync_post_hashtags(post) -> None:
+    """
+    Bring the post's hashtag links and the hashtags' usage counts in line
+    with post.hashtags. Posts that are not searchable (inactive or non-public)
+    keep no links.
+    """
+    wanted = set(normalize_hashtags(post.hashtags)) if post.is_searchable else set()
+
+    with transaction.atomic():
+        existing = {
+            name: (link_id, hashtag_id)
+            for link_id, hashtag_id, name in PostHashtag.objects.filter(post=post).values_list(
+                'id', 'hashtag_id', 'hashtag__name'
+            )
+        }
+
+        stale = [link for name, link in existing.items() if name not in wanted]
+        if stale:
+            PostHashtag.objects.filter(id__in=[link_id for link_id, _ in stale]).delete()
+            Hashtag.objects.filter(id__in=[hashtag_id for _, hashtag_id in stale], usage_count__gt=0).update(
+                usage_count=F('usage_count') - 1
+            )
+
+        new = wanted - set(existing)
+        if new:
+            hashtag_ids = get_or_create_hashtags(new)
+            PostHashtag.objects.bulk_create(
+                [PostHashtag(post=post, hashtag_id=hashtag_ids[name]) for name in new],
+                ignore_conflicts=True
+            )
+            Hashtag.objects.filter(id__in=hashtag_ids.values()).update(
+                usage_count=F('usage_count') + 1,
+                last_used_at=timezone.now()
+            )
+
+
+def release_post_hashtags(post) -> None:
+    """
+    Decrement the usage counts of a post's hashtags before it is deleted
+    """
+    hashtag_ids = list(PostHashtag.objects.filter(post=post).values_list('hashtag_id', flat=True))
+    if hashtag_ids:
+        Hashtag.objects.filter(id__in=hashtag_ids, usage_count__gt=0).update(usage_count=F('usage_count') - 1)
+
+
+def recount_hashtag_usage() -> int:
+    """
+    Recompute every hashtag's usage count from the link table.
+    Returns the number of hashtags updated.
+    """
+    counts = dict(PostHashtag.objects.values('hashtag_id').annotate(uses=Count('id')).values_list('hashtag_id', 'uses'))
+    hashtags = list(Hashtag.objects.only('id', 'usage_count'))
+    changed = [hashtag for hashtag in hashtags if hashtag.usage_count != counts.get(hashtag.id, 0)]
+    for hashtag in changed:
+        hashtag.usage_count = counts.get(hashtag.id, 0)
+    Hashtag.objects.bulk_update(changed, ['usage_count'], batch_size=1000)
+    return len(changed)
+
+
+def suggest_hashtags(prefix, limit: int = 5) -> List[str]:
+    """
+    Most used hashtags starting with the given prefix, served from cache or
+    from a range scan of the hashtag name index (a LIKE 'prefix%' scan of its
+    varchar_pattern_ops index on PostgreSQL, whatever the collation)
+    """
+    prefix = normalize_hashtag(prefix)
+    if not prefix:
+        return []
+
+    cache_key = f'hashtags:suggest:{limit}:{prefix}'
+    suggestions = cache.get(cache_key)
+    if suggestions is None:
+        suggestions = list(
+            Hashtag.objects.filter(
+                name__startswith=prefix,
+                usage_count__gt=0
+            ).order_by('-usage_count', 'name').values_list('name', flat=True)[:limit]
+        )
+        cache.set(cache_key, suggestions, HASHTAG_SUGGESTION_CACHE_TTL)
+    return suggestions
+
+
+def trending_hashtags(limit: int = 10) -> List[str]:
+    """
+    Hashtags used on the most posts in the trending window, falling back to
+    the all-time most used ones. Reads only the link and hashtag tables.
+    """
+    cache_key = f'hashtags:trending:{limit}'
+    trending = cache.get(cache_key)
+    if trending is None:
+        trending = list(
+            PostHashtag.objects.filter(created_at__gte=timezone.now() - TRENDING_WINDOW).values(
+                'hashtag__name'
+            ).annotate(uses=Count('id')).order_by('-uses', 'hashtag__name').values_list(
+                'hashtag__name', flat=True
+            )[:limit]
+        )
+        if len(trending) < limit:
+            trending += [
+                name for name in Hashtag.objects.filter(usage_count__gt=0).exclude(name__in=trending).order_by(
+                    '-usage_count', 'name'
+                ).values_list('name', flat=True)[:limit - len(trending)]
+            ]
+        cache.set(cache_key, trending, TRENDING_HASHTAGS_CACHE_TTL)
+    return trending
+
+
+def filter_by_hashtag(queryset, value):
+    """
+    Restrict a Post queryset to searchable posts tagged with the given hashtag
+    """
+    name = normalize_hashtag(value)
+    if not name:
+        return queryset.none()
+    return queryset.filter(id__in=PostHashtag.objects.filter(hashtag__name=name).values('post_id'))
+
+
+def count_hashtag_posts(value) -> int:
+    """
+    Number of searchable posts tagged with the given hashtag, from the link table alone
+    """
+    return PostHashtag.objects.filter(hashtag__name=normalize_hashtag(value)).count()
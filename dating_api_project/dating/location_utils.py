@@ -6,10 +6,10 @@ import math
 import requests
 from typing import Tuple, Optional, Dict, List
 from django.conf import settings
-from django.contrib.gis.geos import Point
-from django.contrib.gis.measure import Distance
-from django.contrib.gis.db.models.functions import Distance as DistanceFunction
+from django.db.models import Q, F, Value, FloatField
+from django.db.models.functions import ASin, Cast, Cos, Least, Power, Radians, Sin, Sqrt
 from .models import User, LocationHistory, UserMatch
+from .geohash_utils import EARTH_RADIUS_KM, bounding_box, geohash_cells_covering, split_longitude_range
 
 
 def calculate_distance(coord1: Tuple[float, float], coord2: Tuple[float, float]) -> float:
@@ -148,6 +148,46 @@ def reverse_geocode(latitude: float, longitude: float) -> Optional[Dict]:
         return None
 
 
+def filter_within_bounding_box(queryset, latitude: float, longitude: float, radius_km: float):
+    """
+    Restrict a user queryset to the geohash cells and bounding box around a point.
+    This is a cheap indexed prefilter; callers still refine with calculate_distance.
+    """
+    min_lat, min_lon, max_lat, max_lon = bounding_box(latitude, longitude, radius_km)
+    
+    cells_filter = Q()
+    for cell in geohash_cells_covering(min_lat, min_lon, max_lat, max_lon):
+        cells_filter |= Q(location_geohash__startswith=cell)
+    
+    longitude_filter = Q()
+    for lon_low, lon_high in split_longitude_range(min_lon, max_lon):
+        longitude_filter |= Q(longitude__gte=lon_low, longitude__lte=lon_high)
+    
+    return queryset.filter(
+        cells_filter,
+        longitude_filter,
+        latitude__gte=min_lat,
+        latitude__lte=max_lat,
+    )
+
+
+def distance_expression(latitude: float, longitude: float):
+    """
+    Database expression for the Haversine distance in kilometers from a point
+    to each row's latitude/longitude. Use with annotate() to filter/order in SQL.
+    """
+    row_latitude = Radians(Cast(F('latitude'), FloatField()))
+    row_longitude = Radians(Cast(F('longitude'), FloatField()))
+    origin_latitude = Value(math.radians(latitude), output_field=FloatField())
+    origin_longitude = Value(math.radians(longitude), output_field=FloatField())
+    
+    a = (
+        Power(Sin((row_latitude - origin_latitude) / 2), 2) +
+        Cos(origin_latitude) * Cos(row_latitude) * Power(Sin((row_longitude - origin_longitude) / 2), 2)
+    )
+    return Value(2 * EARTH_RADIUS_KM, output_field=FloatField()) * ASin(Sqrt(Least(a, Value(1.0))))
+
+
 def find_nearby_users(user: User, max_distance: Optional[int] = None) -> List[Dict]:
     """
     Find users within specified distance of given user
@@ -156,28 +196,31 @@ def find_nearby_users(user: User, max_distance: Optional[int] = None) -> List[Di
         return []
     
     max_distance = max_distance or user.max_distance
+    user_coords = user.location_coordinates
     
-    # Get all users with location data
-    nearby_users = User.objects.filter(
-        latitude__isnull=False,
-        longitude__isnull=False,
-        is_active=True
+    # Only users whose location is visible to the viewer (see can_view_location)
+    matched_user_ids = get_matched_user_ids(user)
+    candidates = User.objects.filter(
+        is_active=True,
+        location_sharing_enabled=True,
+    ).filter(
+        Q(location_privacy='public') |
+        Q(location_privacy='private', id__in=matched_user_ids)
     ).exclude(id=user.id)
     
-    results = []
-    user_coords = user.location_coordinates
+    # Indexed geohash/bounding-box prefilter, then exact haversine refine
+    candidates = filter_within_bounding_box(candidates, user_coords[0], user_coords[1], max_distance)
     
-    for nearby_user in nearby_users:
+    results = []
+    for nearby_user in candidates:
         distance = calculate_distance(user_coords, nearby_user.location_coordinates)
         
-        if distance and distance <= max_distance:
-            # Check privacy settings
-            if can_view_location(user, nearby_user):
-                results.append({
-                    'user': nearby_user,
-                    'distance': round(distance, 2),
-                    'coordinates': nearby_user.location_coordinates
-                })
+        if distance is not None and distance <= max_distance:
+            results.append({
+                'user': nearby_user,
+                'distance': round(distance, 2),
+                'coordinates': nearby_user.location_coordinates
+            })
     
     # Sort by distance
     results.sort(key=lambda x: x['distance'])
@@ -185,6 +228,18 @@ def find_nearby_users(user: User, max_distance: Optional[int] = None) -> List[Di
     return results
 
 
+def get_matched_user_ids(user: User) -> List[int]:
+    """
+    Get ids of users the given user has matched with
+    """
+    matches = UserMatch.objects.filter(
+        Q(user1=user) | Q(user2=user),
+        status='matched'
+    ).values_list('user1_id', 'user2_id')
+    
+    return [user2_id if user1_id == user.id else user1_id for user1_id, user2_id in matches]
+
+
 def can_view_location(viewer: User, target: User) -> bool:
     """
     Check if viewer can see target user's location based on privacy settings
@@ -200,7 +255,7 @@ def can_view_location(viewer: User, target: User) -> bool:
     elif target.location_privacy == 'private':
         # Only show to matched users
         return UserMatch.objects.filter(
-            models.Q(user1=viewer, user2=target) | models.Q(user1=target, user2=viewer),
+            Q(user1=viewer, user2=target) | Q(user1=target, user2=viewer),
             status='matched'
         ).exists()
     elif target.location_privacy == 'hidden':
@@ -246,6 +301,10 @@ def update_user_location(user: User, latitude: float, longitude: float,
             source=source
         )
         
+        # Distances changed, so cached recommendations are stale
+        from .recommendation_utils import invalidate_recommendations
+        invalidate_recommendations(user.id)
+        
         return True
         
     except Exception as e:
@@ -253,15 +312,18 @@ def update_user_location(user: User, latitude: float, longitude: float,
         return False
 
 
-def calculate_match_score(user1: User, user2: User) -> float:
+def calculate_match_score(user1: User, user2: User, distance: Optional[float] = None) -> float:
     """
     Calculate compatibility score between two users
-    Based on age, gender preferences, distance, and other factors
+    Based on age, gender preferences, distance, and other factors.
+    Pass distance if it is already known to avoid recomputing it.
+    See recommendation_utils.score_candidates for the batch version.
     """
     score = 0.0
     
     # Distance factor (closer is better)
-    distance = user1.get_distance_to(user2)
+    if distance is None:
+        distance = user1.get_distance_to(user2)
     if distance is not None:
         # Normalize distance score (0-40 points)
         distance_score = max(0, 40 - (distance / user1.max_distance * 40))
@@ -0,0 +1,165 @@
+"""
+Management command to stress the Bondcoin ledger with concurrent transfers and gifts.
+Worker threads (each with its own database connection) move coins between a
+small pool of synthetic users, then every balance is checked against its
+ledger rows: any lost update or double spend shows up as a mismatch.
+Synthetic users are committed (the workers need to see them) and deleted at the end.
+"""
+
+import random
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+from django.db.models import Sum
+
+from dating.bondcoin_utils import InsufficientBondcoinsError, debit, transfer
+from dating.models import BondcoinTransaction, User
+
+USER_PREFIX = 'ledger-bench-'
+
+
+class Command(BaseCommand):
+    help = 'Stress-test Bondcoin transfers under concurrency and verify no update is lost'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='Synthetic users sharing the coins')
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent worker threads')
+        parser.add_argument('--operations', type=int, default=200, help='Operations per thread')
+        parser.add_argument('--balance', type=int, default=500, help='Starting balance of each user')
+        parser.add_argument(
+            '--naive',
+            action='store_true',
+            help='Use the old read-modify-write balance updates, to show the lost updates they cause'
+        )
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for reproducible runs')
+
+    def handle(self, *args, **options):
+        User.objects.filter(username__startswith=USER_PREFIX).delete()
+        User.objects.bulk_create([
+            User(
+                username=f'{USER_PREFIX}{i}',
+                email=f'{USER_PREFIX}{i}@bench.invalid',
+                password='!',
+                name=f'Ledger Bench {i}',
+                bondcoin_balance=options['balance'],
+            )
+            for i in range(options['users'])
+        ])
+        user_ids = list(User.objects.filter(username__startswith=USER_PREFIX).values_list('id', flat=True))
+
+        mode = 'read-modify-write' if options['naive'] else 'ledger'
+        self.stdout.write(
+            f"📊 {options['threads']} threads x {options['operations']} operations over {len(user_ids)} users ({mode})..."
+        )
+
+        stats = {'completed': 0, 'insufficient': 0, 'retries': 0}
+        stats_lock = threading.Lock()
+        workers = [
+            threading.Thread(target=self._worker, args=(
+                user_ids, options['operations'], options['naive'], random.Random(options['seed'] + i), stats, stats_lock
+            ))
+            for i in range(options['threads'])
+        ]
+
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+
+        try:
+            self._verify(user_ids, options['balance'], stats, elapsed)
+        finally:
+            User.objects.filter(id__in=user_ids).delete()
+
+    def _worker(self, user_ids, operations, naive, rng, stats, stats_lock):
+        try:
+            for _ in range(operations):
+                sender_id = rng.choice(user_ids)
+                recipient_ids = rng.sample([user_id for user_id in user_ids if user_id != sender_id], rng.randint(1, 3))
+                amounts = [rng.randint(1, 40) for _ in recipient_ids]
+                is_gift = rng.random() < 0.2
+
+                for attempt in range(20):
+                    try:
+                        if naive:
+                            outcome = self._naive_operation(sender_id, recipient_ids, amounts, is_gift)
+                        else:
+                            outcome = self._ledger_operation(sender_id, recipient_ids, amounts, is_gift)
+                        break
+                    except OperationalError:
+                        # SQLite allows one writer at a time; back off and retry
+                        with stats_lock:
+                            stats['retries'] += 1
+                        time.sleep(0.01 * (attempt + 1))
+                else:
+                    continue
+
+                with stats_lock:
+                    stats[outcome] += 1
+        finally:
+            connections.close_all()
+
+    def _ledger_operation(self, sender_id, recipient_ids, amounts, is_gift):
+        sender = User.objects.get(id=sender_id)
+        try:
+            if is_gift:
+                debit(sender, sum(amounts), 'gift_sent', 'Benchmark gift')
+            else:
+                recipients = User.objects.in_bulk(recipient_ids)
+                transfer(sender, [(recipients[user_id], amount) for user_id, amount in zip(recipient_ids, amounts)],
+                         description='Benchmark tip')
+        except InsufficientBondcoinsError:
+            return 'insufficient'
+        return 'completed'
+
+    def _naive_operation(self, sender_id, recipient_ids, amounts, is_gift):
+        """The original pattern: check and change balances in Python, then save()"""
+        sender = User.objects.get(id=sender_id)
+        total = sum(amounts)
+        if sender.bondcoin_balance < total:
+            return 'insufficient'
+        BondcoinTransaction.objects.create(
+            user=sender, transaction_type='gift_sent' if is_gift else 'spend', amount=-total, description='Benchmark'
+        )
+        sender.bondcoin_balance -= total
+        sender.save(update_fields=['bondcoin_balance'])
+        if not is_gift:
+            for recipient_id, amount in zip(recipient_ids, amounts):
+                recipient = User.objects.get(id=recipient_id)
+                BondcoinTransaction.objects.create(
+                    user=recipient, transaction_type='gift_received', amount=amount, description='Benchmark'
+                )
+                recipient.bondcoin_balance += amount
+                recipient.save(update_fields=['bondcoin_balance'])
+        return 'completed'
+
+    def _verify(self, user_ids, starting_balance, stats, elapsed):
+        ledger = dict(
+            BondcoinTransaction.objects.filter(user_id__in=user_ids).values('user_id').annotate(
+                total=Sum('amount')
+            ).values_list('user_id', 'total')
+        )
+        balances = dict(User.objects.filter(id__in=user_ids).values_list('id', 'bondcoin_balance'))
+        mismatched = {
+            user_id: (balance, starting_balance + (ledger.get(user_id) or 0))
+            for user_id, balance in balances.items()
+            if balance != starting_balance + (ledger.get(user_id) or 0)
+        }
+
+        operations = stats['completed'] + stats['insufficient']
+        self.stdout.write(
+            f"⏱️  {operations} operations in {elapsed:.2f}s ({operations / elapsed:.0f} ops/s): "
+            f"{stats['completed']} applied, {stats['insufficient']} rejected, {stats['retries']} lock retries"
+        )
+        if mismatched:
+            self.stdout.write(self.style.ERROR(
+                f'❌ {len(mismatched)} balances disagree with their ledger (balance, expected): {mismatched}'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'✅ Every balance matches its ledger; no lost updates (min balance {min(balances.values())})'
+            ))
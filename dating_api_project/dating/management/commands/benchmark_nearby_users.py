@@ -0,0 +1,142 @@
+"""
+Management command to benchmark nearby-user lookups against synthetic users.
+All synthetic data is created inside a transaction that is rolled back at the end.
+"""
+
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from dating.geohash_utils import encode_geohash
+from dating.location_utils import calculate_distance, find_nearby_users
+from dating.models import User
+
+# Population centres used to generate realistic user density
+CITIES = [
+    (40.7128, -74.0060),   # New York
+    (34.0522, -118.2437),  # Los Angeles
+    (51.5074, -0.1278),    # London
+    (6.5244, 3.3792),      # Lagos
+    (-33.8688, 151.2093),  # Sydney
+    (35.6762, 139.6503),   # Tokyo
+    (19.0760, 72.8777),    # Mumbai
+    (-23.5505, -46.6333),  # Sao Paulo
+]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark find_nearby_users p50/p99 latency on synthetic user sets'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[10000, 100000, 1000000],
+            help='Synthetic user counts to benchmark'
+        )
+        parser.add_argument(
+            '--queries',
+            type=int,
+            default=200,
+            help='Number of nearby-user queries per size'
+        )
+        parser.add_argument(
+            '--radius',
+            type=int,
+            default=50,
+            help='Search radius in kilometers'
+        )
+        parser.add_argument(
+            '--full-scan-limit',
+            type=int,
+            default=100000,
+            help='Also time the legacy full-table scan for sizes up to this count (0 to disable)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed for reproducible data'
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        for size in options['sizes']:
+            with transaction.atomic():
+                self.stdout.write(f'📊 Creating {size} synthetic users...')
+                self._create_users(size, rng)
+
+                viewers = list(
+                    User.objects.filter(email__startswith='bench-').order_by('?')[:options['queries']]
+                )
+                radius = options['radius']
+
+                indexed = self._time_queries(viewers, lambda viewer: find_nearby_users(viewer, radius))
+                self._report(size, 'geohash index', indexed)
+
+                if options['full_scan_limit'] and size <= options['full_scan_limit']:
+                    full_scan = self._time_queries(viewers, lambda viewer: self._full_scan(viewer, radius))
+                    self._report(size, 'full scan', full_scan)
+
+                transaction.set_rollback(True)
+
+    def _create_users(self, size, rng):
+        batch = []
+        for i in range(size):
+            if rng.random() < 0.8:
+                city_lat, city_lon = rng.choice(CITIES)
+                latitude = city_lat + rng.gauss(0, 0.5)
+                longitude = city_lon + rng.gauss(0, 0.5)
+            else:
+                latitude = rng.uniform(-60, 70)
+                longitude = rng.uniform(-180, 180)
+            latitude = round(max(-90.0, min(90.0, latitude)), 8)
+            longitude = round(((longitude + 180.0) % 360.0) - 180.0, 8)
+
+            batch.append(User(
+                username=f'bench-{i}',
+                email=f'bench-{i}@bench.invalid',
+                password='!',
+                name=f'Bench User {i}',
+                age=rng.randint(18, 60),
+                gender=rng.choice(['male', 'female']),
+                latitude=latitude,
+                longitude=longitude,
+                # bulk_create bypasses save(), so set the index column here
+                location_geohash=encode_geohash(latitude, longitude),
+            ))
+            if len(batch) >= 5000:
+                User.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            User.objects.bulk_create(batch)
+
+    def _full_scan(self, viewer, radius):
+        """The original implementation: haversine over every located user"""
+        results = []
+        for other in User.objects.filter(latitude__isnull=False, longitude__isnull=False, is_active=True).exclude(id=viewer.id):
+            distance = calculate_distance(viewer.location_coordinates, other.location_coordinates)
+            if distance is not None and distance <= radius:
+                results.append(other)
+        return results
+
+    def _time_queries(self, viewers, query):
+        timings = []
+        for viewer in viewers:
+            start = time.perf_counter()
+            query(viewer)
+            timings.append((time.perf_counter() - start) * 1000)
+        return timings
+
+    def _report(self, size, label, timings):
+        timings = sorted(timings)
+        p50 = statistics.median(timings)
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {size:>9} users | {label:<13} | p50 {p50:9.2f} ms | p99 {p99:9.2f} ms'
+        ))
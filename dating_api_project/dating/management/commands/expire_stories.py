@@ -0,0 +1,19 @@
+"""
+Management command to deactivate expired stories.
+Run it periodically (e.g. every few minutes from a cron job) so expired
+stories are switched off in one bulk UPDATE instead of being filtered out
+by expiry time on every request.
+"""
+
+from django.core.management.base import BaseCommand
+
+from dating.story_utils import deactivate_expired_stories
+
+
+class Command(BaseCommand):
+    help = 'Deactivate expired stories in bulk and refresh the story tray'
+
+    def handle(self, *args, **options):
+        self.stdout.write('🧹 Deactivating expired stories...')
+        deactivated = deactivate_expired_stories()
+        self.stdout.write(self.style.SUCCESS(f'✅ Deactivated {deactivated} expired stories'))
@@ -0,0 +1,30 @@
+"""
+Management command to maintain materialized home feed timelines.
+Run it daily (e.g. from a cron job) to drop entries that have aged out of the
+timeline window; --backfill fans out every post still inside the window.
+"""
+
+from django.core.management.base import BaseCommand
+
+from dating.feed_utils import backfill_timelines, trim_timelines
+
+
+class Command(BaseCommand):
+    help = 'Trim expired feed timeline entries and optionally backfill timelines'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backfill',
+            action='store_true',
+            help='Fan out every public post inside the timeline window (first deploy, threshold changes)'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('🧹 Trimming expired feed entries...')
+        deleted = trim_timelines()
+        self.stdout.write(self.style.SUCCESS(f'✅ Deleted {deleted} expired entries'))
+
+        if options['backfill']:
+            self.stdout.write('🔄 Backfilling timelines...')
+            fanned_out = backfill_timelines()
+            self.stdout.write(self.style.SUCCESS(f'✅ Fanned out {fanned_out} posts'))
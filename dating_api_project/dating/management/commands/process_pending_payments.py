@@ -0,0 +1,18 @@
+"""
+Management command to capture payments whose background job never ran.
+Run it after deploys/restarts or periodically (e.g. from a cron job); payments
+being captured by a live worker are skipped by the conditional state changes.
+"""
+
+from django.core.management.base import BaseCommand
+
+from dating.payment_utils import resume_stalled_payments
+
+
+class Command(BaseCommand):
+    help = 'Capture pending and stalled payments'
+
+    def handle(self, *args, **options):
+        self.stdout.write('🔄 Capturing pending payments...')
+        attempted = resume_stalled_payments()
+        self.stdout.write(self.style.SUCCESS(f'✅ Attempted {attempted} pending payments'))
@@ -0,0 +1,29 @@
+"""
+Management command to process payment webhooks that are due.
+Run it periodically (e.g. from a cron job) to pick up retries whose backoff
+has elapsed and events whose background job was lost with a restart.
+"""
+
+from django.core.management.base import BaseCommand
+
+from dating.webhook_utils import get_webhook_metrics, process_due_webhooks
+
+
+class Command(BaseCommand):
+    help = 'Process due payment webhooks and report per-provider lag'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Events claimed per batch')
+
+    def handle(self, *args, **options):
+        self.stdout.write('🔄 Processing due webhooks...')
+        processed = process_due_webhooks(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✅ Processed {processed} webhooks'))
+
+        for metrics in get_webhook_metrics():
+            self.stdout.write(
+                f"📊 {metrics['provider']}: backlog {metrics['backlog']} "
+                f"(oldest {metrics['oldest_unprocessed_age_seconds']:.0f}s), "
+                f"{metrics['dead_letters']} dead letters, "
+                f"{metrics['processed_last_hour']} processed in the last hour"
+            )
@@ -0,0 +1,21 @@
+"""
+Management command to recount engagement counters.
+Run it daily (e.g. from a cron job): counters are kept up to date one
+atomic update at a time, but rows removed by cascades or bulk deletes skip
+that and leave the counts too high.
+"""
+
+from django.core.management.base import BaseCommand
+
+from dating.counter_utils import recount_counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute like, comment, share, bond, view and reaction counts from their rows'
+
+    def handle(self, *args, **options):
+        self.stdout.write('🔢 Recounting engagement counters...')
+        corrected = recount_counters()
+        for model_name, count in corrected.items():
+            self.stdout.write(f'   {model_name}: {count} rows corrected')
+        self.stdout.write(self.style.SUCCESS(f'✅ Corrected {sum(corrected.values())} rows'))
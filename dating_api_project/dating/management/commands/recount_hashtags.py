@@ -0,0 +1,19 @@
+"""
+Management command to recount hashtag usage.
+Run it daily (e.g. from a cron job): usage counts are kept up to date
+incrementally, but posts removed by cascades or bulk deletes skip that and
+leave the counts too high.
+"""
+
+from django.core.management.base import BaseCommand
+
+from dating.hashtag_utils import recount_hashtag_usage
+
+
+class Command(BaseCommand):
+    help = 'Recompute hashtag usage counts from the post-hashtag links'
+
+    def handle(self, *args, **options):
+        self.stdout.write('🔢 Recounting hashtag usage...')
+        updated = recount_hashtag_usage()
+        self.stdout.write(self.style.SUCCESS(f'✅ Corrected {updated} hashtag counts'))
@@ -0,0 +1,54 @@
+"""
+Management command to precompute location-based recommendations offline.
+Run it periodically (e.g. from a cron job) so recommendation requests only read stored rows.
+"""
+
+from django.core.management.base import BaseCommand
+
+from dating.models import User
+from dating.recommendation_utils import (
+    refresh_recommendations, invalidate_recommendations, RECOMMENDATION_BATCH_SIZE
+)
+
+
+class Command(BaseCommand):
+    help = 'Recompute and store recommendations for all active users with a location'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user-id',
+            type=int,
+            nargs='+',
+            help='Only refresh recommendations for these user ids'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=RECOMMENDATION_BATCH_SIZE,
+            help='Rows per bulk upsert statement'
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(
+            is_active=True,
+            latitude__isnull=False,
+            longitude__isnull=False
+        ).order_by('id')
+        if options['user_id']:
+            users = users.filter(id__in=options['user_id'])
+
+        self.stdout.write('🔄 Refreshing recommendations...')
+
+        users_count = 0
+        recommendations_count = 0
+        for user in users.iterator(chunk_size=500):
+            try:
+                recommendations_count += refresh_recommendations(user, batch_size=options['batch_size'])
+                invalidate_recommendations(user.id)
+                users_count += 1
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'❌ Failed for user {user.id}: {str(e)}'))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Stored {recommendations_count} recommendations for {users_count} users'
+        ))
@@ -0,0 +1,36 @@
+"""
+Management command to deliver queued emails.
+Run it periodically (e.g. from a cron job) to send retries whose backoff has
+elapsed, emails whose background job was lost with a restart, and to finish
+queuing newsletter campaigns interrupted by a crash.
+"""
+
+from django.core.management.base import BaseCommand
+
+from dating.email_utils import deliver_queued_emails
+from dating.models import EmailLog
+from dating.newsletter_utils import complete_finished_campaigns, resume_stalled_campaigns
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued emails over a single SMTP connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Emails claimed per batch')
+
+    def handle(self, *args, **options):
+        resumed = resume_stalled_campaigns()
+        if resumed:
+            self.stdout.write(f'🔄 Resumed newsletter campaigns: queued {resumed} more emails')
+
+        self.stdout.write('📧 Delivering queued emails...')
+        sent = deliver_queued_emails(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✅ Sent {sent} emails'))
+
+        completed = complete_finished_campaigns()
+        if completed:
+            self.stdout.write(self.style.SUCCESS(f'✅ Completed {completed} newsletter campaigns'))
+
+        waiting = EmailLog.objects.filter(status='queued').count()
+        if waiting:
+            self.stdout.write(f'⏳ {waiting} emails waiting for a retry')
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-17 11:27
+
+from django.db import migrations, models
+
+
+def backfill_location_geohash(apps, schema_editor):
+    from dating.geohash_utils import encode_geohash
+
+    User = apps.get_model('dating', 'User')
+    users = User.objects.filter(latitude__isnull=False, longitude__isnull=False).only('id', 'latitude', 'longitude')
+
+    batch = []
+    for user in users.iterator(chunk_size=2000):
+        user.location_geohash = encode_geohash(float(user.latitude), float(user.longitude))
+        batch.append(user)
+        if len(batch) >= 2000:
+            User.objects.bulk_update(batch, ['location_geohash'])
+            batch = []
+    if batch:
+        User.objects.bulk_update(batch, ['location_geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dating', '0019_paymentmethod_paymenttransaction_paymentwebhook_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='location_geohash',
+            field=models.CharField(blank=True, db_index=True, help_text='Geohash of latitude/longitude for nearby-user lookups', max_length=12, null=True),
+        ),
+        migrations.RunPython(backfill_location_geohash, migrations.RunPython.noop),
+    ]
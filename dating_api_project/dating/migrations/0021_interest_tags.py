@@ -0,0 +1,62 @@
+# Generated by Django 4.2.7 on 2026-10-17 11:37
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_interest_tags(apps, schema_editor):
+    from dating.tag_utils import normalize_tags
+
+    User = apps.get_model('dating', 'User')
+    InterestTag = apps.get_model('dating', 'InterestTag')
+    UserInterestTag = apps.get_model('dating', 'UserInterestTag')
+
+    tag_ids = {}
+    batch = []
+    for user in User.objects.only('id', 'interests', 'hobbies').iterator(chunk_size=2000):
+        for tag_type, values in (('interest', user.interests), ('hobby', user.hobbies)):
+            for name in normalize_tags(values if isinstance(values, list) else []):
+                if name not in tag_ids:
+                    tag_ids[name] = InterestTag.objects.get_or_create(name=name)[0].id
+                batch.append(UserInterestTag(user_id=user.id, tag_id=tag_ids[name], tag_type=tag_type))
+        if len(batch) >= 2000:
+            UserInterestTag.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        UserInterestTag.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dating', '0020_user_location_geohash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InterestTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Lowercased, whitespace-collapsed tag', max_length=100, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='UserInterestTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tag_type', models.CharField(choices=[('interest', 'Interest'), ('hobby', 'Hobby')], max_length=10)),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='user_tags', to='dating.interesttag')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='interest_tags', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['tag', 'tag_type', 'user'], name='dating_user_tag_id_30c45f_idx')],
+                'unique_together': {('user', 'tag', 'tag_type')},
+            },
+        ),
+        migrations.RunPython(backfill_interest_tags, migrations.RunPython.noop),
+    ]
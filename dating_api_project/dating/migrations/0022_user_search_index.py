@@ -0,0 +1,68 @@
+# Generated by Django 4.2.7 on 2026-10-17 11:40
+
+from django.conf import settings
+import django.contrib.postgres.search
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_search_index(apps, schema_editor):
+    from dating.search_utils import SEARCH_CONFIG, build_user_search_terms, user_search_vector_sql
+
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS dating_usersearchdocument_vector_gin '
+            'ON dating_usersearchdocument USING gin (search_vector)'
+        )
+        schema_editor.execute(user_search_vector_sql(), {'config': SEARCH_CONFIG})
+        return
+
+    User = apps.get_model('dating', 'User')
+    UserSearchTerm = apps.get_model('dating', 'UserSearchTerm')
+
+    batch = []
+    for user in User.objects.only('id', 'name', 'bio', 'city', 'state', 'country').iterator(chunk_size=2000):
+        for term, weight in build_user_search_terms(user).items():
+            batch.append(UserSearchTerm(user_id=user.id, term=term, weight=weight))
+        if len(batch) >= 2000:
+            UserSearchTerm.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        UserSearchTerm.objects.bulk_create(batch)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS dating_usersearchdocument_vector_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dating', '0021_interest_tags'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSearchDocument',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('search_vector', django.contrib.postgres.search.SearchVectorField(help_text='Weighted tsvector of name, location and bio', null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.PositiveSmallIntegerField(default=1, help_text='Relevance weight of the field the term came from')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'user'], name='dating_user_term_f057be_idx')],
+                'unique_together': {('user', 'term')},
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
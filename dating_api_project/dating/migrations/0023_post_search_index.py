@@ -0,0 +1,125 @@
+# Generated by Django 4.2.7 on 2026-10-17 11:42
+
+import django.contrib.postgres.search
+from django.db import migrations, models
+import django.db.models.deletion
+
+POST_SEARCH_VECTOR_SQL = """
+    INSERT INTO dating_postsearchdocument (post_id, search_vector, updated_at)
+    SELECT p.id,
+        setweight(to_tsvector(%(config)s::regconfig, coalesce(CASE WHEN jsonb_typeof(p.hashtags) = 'array' THEN
+            (SELECT string_agg(ltrim(lower(tag), '#'), ' ') FROM jsonb_array_elements_text(p.hashtags) AS tag)
+        END, '')), 'A') ||
+        setweight(to_tsvector(%(config)s::regconfig, coalesce(p.content, '')), 'B') ||
+        setweight(to_tsvector(%(config)s::regconfig, concat_ws(' ', u.name, p.location)), 'C'),
+        now()
+    FROM dating_post AS p
+    JOIN dating_user AS u ON u.id = p.author_id
+    WHERE p.is_active AND p.visibility = 'public'
+    ON CONFLICT (post_id) DO NOTHING
+"""
+
+
+def create_post_search_index(apps, schema_editor):
+    from dating.hashtag_utils import normalize_hashtags
+    from dating.search_utils import SEARCH_CONFIG, POST_SEARCH_WEIGHTS, build_search_terms
+
+    Post = apps.get_model('dating', 'Post')
+    PostSearchTerm = apps.get_model('dating', 'PostSearchTerm')
+    Hashtag = apps.get_model('dating', 'Hashtag')
+    PostHashtag = apps.get_model('dating', 'PostHashtag')
+
+    postgres = schema_editor.connection.vendor == 'postgresql'
+    if postgres:
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS dating_postsearchdocument_vector_gin '
+            'ON dating_postsearchdocument USING gin (search_vector)'
+        )
+        schema_editor.execute(POST_SEARCH_VECTOR_SQL, {'config': SEARCH_CONFIG})
+
+    posts = Post.objects.filter(is_active=True, visibility='public').select_related('author').only(
+        'id', 'content', 'hashtags', 'location', 'author__name'
+    )
+    hashtag_ids = {}
+    terms, links = [], []
+    for post in posts.iterator(chunk_size=2000):
+        hashtags = normalize_hashtags(post.hashtags if isinstance(post.hashtags, list) else [])
+        for name in hashtags:
+            if name not in hashtag_ids:
+                hashtag_ids[name] = Hashtag.objects.get_or_create(name=name)[0].id
+            links.append(PostHashtag(post_id=post.id, hashtag_id=hashtag_ids[name]))
+        if not postgres:
+            texts = {
+                'hashtags': ' '.join(hashtags),
+                'content': post.content or '',
+                'author': post.author.name or '',
+                'location': post.location or '',
+            }
+            for term, weight in build_search_terms(texts, POST_SEARCH_WEIGHTS).items():
+                terms.append(PostSearchTerm(post_id=post.id, term=term, weight=weight))
+        if len(terms) + len(links) >= 2000:
+            PostSearchTerm.objects.bulk_create(terms)
+            PostHashtag.objects.bulk_create(links, ignore_conflicts=True)
+            terms, links = [], []
+    PostSearchTerm.objects.bulk_create(terms)
+    PostHashtag.objects.bulk_create(links, ignore_conflicts=True)
+
+
+def drop_post_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS dating_postsearchdocument_vector_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dating', '0022_user_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Hashtag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PostSearchDocument',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='dating.post')),
+                ('search_vector', django.contrib.postgres.search.SearchVectorField(help_text='Weighted tsvector of hashtags, content, author and location', null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PostSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.PositiveSmallIntegerField(default=1, help_text='Relevance weight of the field the term came from')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='dating.post')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'post'], name='dating_post_term_86887d_idx')],
+                'unique_together': {('post', 'term')},
+            },
+        ),
+        migrations.CreateModel(
+            name='PostHashtag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hashtag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='post_links', to='dating.hashtag')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hashtag_links', to='dating.post')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['hashtag', 'post'], name='dating_post_hashtag_2604df_idx')],
+                'unique_together': {('post', 'hashtag')},
+            },
+        ),
+        migrations.RunPython(create_post_search_index, drop_post_search_index),
+    ]
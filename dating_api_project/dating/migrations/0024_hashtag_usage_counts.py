@@ -0,0 +1,53 @@
+# Generated by Django 4.2.7 on 2026-10-17 11:43
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+import django.utils.timezone
+
+
+def backfill_hashtag_usage(apps, schema_editor):
+    Hashtag = apps.get_model('dating', 'Hashtag')
+    PostHashtag = apps.get_model('dating', 'PostHashtag')
+    Post = apps.get_model('dating', 'Post')
+
+    # Links take the time of their post, so trending reflects when tags were posted
+    PostHashtag.objects.update(
+        created_at=Subquery(Post.objects.filter(id=OuterRef('post_id')).values('created_at')[:1])
+    )
+
+    for hashtag_id, uses in PostHashtag.objects.values('hashtag_id').annotate(uses=Count('id')).values_list('hashtag_id', 'uses'):
+        Hashtag.objects.filter(id=hashtag_id).update(usage_count=uses)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dating', '0023_post_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hashtag',
+            name='last_used_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='hashtag',
+            name='usage_count',
+            field=models.PositiveIntegerField(default=0, help_text='Number of searchable posts using this hashtag'),
+        ),
+        migrations.AddField(
+            model_name='posthashtag',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='hashtag',
+            index=models.Index(fields=['-usage_count', 'name'], name='dating_hash_usage_c_34dd07_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='posthashtag',
+            index=models.Index(fields=['created_at', 'hashtag'], name='dating_post_created_4ff63b_idx'),
+        ),
+        migrations.RunPython(backfill_hashtag_usage, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.7 on 2026-10-17 11:45
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def backfill_chat_inbox(apps, schema_editor):
+    Chat = apps.get_model('dating', 'Chat')
+    ChatParticipant = apps.get_model('dating', 'ChatParticipant')
+    Message = apps.get_model('dating', 'Message')
+
+    # Every chat member needs a ChatParticipant row to hold their inbox state
+    memberships = Chat.participants.through.objects.values_list('chat_id', 'user_id')
+    ChatParticipant.objects.bulk_create(
+        [ChatParticipant(chat_id=chat_id, user_id=user_id) for chat_id, user_id in memberships.iterator()],
+        batch_size=2000,
+        ignore_conflicts=True
+    )
+
+    Chat.objects.update(last_message=Subquery(
+        Message.objects.filter(chat_id=OuterRef('pk')).order_by('-timestamp', '-id').values('id')[:1]
+    ))
+
+    unread = Message.objects.filter(
+        chat_id=OuterRef('chat_id'),
+        is_read=False
+    ).exclude(sender_id=OuterRef('user_id')).values('chat_id').annotate(count=Count('id')).values('count')
+    ChatParticipant.objects.update(unread_count=Coalesce(Subquery(unread), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dating', '0024_hashtag_usage_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chat',
+            name='last_message',
+            field=models.ForeignKey(blank=True, help_text='Most recent message, maintained when messages are created', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='dating.message'),
+        ),
+        migrations.AddField(
+            model_name='chatparticipant',
+            name='unread_count',
+            field=models.PositiveIntegerField(default=0, help_text='Messages from others not yet read, maintained at write time'),
+        ),
+        migrations.RunPython(backfill_chat_inbox, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-17 11:49
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def backfill_read_cursors(apps, schema_editor):
+    ChatParticipant = apps.get_model('dating', 'ChatParticipant')
+    Message = apps.get_model('dating', 'Message')
+
+    # Start each cursor at the newest message from others already flagged as read
+    newest_read = Message.objects.filter(
+        chat_id=OuterRef('chat_id'),
+        is_read=True
+    ).exclude(sender_id=OuterRef('user_id')).order_by('-timestamp', '-id').values('id')[:1]
+    ChatParticipant.objects.filter(last_read_message__isnull=True).update(last_read_message=Subquery(newest_read))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dating', '0025_chat_inbox_denormalization'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chatparticipant',
+            name='last_read_message',
+            field=models.ForeignKey(blank=True, help_text='Read cursor: every message up to this one has been read', null=True, on_delete=django.db.models.deletion.SET_NULL, to='dating.message'),
+        ),
+        migrations.RunPython(backfill_read_cursors, migrations.RunPython.noop),
+    ]
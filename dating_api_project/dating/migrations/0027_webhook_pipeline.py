@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-17 11:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dating', '0026_read_cursors'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentwebhook',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Processing attempts so far'),
+        ),
+        migrations.AddField(
+            model_name='paymentwebhook',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, help_text='When the event is next due for processing (also the lease of a running attempt)', null=True),
+        ),
+        migrations.AlterField(
+            model_name='paymentwebhook',
+            name='event_id',
+            field=models.CharField(help_text='Provider event ID (unique per provider)', max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='paymentwebhook',
+            index=models.Index(fields=['processed', 'next_attempt_at'], name='dating_paym_process_c2bc01_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:00
+
+from django.db import migrations, models
+
+
+def backfill_email_status(apps, schema_editor):
+    EmailLog = apps.get_model('dating', 'EmailLog')
+
+    # Emails logged before the queue existed were already attempted; never resend them
+    EmailLog.objects.filter(is_sent=True).update(status='sent', attempts=1)
+    EmailLog.objects.filter(is_sent=False).update(status='failed', attempts=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dating', '0027_webhook_pipeline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emaillog',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='emaillog',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, help_text='Earliest time of the next delivery attempt', null=True),
+        ),
+        migrations.AddField(
+            model_name='emaillog',
+            name='status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('sent', 'Sent'), ('failed', 'Failed')], default='queued', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='emaillog',
+            name='email_type',
+            field=models.CharField(choices=[('newsletter_welcome', 'Newsletter Welcome'), ('waitlist_confirmation', 'Waitlist Confirmation'), ('generic', 'Generic Email'), ('job_application_confirmation', 'Job Application Confirmation'), ('admin_otp', 'Admin Login OTP'), ('email_verification', 'Email Verification'), ('password_reset', 'Password Reset')], max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='emaillog',
+            index=models.Index(fields=['status', 'next_attempt_at'], name='dating_emai_status_f4745f_idx'),
+        ),
+        migrations.RunPython(backfill_email_status, migrations.RunPython.noop),
+    ]
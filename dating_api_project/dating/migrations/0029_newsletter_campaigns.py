@@ -0,0 +1,51 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dating', '0028_email_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NewsletterCampaign',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=200)),
+                ('message', models.TextField(help_text='Django template, rendered once per campaign')),
+                ('status', models.CharField(choices=[('draft', 'Draft'), ('queuing', 'Queuing Recipients'), ('sending', 'Sending'), ('completed', 'Completed')], default='draft', max_length=20)),
+                ('last_subscriber_id', models.PositiveIntegerField(default=0)),
+                ('recipients_queued', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='emaillog',
+            name='email_type',
+            field=models.CharField(choices=[('newsletter_welcome', 'Newsletter Welcome'), ('waitlist_confirmation', 'Waitlist Confirmation'), ('generic', 'Generic Email'), ('job_application_confirmation', 'Job Application Confirmation'), ('admin_otp', 'Admin Login OTP'), ('email_verification', 'Email Verification'), ('password_reset', 'Password Reset'), ('newsletter_campaign', 'Newsletter Campaign')], max_length=50),
+        ),
+        migrations.AddField(
+            model_name='newslettercampaign',
+            name='created_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='dating.adminuser'),
+        ),
+        migrations.AddField(
+            model_name='emaillog',
+            name='campaign',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='emails', to='dating.newslettercampaign'),
+        ),
+        migrations.AddConstraint(
+            model_name='emaillog',
+            constraint=models.UniqueConstraint(condition=models.Q(('campaign__isnull', False)), fields=('campaign', 'recipient_email'), name='unique_campaign_recipient'),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:07
+
+import math
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_rank_scores(apps, schema_editor):
+    Post = apps.get_model('dating', 'Post')
+
+    # Same formula as feed_utils.rank_score (12 hour half-life)
+    posts = []
+    for post in Post.objects.only('id', 'created_at', 'likes_count', 'comments_count', 'shares_count', 'bonds_count').iterator():
+        engagement = post.likes_count + post.comments_count + post.shares_count + post.bonds_count
+        post.rank_score = math.log2(1 + engagement) + post.created_at.timestamp() / (12 * 60 * 60)
+        posts.append(post)
+        if len(posts) >= 1000:
+            Post.objects.bulk_update(posts, ['rank_score'])
+            posts = []
+    Post.objects.bulk_update(posts, ['rank_score'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dating', '0029_newsletter_campaigns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(help_text='When the post was created; timelines are trimmed by age')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='rank_score',
+            field=models.FloatField(default=0, help_text='Feed ranking from engagement and recency (see feed_utils)'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['rank_score', 'id'], name='dating_post_rank_sc_f868f2_idx'),
+        ),
+        migrations.AddField(
+            model_name='feedentry',
+            name='post',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='dating.post'),
+        ),
+        migrations.AddField(
+            model_name='feedentry',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', 'created_at'], name='dating_feed_user_id_3c6fed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['created_at'], name='dating_feed_created_50d7a9_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='feedentry',
+            unique_together={('user', 'post')},
+        ),
+        migrations.RunPython(backfill_rank_scores, migrations.RunPython.noop),
+    ]
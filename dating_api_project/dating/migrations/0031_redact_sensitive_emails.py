@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-17 13:00
+
+from django.db import migrations
+
+
+def redact_sensitive_emails(apps, schema_editor):
+    EmailLog = apps.get_model('dating', 'EmailLog')
+
+    # OTP codes and verification/reset links already delivered or given up on
+    EmailLog.objects.filter(
+        email_type__in=('admin_otp', 'email_verification', 'password_reset'),
+        status__in=('sent', 'failed')
+    ).update(message='[redacted after delivery]')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dating', '0030_home_feed'),
+    ]
+
+    operations = [
+        migrations.RunPython(redact_sensitive_emails, migrations.RunPython.noop),
+    ]
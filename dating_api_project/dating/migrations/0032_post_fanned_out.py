@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:51
+
+from django.db import migrations, models
+
+
+def mark_fanned_out_posts(apps, schema_editor):
+    FeedEntry = apps.get_model('dating', 'FeedEntry')
+    Post = apps.get_model('dating', 'Post')
+
+    # Posts already in some timeline were pushed; the rest are pulled
+    Post.objects.filter(id__in=FeedEntry.objects.values('post_id')).update(fanned_out=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dating', '0031_redact_sensitive_emails'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='fanned_out',
+            field=models.BooleanField(default=False, help_text="Pushed into followers' timelines; other recent posts are pulled (see feed_utils)"),
+        ),
+        migrations.RunPython(mark_fanned_out_posts, migrations.RunPython.noop),
+    ]
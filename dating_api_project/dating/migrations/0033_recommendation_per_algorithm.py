@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:54
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dating', '0032_post_fanned_out'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='recommendationengine',
+            unique_together={('user', 'recommended_user', 'algorithm')},
+        ),
+    ]
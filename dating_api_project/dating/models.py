@@ -1,11 +1,52 @@
 import random
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 
+# User fields that feed the interest/hobby tag index and the full-text search index
+TAG_FIELDS = ('interests', 'hobbies')
+SEARCH_FIELDS = ('name', 'bio', 'city', 'state', 'country')
+# Post fields that feed the post search and hashtag indexes
+POST_SEARCH_FIELDS = ('content', 'hashtags', 'location', 'is_active', 'visibility')
+
+
+class IndexedFieldsMixin:
+    """
+    Remember the values of `indexed_fields` as loaded/saved, so save() can
+    refresh denormalized indexes only when one of their source fields changed
+    """
+    indexed_fields = ()
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._saved_indexed_values = self._indexed_values()
+    
+    def _indexed_values(self):
+        """Copy of the indexed fields, without loading deferred ones"""
+        values = {}
+        for field in self.indexed_fields:
+            value = self.__dict__.get(field)
+            values[field] = list(value) if isinstance(value, list) else value
+        return values
+    
+    def _changed_indexed_fields(self, update_fields=None):
+        """Indexed fields that differ from the last loaded/saved values"""
+        if self._state.adding:
+            changed = set(self.indexed_fields)
+        else:
+            current = self._indexed_values()
+            changed = {field for field, value in current.items() if value != self._saved_indexed_values[field]}
+        if update_fields is not None:
+            changed &= set(update_fields)
+        return changed
+    
+    def _mark_indexed_fields_saved(self):
+        self._saved_indexed_values = self._indexed_values()
+
 
-class User(AbstractUser):
+class User(IndexedFieldsMixin, AbstractUser):
     name = models.CharField(max_length=100)
     email = models.EmailField(unique=True)
     gender = models.CharField(max_length=10, blank=True, null=True)
@@ -22,6 +63,8 @@ class User(AbstractUser):
     state = models.CharField(max_length=100, blank=True, null=True)
     country = models.CharField(max_length=100, blank=True, null=True)
     postal_code = models.CharField(max_length=20, blank=True, null=True)
+    location_geohash = models.CharField(max_length=12, blank=True, null=True, db_index=True,
+                                        help_text="Geohash of latitude/longitude for nearby-user lookups")
     
     # Location Privacy Settings
     location_privacy = models.CharField(max_length=20, choices=[
@@ -186,9 +229,42 @@ class User(AbstractUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']  # 'username' is still required by AbstractUser
 
+    indexed_fields = TAG_FIELDS + SEARCH_FIELDS
+    
     def __str__(self):
         return self.email
     
+    def save(self, *args, **kwargs):
+        # Keep the spatial index column in sync with the coordinates
+        from .geohash_utils import encode_geohash
+        if self.has_location:
+            self.location_geohash = encode_geohash(float(self.latitude), float(self.longitude))
+        else:
+            self.location_geohash = None
+        
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and ({'latitude', 'longitude'} & set(update_fields)):
+            kwargs['update_fields'] = set(update_fields) | {'location_geohash'}
+        
+        # Keep the tag and search indexes in sync when their source fields change
+        changed_fields = self._changed_indexed_fields(update_fields)
+        is_new = self._state.adding
+        
+        super().save(*args, **kwargs)
+        
+        if changed_fields & set(TAG_FIELDS):
+            from .tag_utils import sync_user_tags
+            sync_user_tags(self)
+        if changed_fields & set(SEARCH_FIELDS):
+            from .search_utils import update_user_search_index
+            update_user_search_index(self)
+        if 'name' in changed_fields and not is_new:
+            # The author's name is part of their posts' search documents
+            from .search_utils import update_author_posts_search_index
+            from .task_utils import submit_job
+            submit_job(update_author_posts_search_index, self.id)
+        self._mark_indexed_fields_saved()
+    
     @property
     def has_location(self):
         """Check if user has valid GPS coordinates"""
@@ -279,6 +355,34 @@ class NewsletterSubscriber(models.Model):
         return self.email
 
 
+class NewsletterCampaign(models.Model):
+    """A newsletter broadcast to every subscriber, sent through the email queue (see email_utils)"""
+    STATUS_CHOICES = (
+        ('draft', 'Draft'),
+        ('queuing', 'Queuing Recipients'),
+        ('sending', 'Sending'),
+        ('completed', 'Completed'),
+    )
+
+    subject = models.CharField(max_length=200)
+    message = models.TextField(help_text="Django template, rendered once per campaign")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft')
+    created_by = models.ForeignKey('AdminUser', on_delete=models.SET_NULL, null=True, blank=True)
+    # Resume point: every subscriber up to this id already has a queued email
+    last_subscriber_id = models.PositiveIntegerField(default=0)
+    recipients_queued = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.subject} - {self.get_status_display()}"
+
+    class Meta:
+        ordering = ['-created_at']
+
+
 class PuzzleVerification(models.Model):
     user = models.ForeignKey('User', on_delete=models.CASCADE)
     question = models.CharField(max_length=255)
@@ -332,6 +436,17 @@ class EmailLog(models.Model):
         ('newsletter_welcome', 'Newsletter Welcome'),
         ('waitlist_confirmation', 'Waitlist Confirmation'),
         ('generic', 'Generic Email'),
+        ('job_application_confirmation', 'Job Application Confirmation'),
+        ('admin_otp', 'Admin Login OTP'),
+        ('email_verification', 'Email Verification'),
+        ('password_reset', 'Password Reset'),
+        ('newsletter_campaign', 'Newsletter Campaign'),
+    )
+
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
     )
 
     email_type = models.CharField(max_length=50, choices=EMAIL_TYPES)
@@ -341,12 +456,28 @@ class EmailLog(models.Model):
     sent_at = models.DateTimeField(auto_now_add=True)
     is_sent = models.BooleanField(default=False)
     error_message = models.TextField(blank=True, null=True)
+    # Outbound mail queue (see email_utils): delivered by a background worker
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True, help_text="Earliest time of the next delivery attempt")
+    campaign = models.ForeignKey(NewsletterCampaign, on_delete=models.CASCADE, null=True, blank=True, related_name='emails')
 
     def __str__(self):
-        return f"{self.email_type} to {self.recipient_email} - {'Sent' if self.is_sent else 'Failed'}"
+        return f"{self.email_type} to {self.recipient_email} - {self.get_status_display()}"
 
     class Meta:
         ordering = ['-sent_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+        constraints = [
+            # A campaign reaches each subscriber once, even when queuing is resumed
+            models.UniqueConstraint(
+                fields=['campaign', 'recipient_email'],
+                condition=models.Q(campaign__isnull=False),
+                name='unique_campaign_recipient'
+            ),
+        ]
 
 
 class Job(models.Model):
@@ -576,6 +707,14 @@ class UserMatch(models.Model):
     def __str__(self):
         return f"{self.user1.email} <-> {self.user2.email} ({self.distance:.2f}km)"
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Matched users follow each other: bring each one's recent posts into the other's feed
+        if self.status == 'matched':
+            from .feed_utils import enqueue_follow_backfill
+            enqueue_follow_backfill(self.user1_id, self.user2_id)
+            enqueue_follow_backfill(self.user2_id, self.user1_id)
+    
     class Meta:
         unique_together = ['user1', 'user2']
         ordering = ['-created_at']
@@ -614,6 +753,63 @@ class UserInterest(models.Model):
         ordering = ['name']
 
 
+class InterestTag(models.Model):
+    """Normalized interest/hobby tag, shared by every user who lists it"""
+    name = models.CharField(max_length=100, unique=True, help_text="Lowercased, whitespace-collapsed tag")
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return self.name
+    
+    class Meta:
+        ordering = ['name']
+
+
+class UserInterestTag(models.Model):
+    """Join of users to their interest/hobby tags, kept in sync from User.interests and User.hobbies"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='interest_tags')
+    tag = models.ForeignKey(InterestTag, on_delete=models.CASCADE, related_name='user_tags')
+    tag_type = models.CharField(max_length=10, choices=[
+        ('interest', 'Interest'),
+        ('hobby', 'Hobby')
+    ])
+    
+    def __str__(self):
+        return f"{self.user.email} - {self.tag.name} ({self.tag_type})"
+    
+    class Meta:
+        unique_together = ['user', 'tag', 'tag_type']
+        indexes = [
+            models.Index(fields=['tag', 'tag_type', 'user']),
+        ]
+
+
+class UserSearchDocument(models.Model):
+    """Full-text search document for a user (PostgreSQL tsvector, GIN indexed)"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    search_vector = SearchVectorField(null=True, help_text="Weighted tsvector of name, location and bio")
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Search document for {self.user.email}"
+
+
+class UserSearchTerm(models.Model):
+    """Local inverted index of user search terms, used when the database has no full-text search"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='search_terms')
+    term = models.CharField(max_length=64)
+    weight = models.PositiveSmallIntegerField(default=1, help_text="Relevance weight of the field the term came from")
+    
+    def __str__(self):
+        return f"{self.term} -> {self.user.email}"
+    
+    class Meta:
+        unique_together = ['user', 'term']
+        indexes = [
+            models.Index(fields=['term', 'user']),
+        ]
+
+
 class UserProfileView(models.Model):
     """Track profile views for analytics and recommendations"""
     viewer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='profile_views_made')
@@ -657,6 +853,14 @@ class UserInteraction(models.Model):
     def __str__(self):
         return f"{self.user.email} {self.interaction_type} {self.target_user.email}"
     
+    def save(self, *args, **kwargs):
+        is_new = self._state.adding
+        super().save(*args, **kwargs)
+        # Likes make the user a follower: bring the author's recent posts into their feed
+        from .feed_utils import FOLLOW_INTERACTIONS, enqueue_follow_backfill
+        if is_new and self.interaction_type in FOLLOW_INTERACTIONS:
+            enqueue_follow_backfill(self.user_id, self.target_user_id)
+    
     class Meta:
         unique_together = ['user', 'target_user', 'interaction_type']
         ordering = ['-created_at']
@@ -695,7 +899,8 @@ class RecommendationEngine(models.Model):
         return f"{self.user.email} -> {self.recommended_user.email} ({self.score})"
     
     class Meta:
-        unique_together = ['user', 'recommended_user']
+        # Each algorithm owns its rows, so refreshing one never rewrites another's
+        unique_together = ['user', 'recommended_user', 'algorithm']
         ordering = ['-score']
 
 
@@ -735,6 +940,8 @@ class Chat(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     last_message_at = models.DateTimeField(blank=True, null=True)
+    last_message = models.ForeignKey('Message', on_delete=models.SET_NULL, null=True, blank=True, related_name='+',
+                                     help_text="Most recent message, maintained when messages are created")
     is_active = models.BooleanField(default=True)
     
     # Chat settings
@@ -758,8 +965,9 @@ class Chat(models.Model):
         return None
     
     def get_unread_count(self, user):
-        """Get unread message count for a specific user"""
-        return self.messages.filter(is_read=False).exclude(sender=user).count()
+        """Get unread message count for a specific user (maintained on ChatParticipant)"""
+        participant = self.chat_participants.filter(user=user).only('unread_count').first()
+        return participant.unread_count if participant else 0
     
     class Meta:
         ordering = ['-last_message_at']
@@ -820,17 +1028,18 @@ class Message(models.Model):
         return f"{sender_name}: {self.content[:50]}..." if self.content else f"{sender_name}: {self.message_type}"
     
     def save(self, *args, **kwargs):
+        is_new = self._state.adding
         super().save(*args, **kwargs)
-        # Update the last_message_at for the associated chat
-        self.chat.last_message_at = self.timestamp
-        self.chat.save(update_fields=['last_message_at'])
+        # Update the chat's last message and the participants' unread counters
+        if is_new:
+            from .chat_utils import record_new_message
+            record_new_message(self)
     
     def mark_as_read(self, user):
-        """Mark message as read by a specific user"""
-        if self.sender != user and not self.is_read:
-            self.is_read = True
-            self.read_at = timezone.now()
-            self.save(update_fields=['is_read', 'read_at'])
+        """Mark message as read by a specific user (advances their read cursor)"""
+        if self.sender_id != user.id:
+            from .chat_utils import advance_read_cursor
+            advance_read_cursor(self.chat, user, self)
     
     class Meta:
         ordering = ['timestamp']
@@ -899,6 +1108,12 @@ class Call(models.Model):
     def __str__(self):
         return f"{self.caller.name} → {self.callee.name} ({self.call_type}) - {self.status}"
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Push the call state to the caller's and callee's real-time connections
+        from .realtime_utils import broadcast_call_state
+        broadcast_call_state(self)
+    
     def get_duration_display(self):
         """Get formatted duration string"""
         if self.duration:
@@ -931,7 +1146,8 @@ class ChatParticipant(models.Model):
     
     # Last seen
     last_seen_at = models.DateTimeField(blank=True, null=True)
-    last_read_message = models.ForeignKey(Message, on_delete=models.SET_NULL, null=True, blank=True)
+    last_read_message = models.ForeignKey(Message, on_delete=models.SET_NULL, null=True, blank=True, help_text="Read cursor: every message up to this one has been read")
+    unread_count = models.PositiveIntegerField(default=0, help_text="Messages from others not yet read, maintained at write time")
     
     def __str__(self):
         return f"{self.user.name} in {self.chat}"
@@ -1381,7 +1597,7 @@ class UserRoleSelection(models.Model):
 # SOCIAL FEED AND STORY MODELS (NEW)
 # =============================================================================
 
-class Post(models.Model):
+class Post(IndexedFieldsMixin, models.Model):
     """Represents user posts in the Bond Story feed"""
     POST_TYPES = [
         ('story', 'Story'),
@@ -1415,6 +1631,8 @@ class Post(models.Model):
     comments_count = models.PositiveIntegerField(default=0)
     shares_count = models.PositiveIntegerField(default=0)
     bonds_count = models.PositiveIntegerField(default=0, help_text="Handshake/bond reactions")
+    rank_score = models.FloatField(default=0, help_text="Feed ranking from engagement and recency (see feed_utils)")
+    fanned_out = models.BooleanField(default=False, help_text="Pushed into followers' timelines; other recent posts are pulled (see feed_utils)")
     
     # Status and moderation
     is_active = models.BooleanField(default=True)
@@ -1425,13 +1643,56 @@ class Post(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    indexed_fields = POST_SEARCH_FIELDS
+    ENGAGEMENT_FIELDS = ('likes_count', 'comments_count', 'shares_count', 'bonds_count')
+    
     def __str__(self):
         return f"{self.author.name}: {self.content[:50]}..."
     
+    def save(self, *args, **kwargs):
+        # Keep the search and hashtag indexes in sync when their source fields change
+        changed_fields = self._changed_indexed_fields(kwargs.get('update_fields'))
+        is_new = self.pk is None
+        
+        # Re-rank whenever engagement changes
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or set(update_fields) & set(self.ENGAGEMENT_FIELDS):
+            self.rank_score = self.get_rank_score()
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'rank_score'}
+        
+        super().save(*args, **kwargs)
+        
+        if is_new:
+            from .feed_utils import enqueue_fan_out
+            enqueue_fan_out(self)
+        if changed_fields:
+            from .search_utils import update_post_search_index
+            from .hashtag_utils import sync_post_hashtags
+            update_post_search_index(self)
+            sync_post_hashtags(self)
+        self._mark_indexed_fields_saved()
+    
+    def delete(self, *args, **kwargs):
+        # Release this post's hashtag usage counts before the links cascade away
+        from .hashtag_utils import release_post_hashtags
+        release_post_hashtags(self)
+        return super().delete(*args, **kwargs)
+    
+    @property
+    def is_searchable(self):
+        """Only active public posts are indexed for search"""
+        return self.is_active and self.visibility == 'public'
+    
     def get_engagement_score(self):
         """Calculate total engagement score"""
         return self.likes_count + self.comments_count + self.shares_count + self.bonds_count
     
+    def get_rank_score(self):
+        """Feed ranking score from engagement and recency"""
+        from .feed_utils import rank_score
+        return rank_score(self.get_engagement_score(), self.created_at or timezone.now())
+    
     class Meta:
         ordering = ['-created_at']
         indexes = [
@@ -1439,6 +1700,67 @@ class Post(models.Model):
             models.Index(fields=['post_type', 'is_active']),
             models.Index(fields=['visibility', 'created_at']),
             models.Index(fields=['is_featured', 'created_at']),
+            models.Index(fields=['rank_score', 'id']),
+        ]
+
+
+class PostSearchDocument(models.Model):
+    """Full-text search document for a searchable post (PostgreSQL tsvector, GIN indexed)"""
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    search_vector = SearchVectorField(null=True, help_text="Weighted tsvector of hashtags, content, author and location")
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Search document for post {self.post_id}"
+
+
+class PostSearchTerm(models.Model):
+    """Local inverted index of post search terms, used when the database has no full-text search"""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='search_terms')
+    term = models.CharField(max_length=64)
+    weight = models.PositiveSmallIntegerField(default=1, help_text="Relevance weight of the field the term came from")
+    
+    def __str__(self):
+        return f"{self.term} -> post {self.post_id}"
+    
+    class Meta:
+        unique_together = ['post', 'term']
+        indexes = [
+            models.Index(fields=['term', 'post']),
+        ]
+
+
+class Hashtag(models.Model):
+    """Normalized hashtag (without '#', casefolded), shared by every post that uses it"""
+    name = models.CharField(max_length=100, unique=True)
+    usage_count = models.PositiveIntegerField(default=0, help_text="Number of searchable posts using this hashtag")
+    last_used_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"#{self.name}"
+    
+    class Meta:
+        ordering = ['name']
+        indexes = [
+            models.Index(fields=['-usage_count', 'name']),
+        ]
+
+
+class PostHashtag(models.Model):
+    """Join of searchable posts to their hashtags, kept in sync from Post.hashtags"""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='hashtag_links')
+    hashtag = models.ForeignKey(Hashtag, on_delete=models.CASCADE, related_name='post_links')
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"#{self.hashtag.name} -> post {self.post_id}"
+    
+    class Meta:
+        unique_together = ['post', 'hashtag']
+        indexes = [
+            models.Index(fields=['hashtag', 'post']),
+            models.Index(fields=['created_at', 'hashtag']),
         ]
 
 
@@ -1516,6 +1838,23 @@ class CommentInteraction(models.Model):
         ordering = ['-created_at']
 
 
+class FeedEntry(models.Model):
+    """A post materialized into a follower's home timeline (fan-out on write, see feed_utils)"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='feed_entries')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='feed_entries')
+    created_at = models.DateTimeField(help_text="When the post was created; timelines are trimmed by age")
+    
+    def __str__(self):
+        return f"Post {self.post_id} in {self.user_id}'s feed"
+    
+    class Meta:
+        unique_together = ['user', 'post']
+        indexes = [
+            models.Index(fields=['user', 'created_at']),
+            models.Index(fields=['created_at']),
+        ]
+
+
 class PostReport(models.Model):
     """Store reports for posts and comments"""
     REPORT_TYPES = [
@@ -1601,6 +1940,17 @@ class Story(models.Model):
     def __str__(self):
         return f"{self.author.name}'s {self.story_type} story"
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # New and edited stories show up in the story tray once committed
+        from .story_utils import invalidate_author_stories
+        invalidate_author_stories([self.author_id])
+    
+    def delete(self, *args, **kwargs):
+        from .story_utils import invalidate_author_stories
+        invalidate_author_stories([self.author_id])
+        return super().delete(*args, **kwargs)
+    
     def is_expired(self):
         """Check if story has expired"""
         from django.utils import timezone
@@ -2341,11 +2691,13 @@ class PaymentWebhook(models.Model):
     """Webhook events from payment providers"""
     provider = models.CharField(max_length=50, help_text="Payment provider (stripe, paypal, etc.)")
     event_type = models.CharField(max_length=100, help_text="Webhook event type")
-    event_id = models.CharField(max_length=255, unique=True, help_text="Provider event ID")
+    event_id = models.CharField(max_length=255, help_text="Provider event ID (unique per provider)")
     transaction = models.ForeignKey(PaymentTransaction, on_delete=models.CASCADE, blank=True, null=True, related_name='webhooks')
     payload = models.JSONField(help_text="Webhook payload data")
     processed = models.BooleanField(default=False)
     processing_error = models.TextField(blank=True, null=True)
+    attempts = models.PositiveSmallIntegerField(default=0, help_text="Processing attempts so far")
+    next_attempt_at = models.DateTimeField(blank=True, null=True, help_text="When the event is next due for processing (also the lease of a running attempt)")
     created_at = models.DateTimeField(auto_now_add=True)
     processed_at = models.DateTimeField(blank=True, null=True)
     
@@ -2354,6 +2706,7 @@ class PaymentWebhook(models.Model):
         indexes = [
             models.Index(fields=['provider', 'event_type']),
             models.Index(fields=['processed', 'created_at']),
+            models.Index(fields=['processed', 'next_attempt_at']),
         ]
         unique_together = ['provider', 'event_id']
     
@@ -0,0 +1,136 @@
+"""
+Newsletter campaigns - broadcast to every subscriber through the email queue
+
+A campaign renders its template once, then streams subscribers in id order,
+NEWSLETTER_CHUNK_SIZE at a time. Each chunk becomes queued EmailLog rows via
+one bulk_create, committed together with the campaign's resume point
+(last_subscriber_id), so a crash mid-campaign resumes after the last chunk
+queued and never emails a subscriber twice. Delivery, connection pooling,
+rate shaping and retries are the email queue's (see email_utils), which
+marks the campaign completed once its last email is sent or given up on.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef, Q
+from django.template import Context, Template
+from django.utils import timezone
+
+from .email_utils import request_delivery
+from .models import EmailLog, NewsletterCampaign, NewsletterSubscriber
+from .task_utils import submit_job
+
+NEWSLETTER_CHUNK_SIZE = getattr(settings, 'NEWSLETTER_CHUNK_SIZE', 1000)
+# A campaign left queuing this long is assumed to belong to a dead worker
+STALLED_CAMPAIGN_AGE = timedelta(minutes=10)
+
+
+def start_campaign(campaign) -> bool:
+    """
+    Start a draft campaign in the background. Returns False if it was not a draft.
+    """
+    started = NewsletterCampaign.objects.filter(id=campaign.id, status='draft').update(
+        status='queuing', started_at=timezone.now(), updated_at=timezone.now()
+    )
+    if started:
+        submit_job(queue_campaign, campaign.id)
+    return bool(started)
+
+
+def render_campaign(campaign):
+    """The campaign's subject and body, rendered once for every recipient"""
+    # Plain-text emails: no HTML escaping
+    context = Context({'campaign': campaign}, autoescape=False)
+    return Template(campaign.subject).render(context), Template(campaign.message).render(context)
+
+
+def queue_campaign(campaign_id, chunk_size: int = NEWSLETTER_CHUNK_SIZE) -> int:
+    """
+    Queue the campaign's emails from its resume point onwards, chunk by chunk.
+    Returns the number of emails queued by this call.
+    """
+    campaign = NewsletterCampaign.objects.get(id=campaign_id)
+    if campaign.status != 'queuing':
+        return 0
+    subject, message = render_campaign(campaign)
+
+    queued = 0
+    last_subscriber_id = campaign.last_subscriber_id
+    while True:
+        chunk = list(
+            NewsletterSubscriber.objects.filter(id__gt=last_subscriber_id).order_by('id').values_list('id', 'email')[:chunk_size]
+        )
+        if not chunk:
+            break
+        last_subscriber_id = chunk[-1][0]
+        # Recipients already queued by an interrupted run of this chunk
+        already_queued = set(EmailLog.objects.filter(
+            campaign_id=campaign_id, recipient_email__in=[email for _, email in chunk]
+        ).values_list('recipient_email', flat=True))
+        chunk = [(subscriber_id, email) for subscriber_id, email in chunk if email not in already_queued]
+
+        with transaction.atomic():
+            # ignore_conflicts hides which rows were inserted: count them instead
+            EmailLog.objects.bulk_create([
+                EmailLog(
+                    email_type='newsletter_campaign',
+                    recipient_email=email,
+                    subject=subject,
+                    message=message,
+                    status='queued',
+                    campaign_id=campaign_id
+                )
+                for _, email in chunk
+            ], ignore_conflicts=True)
+            inserted = EmailLog.objects.filter(
+                campaign_id=campaign_id, recipient_email__in=[email for _, email in chunk]
+            ).count() if chunk else 0
+            NewsletterCampaign.objects.filter(id=campaign_id, last_subscriber_id__lt=last_subscriber_id).update(
+                last_subscriber_id=last_subscriber_id,
+                recipients_queued=F('recipients_queued') + inserted,
+                updated_at=timezone.now()
+            )
+            # Start sending while the rest of the list is still being queued
+            request_delivery()
+        queued += inserted
+
+    NewsletterCampaign.objects.filter(id=campaign_id, status='queuing').update(status='sending', updated_at=timezone.now())
+    # Every email may already have gone out while the list was being queued
+    complete_finished_campaigns([campaign_id])
+    return queued
+
+
+def get_campaign_progress(campaign) -> dict:
+    """Delivery counts for a campaign"""
+    return EmailLog.objects.filter(campaign=campaign).aggregate(
+        queued=Count('id', filter=Q(status='queued')),
+        sent=Count('id', filter=Q(status='sent')),
+        failed=Count('id', filter=Q(status='failed')),
+    )
+
+
+def complete_finished_campaigns(campaign_ids=None) -> int:
+    """
+    Mark sending campaigns completed once none of their emails is left
+    queued (all campaigns when no ids are given). Returns the number completed.
+    """
+    campaigns = NewsletterCampaign.objects.filter(status='sending')
+    if campaign_ids is not None:
+        campaigns = campaigns.filter(id__in=campaign_ids)
+    return campaigns.filter(
+        ~Exists(EmailLog.objects.filter(campaign=OuterRef('pk'), status='queued'))
+    ).update(status='completed', completed_at=timezone.now(), updated_at=timezone.now())
+
+
+def resume_stalled_campaigns() -> int:
+    """
+    Finish queuing campaigns whose background job was lost with a restarted
+    process. Returns the number of emails queued.
+    """
+    stalled_before = timezone.now() - STALLED_CAMPAIGN_AGE
+    queued = 0
+    for campaign_id in NewsletterCampaign.objects.filter(status='queuing', updated_at__lt=stalled_before).values_list('id', flat=True):
+        queued += queue_campaign(campaign_id)
+    return queued
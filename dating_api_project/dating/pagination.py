@@ -0,0 +1,249 @@
+"""
+Pagination helpers - keyset (cursor) pagination and estimated counts
+
+OFFSET pagination makes the database walk and discard every row before the
+requested page, so deep pages get slower the further a client scrolls.
+Keyset pagination instead remembers the sort key of the last row it returned
+(e.g. ``(date_joined, id)``) and asks for rows strictly after it, which is an
+index range scan that costs the same on page 500 as on page 1.
+
+Clients opt in with ``?pagination=cursor`` on the first request and then pass
+back the returned ``next_cursor`` as ``?cursor=...``. ``?count=estimated``
+replaces the exact ``COUNT(*)`` with the query planner's row estimate; pages
+after the first cursor page are always estimated, since an exact count would
+scan the whole table on every page.
+"""
+
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+COUNT_MODES = ('exact', 'estimated')
+# Below this many estimated rows an exact COUNT is cheap enough to run instead
+ESTIMATED_COUNT_THRESHOLD = getattr(settings, 'ESTIMATED_COUNT_THRESHOLD', 1000)
+
+
+def encode_cursor(ordering: Sequence[str], values: Sequence[Any]) -> str:
+    """
+    Encode the sort key values of the last returned row as an opaque cursor
+    """
+    payload = {
+        'o': list(ordering),
+        'v': [value.isoformat() if isinstance(value, (date, datetime)) else value for value in values],
+    }
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, ordering: Sequence[str]) -> List[Any]:
+    """
+    Decode a cursor produced by encode_cursor for the same ordering.
+    Raises ValueError for malformed cursors or cursors from another ordering.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        values = payload['v']
+        cursor_ordering = payload['o']
+    except (ValueError, TypeError, KeyError):
+        raise ValueError('Invalid cursor')
+
+    if cursor_ordering != list(ordering) or not isinstance(values, list) or len(values) != len(ordering):
+        raise ValueError('Cursor does not match the requested ordering')
+    return values
+
+
+def keyset_filter(ordering: Sequence[str], values: Sequence[Any]) -> Q:
+    """
+    Build the "strictly after this row" condition for a multi-column ordering:
+    (a > x) OR (a = x AND b > y) OR ... with > flipped to < for descending fields.
+    Ordering fields must be non-null and end in a unique column such as id.
+    """
+    condition = Q()
+    equal_prefix = {}
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= Q(**equal_prefix, **{f'{name}__{lookup}': value})
+        equal_prefix[name] = value
+    return condition
+
+
+def keyset_paginate(queryset, ordering: Sequence[str], cursor: Optional[str] = None,
+                    page_size: int = DEFAULT_PAGE_SIZE) -> Tuple[List[Any], Optional[str]]:
+    """
+    Get one page of the queryset after the given cursor.
+    Returns (items, next_cursor); next_cursor is None on the last page.
+    Raises ValueError for malformed cursors, including well-formed cursors
+    whose values do not fit the ordering's fields.
+    """
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        try:
+            queryset = queryset.filter(keyset_filter(ordering, decode_cursor(cursor, ordering)))
+        except (DjangoValidationError, TypeError):
+            raise ValueError('Invalid cursor')
+
+    # Fetch one extra row to know whether another page exists without counting
+    items = list(queryset[:page_size + 1])
+    if len(items) <= page_size:
+        return items, None
+
+    items = items[:page_size]
+    last = items[-1]
+    return items, encode_cursor(ordering, [getattr(last, field.lstrip('-')) for field in ordering])
+
+
+def estimated_count(queryset) -> int:
+    """
+    Estimate the number of rows in the queryset without a full COUNT scan.
+    On PostgreSQL this is the planner's row estimate; small results, and other
+    databases, fall back to an exact count.
+    """
+    if connections[queryset.db].vendor == 'postgresql':
+        try:
+            plan = json.loads(queryset.order_by().explain(format='json'))
+            estimate = int(plan[0]['Plan']['Plan Rows'])
+            if estimate >= ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        except Exception:
+            pass
+    return queryset.count()
+
+
+def is_cursor_request(request) -> bool:
+    """Whether the client asked for keyset pagination"""
+    return bool(request.GET.get('cursor')) or request.GET.get('pagination') == 'cursor'
+
+
+def get_count_mode(request) -> str:
+    """Get the requested count mode ('exact' by default, or 'estimated')"""
+    count_mode = request.GET.get('count', 'exact')
+    if count_mode not in COUNT_MODES:
+        raise ValueError(f"count must be one of: {', '.join(COUNT_MODES)}")
+    return count_mode
+
+
+def get_page_size(request, default: int = DEFAULT_PAGE_SIZE) -> int:
+    """Get the requested page size, clamped to 1..MAX_PAGE_SIZE"""
+    return max(1, min(int(request.GET.get('page_size', default)), MAX_PAGE_SIZE))
+
+
+def paginate_queryset(request, queryset, ordering: Sequence[str],
+                      default_page_size: int = DEFAULT_PAGE_SIZE,
+                      count_queryset=None) -> Tuple[List[Any], Dict[str, Any]]:
+    """
+    Paginate an ordered queryset for an APIView, by page number or by cursor.
+    The total is counted once, on count_queryset when given (e.g. a cheaper
+    query over a search index), and only estimated when a cursor is given.
+    Returns (items, pagination) where pagination
+    is the metadata to merge into the response body.
+    Raises ValueError for invalid pagination parameters.
+    """
+    page_size = get_page_size(request, default_page_size)
+    count_mode = get_count_mode(request)
+    if request.GET.get('cursor'):
+        count_mode = 'estimated'
+    if count_queryset is None:
+        count_queryset = queryset
+    total_count = estimated_count(count_queryset) if count_mode == 'estimated' else count_queryset.count()
+
+    pagination = {
+        'total_count': total_count,
+        'count_mode': count_mode,
+        'page_size': page_size,
+    }
+
+    if is_cursor_request(request):
+        items, next_cursor = keyset_paginate(queryset, ordering, request.GET.get('cursor'), page_size)
+        pagination['next_cursor'] = next_cursor
+        return items, pagination
+
+    page = int(request.GET.get('page', 1))
+    if page < 1:
+        raise ValueError('page must be a positive integer')
+    start = (page - 1) * page_size
+    pagination['page'] = page
+    return list(queryset[start:start + page_size]), pagination
+
+
+class EstimatedCountPaginator(Paginator):
+    """Django paginator whose total is the planner estimate"""
+
+    @cached_property
+    def count(self):
+        return estimated_count(self.object_list)
+
+
+class KeysetPagination(PageNumberPagination):
+    """
+    Page-number pagination for generic list views with an opt-in cursor mode
+    (?pagination=cursor / ?cursor=...) keyed on `ordering`, and an opt-in
+    estimated total (?count=estimated). Subclasses set cursor_only for lists
+    that are only ever paged by cursor.
+    """
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = MAX_PAGE_SIZE
+    cursor_only = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.cursor_only or is_cursor_request(request)
+        try:
+            count_mode = get_count_mode(request)
+        except ValueError as e:
+            raise ValidationError({'count': str(e)})
+
+        if not self.cursor_mode:
+            if count_mode == 'estimated':
+                self.django_paginator_class = EstimatedCountPaginator
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        try:
+            items, self.next_cursor = keyset_paginate(
+                queryset, self.ordering, request.GET.get('cursor'), self.get_page_size(request)
+            )
+        except ValueError as e:
+            raise ValidationError({'cursor': str(e)})
+        return items
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response({
+            'next_cursor': self.next_cursor,
+            'next': self.get_next_cursor_link(),
+            'results': data,
+        })
+
+    def get_next_cursor_link(self):
+        if not self.next_cursor:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, 'cursor', self.next_cursor)
+
+
+class FeedPagination(KeysetPagination):
+    """Cursor-only pagination for ranked feeds (see feed_utils)"""
+    ordering = ('-rank_score', '-id')
+    cursor_only = True
+
+
+class CommentPagination(KeysetPagination):
+    """Cursor-only pagination for comment threads, oldest first"""
+    ordering = ('created_at', 'id')
+    cursor_only = True
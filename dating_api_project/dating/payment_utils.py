@@ -0,0 +1,126 @@
+"""
+Payment utilities - payment capture state machine
+
+A payment is created as `pending` and the request returns immediately; the
+capture runs as a background job. Every state change is one conditional
+UPDATE from the expected state, so a payment is captured at most once even
+if a job is submitted twice or a recovery run overlaps a live worker:
+
+    pending -> processing -> completed
+                          -> failed
+
+What the payment pays for (activating a subscription, crediting purchased
+Bondcoins) is applied in the same database transaction as the move to
+`completed`.
+"""
+
+import uuid
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import PaymentTransaction, UserSubscription
+from .task_utils import submit_job
+
+# A payment left in `processing` this long is assumed to belong to a dead worker
+STALLED_PAYMENT_AGE = timedelta(minutes=10)
+
+
+def transition_payment(payment_id, from_status, to_status: str, **fields) -> bool:
+    """
+    Move a payment between states with a single conditional UPDATE.
+    from_status may be one state or a tuple of states.
+    Returns False if the payment was no longer in from_status.
+    """
+    from_statuses = (from_status,) if isinstance(from_status, str) else tuple(from_status)
+    return PaymentTransaction.objects.filter(id=payment_id, status__in=from_statuses).update(
+        status=to_status, updated_at=timezone.now(), **fields
+    ) > 0
+
+
+def enqueue_capture(payment) -> None:
+    """Capture the payment in the background once the request's transaction commits"""
+    submit_job(capture_payment, payment.id)
+
+
+def complete_payment(payment_id, from_status, **fields) -> bool:
+    """
+    Mark a payment completed and fulfil it in one database transaction.
+    Returns False (nothing applied) if it was no longer in from_status.
+    """
+    with transaction.atomic():
+        if not transition_payment(payment_id, from_status, 'completed', processed_at=timezone.now(), **fields):
+            return False
+        _fulfil_payment(PaymentTransaction.objects.select_related(
+            'subscription__plan', 'bondcoin_transaction', 'user'
+        ).get(id=payment_id))
+    return True
+
+
+def fail_payment(payment_id, from_status, **fields) -> bool:
+    """Mark a payment failed. Returns False if it was no longer in from_status."""
+    return transition_payment(payment_id, from_status, 'failed', processed_at=timezone.now(), **fields)
+
+
+def capture_payment(payment_id) -> str:
+    """
+    Capture a pending payment with its provider and fulfil it.
+    Returns the payment's resulting status.
+    """
+    if transition_payment(payment_id, 'pending', 'processing'):
+        payment = PaymentTransaction.objects.get(id=payment_id)
+        try:
+            complete_payment(payment_id, 'processing', **_capture_with_provider(payment))
+        except Exception as e:
+            fail_payment(payment_id, 'processing', provider_response={'error': str(e)})
+    return PaymentTransaction.objects.filter(id=payment_id).values_list('status', flat=True).first()
+
+
+def resume_stalled_payments() -> int:
+    """
+    Capture payments whose background job was lost with a restarted process:
+    pending payments, and payments stuck in processing for longer than
+    STALLED_PAYMENT_AGE. Returns the number of payments attempted.
+    """
+    stalled_before = timezone.now() - STALLED_PAYMENT_AGE
+    stalled = list(PaymentTransaction.objects.filter(status='processing', updated_at__lt=stalled_before).values_list('id', flat=True))
+    for payment_id in stalled:
+        transition_payment(payment_id, 'processing', 'pending')
+
+    captured = 0
+    for payment_id in PaymentTransaction.objects.filter(status='pending').order_by('created_at').values_list('id', flat=True):
+        capture_payment(payment_id)
+        captured += 1
+    return captured
+
+
+def _capture_with_provider(payment) -> dict:
+    """
+    Capture the payment with the external provider.
+    Simulated until a provider integration exists: always succeeds.
+    """
+    return {
+        'provider': 'stripe',
+        'provider_transaction_id': f"txn_{payment.id}_{uuid.uuid4().hex[:12]}",
+    }
+
+
+def _fulfil_payment(payment) -> None:
+    """Apply what a completed payment pays for"""
+    from .bondcoin_utils import complete_transaction, debit
+
+    if payment.transaction_type == 'subscription' and payment.subscription:
+        subscription = payment.subscription
+        UserSubscription.objects.filter(id=subscription.id).update(status='active')
+        debit(
+            payment.user,
+            subscription.plan.price_bondcoins,
+            'subscription',
+            f"Subscription: {subscription.plan.display_name}",
+            subscription=subscription,
+            payment_method='external_payment'
+        )
+
+    elif payment.transaction_type == 'bondcoin_purchase' and payment.bondcoin_transaction:
+        complete_transaction(payment.bondcoin_transaction)
@@ -0,0 +1,200 @@
+"""
+Presence utilities - online status and last-seen tracking
+
+Clients send heartbeats (WebSocket pings, or the REST heartbeat endpoint).
+Each heartbeat is one cache write of the user's last-seen time; a user is
+online while their last heartbeat is younger than PRESENCE_TTL. Lookups for
+a whole page of users are a single cache multi-get.
+
+A user's open WebSocket connections (devices, tabs) are counted in the
+cache; closing the last one marks them offline straight away. Connections
+lost without a clean close leave the count too high, and the user then goes
+offline when their heartbeat expires instead.
+
+Last-seen times are written to ChatParticipant.last_seen_at in batches: each
+process buffers the heartbeats it received and flushes them PRESENCE_FLUSH_INTERVAL
+seconds after the first buffered one, in one UPDATE per batch of users.
+Processes that have buffered heartbeats also flush on exit; others (management
+commands, test runs) never touch the database at exit.
+
+Presence and connection counts live in the default cache, so they are only
+shared between processes when that is a shared cache (Redis, see REDIS_URL
+in settings); with the per-process default a user connected to one worker
+shows as offline in the others.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from typing import Dict, Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, DateTimeField, Value, When
+
+from .models import ChatParticipant
+
+logger = logging.getLogger(__name__)
+
+PRESENCE_TTL = getattr(settings, 'PRESENCE_TTL', 60)  # seconds without heartbeat before offline
+PRESENCE_CACHE_TTL = getattr(settings, 'PRESENCE_CACHE_TTL', 24 * 60 * 60)  # how long last-seen stays cached
+PRESENCE_FLUSH_INTERVAL = getattr(settings, 'PRESENCE_FLUSH_INTERVAL', 30)
+PRESENCE_FLUSH_BATCH_SIZE = 500
+
+# Heartbeats not yet written to the database: {user_id: epoch seconds}
+_pending_last_seen: Dict[int, float] = {}
+_pending_lock = threading.Lock()
+_flush_timer = None
+_exit_flush_registered = False
+
+
+def _presence_key(user_id) -> str:
+    return f'presence:{user_id}'
+
+
+def _connections_key(user_id) -> str:
+    return f'presence:connections:{user_id}'
+
+
+def record_heartbeat(user_id) -> None:
+    """
+    Mark a user online now, and flush buffered last-seen times when due
+    """
+    now = time.time()
+    cache.set(_presence_key(user_id), (now, True), PRESENCE_CACHE_TTL)
+    _buffer_last_seen(user_id, now)
+
+
+def record_connect(user_id) -> None:
+    """Count a newly opened real-time connection of the user, and mark them online"""
+    key = _connections_key(user_id)
+    cache.add(key, 0, PRESENCE_CACHE_TTL)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(key, 1, PRESENCE_CACHE_TTL)
+    record_heartbeat(user_id)
+
+
+def record_disconnect(user_id) -> None:
+    """
+    Count a closed real-time connection of the user; closing their last one
+    marks them offline. Other devices keep them online.
+    """
+    key = _connections_key(user_id)
+    try:
+        remaining = cache.decr(key)
+    except ValueError:
+        remaining = 0
+    if remaining <= 0:
+        cache.delete(key)
+        mark_offline(user_id)
+    else:
+        _buffer_last_seen(user_id, time.time())
+
+
+def mark_offline(user_id) -> None:
+    """
+    Mark a user offline immediately (e.g. their connection closed), keeping the last-seen time
+    """
+    now = time.time()
+    cache.set(_presence_key(user_id), (now, False), PRESENCE_CACHE_TTL)
+    _buffer_last_seen(user_id, now)
+
+
+def get_presence(user_ids: Iterable[int]) -> Dict[int, dict]:
+    """
+    Get {user_id: {'is_online', 'last_seen'}} for many users with one cache multi-get.
+    last_seen is None for users with no recent heartbeat in the cache.
+    """
+    user_ids = set(user_ids)
+    if not user_ids:
+        return {}
+
+    cached = cache.get_many([_presence_key(user_id) for user_id in user_ids])
+    now = time.time()
+    presence = {}
+    for user_id in user_ids:
+        last_seen, connected = cached.get(_presence_key(user_id), (None, False))
+        presence[user_id] = {
+            'is_online': connected and now - last_seen < PRESENCE_TTL,
+            'last_seen': datetime.fromtimestamp(last_seen, tz=dt_timezone.utc) if last_seen else None,
+        }
+    return presence
+
+
+def is_online(user_id) -> bool:
+    """Online status of a single user"""
+    return get_presence([user_id])[user_id]['is_online']
+
+
+def preload_presence(context: dict, user_ids: Iterable[int]) -> None:
+    """
+    Resolve the presence of a page of users into a serializer context in one
+    multi-get, skipping users already resolved
+    """
+    presence = context.setdefault('presence', {})
+    missing = set(user_ids) - set(presence)
+    if missing:
+        presence.update(get_presence(missing))
+
+
+def get_context_presence(context: dict, user_id) -> dict:
+    """Presence of one user from a serializer context, looked up if not preloaded"""
+    preload_presence(context, [user_id])
+    return context['presence'][user_id]
+
+
+def flush_presence() -> int:
+    """
+    Write buffered last-seen times to ChatParticipant.last_seen_at.
+    Returns the number of users flushed.
+    """
+    with _pending_lock:
+        pending = dict(_pending_last_seen)
+        _pending_last_seen.clear()
+    if not pending:
+        return 0
+
+    user_ids = list(pending)
+    for start in range(0, len(user_ids), PRESENCE_FLUSH_BATCH_SIZE):
+        batch = user_ids[start:start + PRESENCE_FLUSH_BATCH_SIZE]
+        # One UPDATE per batch, each user's rows getting their own timestamp
+        ChatParticipant.objects.filter(user_id__in=batch).update(last_seen_at=Case(
+            *[
+                When(user_id=user_id, then=Value(datetime.fromtimestamp(pending[user_id], tz=dt_timezone.utc)))
+                for user_id in batch
+            ],
+            output_field=DateTimeField()
+        ))
+    return len(user_ids)
+
+
+def _buffer_last_seen(user_id, timestamp: float) -> None:
+    global _exit_flush_registered, _flush_timer
+    with _pending_lock:
+        _pending_last_seen[user_id] = timestamp
+        if not _exit_flush_registered:
+            atexit.register(flush_presence)
+            _exit_flush_registered = True
+        if _flush_timer is None:
+            _flush_timer = threading.Timer(PRESENCE_FLUSH_INTERVAL, _run_scheduled_flush)
+            _flush_timer.daemon = True
+            _flush_timer.start()
+
+
+def _run_scheduled_flush() -> None:
+    global _flush_timer
+    from django.db import connection
+
+    with _pending_lock:
+        _flush_timer = None
+    try:
+        flush_presence()
+    except Exception:
+        logger.exception('Scheduled presence flush failed')
+    finally:
+        connection.close()
@@ -0,0 +1,83 @@
+"""
+Real-time utilities - push chat and call events to WebSocket clients
+
+Events are fanned out through the channel layer to groups, so one publish
+reaches every subscribed connection without touching the database:
+- chat_<chat_id>: connections viewing a chat (new messages, read receipts, typing)
+- user_<user_id>: every connection of a user (call state, so incoming calls ring
+  wherever the user is connected)
+
+Events are published after the surrounding transaction commits, so clients
+never receive a row they cannot fetch yet.
+"""
+
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+# Channel layer message type, handled by RealtimeConsumer.realtime_event
+EVENT_MESSAGE_TYPE = 'realtime.event'
+
+
+def chat_group(chat_id) -> str:
+    """Channel layer group of the connections subscribed to a chat"""
+    return f'chat_{chat_id}'
+
+
+def user_group(user_id) -> str:
+    """Channel layer group of all connections of a user"""
+    return f'user_{user_id}'
+
+
+def publish(groups, event: dict) -> None:
+    """
+    Send an event to channel layer groups once the current transaction commits.
+    Delivery is best effort: a failing channel layer never fails the request.
+    """
+    groups = list(groups)
+
+    def send():
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        try:
+            for group in groups:
+                async_to_sync(channel_layer.group_send)(group, {'type': EVENT_MESSAGE_TYPE, 'event': event})
+        except Exception:
+            logger.exception('Failed to publish real-time event %s', event.get('type'))
+
+    transaction.on_commit(send)
+
+
+def broadcast_new_message(message) -> None:
+    """Push a newly created message to its chat"""
+    from .serializers import MessageSerializer
+    publish([chat_group(message.chat_id)], {
+        'type': 'message.created',
+        'chat_id': message.chat_id,
+        'message': MessageSerializer(message).data,
+    })
+
+
+def broadcast_read_receipt(chat_id, user_id, message_id) -> None:
+    """Push a participant's advanced read cursor to the chat"""
+    publish([chat_group(chat_id)], {
+        'type': 'chat.read',
+        'chat_id': chat_id,
+        'user_id': user_id,
+        'last_read_message_id': message_id,
+    })
+
+
+def broadcast_call_state(call) -> None:
+    """Push a call's current state to both the caller and the callee"""
+    from .serializers import CallSerializer
+    publish([user_group(call.caller_id), user_group(call.callee_id)], {
+        'type': 'call.state',
+        'chat_id': call.chat_id,
+        'call': CallSerializer(call).data,
+    })
@@ -0,0 +1,193 @@
+"""
+Recommendation utilities - vectorized candidate scoring for user recommendations
+
+Scores every candidate in one NumPy pass over plain column arrays instead of
+building a User object and calling calculate_match_score per candidate.
+The scoring rules mirror location_utils.calculate_match_score exactly.
+"""
+
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .geohash_utils import EARTH_RADIUS_KM
+from .location_utils import filter_within_bounding_box
+from .models import User, RecommendationEngine
+
+CANDIDATE_COLUMNS = ('id', 'latitude', 'longitude', 'age', 'gender', 'preferred_gender')
+RECOMMENDATION_MIN_SCORE = 50  # Only recommend users with >50% compatibility
+RECOMMENDATION_BATCH_SIZE = 1000
+RECOMMENDATION_CACHE_TTL = getattr(settings, 'RECOMMENDATION_CACHE_TTL', 15 * 60)
+
+
+def load_candidate_columns(user: User, max_distance: float) -> Dict[str, np.ndarray]:
+    """
+    Load the scoring columns of every active located user near the given user
+    """
+    latitude, longitude = user.location_coordinates
+    queryset = User.objects.filter(
+        is_active=True,
+        latitude__isnull=False,
+        longitude__isnull=False
+    ).exclude(id=user.id)
+    queryset = filter_within_bounding_box(queryset, latitude, longitude, max_distance)
+
+    rows = list(queryset.values_list(*CANDIDATE_COLUMNS))
+    if not rows:
+        return {}
+
+    ids, latitudes, longitudes, ages, genders, preferred_genders = zip(*rows)
+    return {
+        'id': np.array(ids, dtype=np.int64),
+        'latitude': np.array(latitudes, dtype=np.float64),
+        'longitude': np.array(longitudes, dtype=np.float64),
+        'age': np.array([age if age is not None else np.nan for age in ages], dtype=np.float64),
+        'gender': np.array(genders, dtype=object),
+        'preferred_gender': np.array(preferred_genders, dtype=object),
+    }
+
+
+def haversine_distances(latitude: float, longitude: float,
+                        latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """
+    Distances in kilometers from one point to arrays of points (Haversine formula)
+    """
+    lat1, lon1 = np.radians(latitude), np.radians(longitude)
+    lat2, lon2 = np.radians(latitudes), np.radians(longitudes)
+
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def match_scores(user: User, distances: np.ndarray, candidates: Dict[str, np.ndarray]) -> np.ndarray:
+    """
+    Vectorized calculate_match_score for one user against all candidates
+    """
+    # Distance factor (0-40 points)
+    scores = np.maximum(0.0, 40.0 - (distances / user.max_distance * 40.0))
+
+    # Age compatibility (0-30 points), only when both ages are known
+    if user.age:
+        age_known = ~np.isnan(candidates['age']) & (candidates['age'] != 0)
+        age_diff = np.abs(np.nan_to_num(candidates['age']) - user.age)
+        scores += np.where(age_known, np.maximum(0.0, 30.0 - age_diff * 2), 0.0)
+
+    # Gender preference (0-20 points)
+    user_wants_candidate = candidates['gender'] == user.preferred_gender
+    candidate_wants_user = candidates['preferred_gender'] == user.gender
+    if user.preferred_gender:
+        scores += np.where(user_wants_candidate, 20.0, 0.0)
+        scores += np.where(~user_wants_candidate & candidate_wants_user & _truthy(candidates['preferred_gender']), 20.0, 0.0)
+    else:
+        scores += np.where(candidate_wants_user & _truthy(candidates['preferred_gender']), 20.0, 0.0)
+
+    # Mutual preferences (0-10 points)
+    scores += np.where(user_wants_candidate & candidate_wants_user, 10.0, 0.0)
+
+    return np.minimum(100.0, scores)
+
+
+def score_candidates(user: User, max_distance: Optional[float] = None,
+                     min_score: float = 0.0, limit: Optional[int] = None) -> List[Dict]:
+    """
+    Score all candidates within max_distance of the user in one vectorized pass.
+    Returns [{'user_id', 'score', 'distance'}] sorted by score, best first,
+    restricted to scores above min_score and to the top `limit` entries.
+    """
+    if not user.has_location:
+        return []
+
+    max_distance = max_distance or user.max_distance
+    candidates = load_candidate_columns(user, max_distance)
+    if not candidates:
+        return []
+
+    latitude, longitude = user.location_coordinates
+    distances = haversine_distances(latitude, longitude, candidates['latitude'], candidates['longitude'])
+    scores = match_scores(user, distances, candidates)
+
+    eligible = np.flatnonzero((distances <= max_distance) & (scores > min_score))
+    if limit is not None and len(eligible) > limit:
+        # Partial selection of the top `limit` scores, then sort just those
+        top = np.argpartition(-scores[eligible], limit - 1)[:limit]
+        eligible = eligible[top]
+    eligible = eligible[np.argsort(-scores[eligible], kind='stable')]
+
+    return [
+        {
+            'user_id': int(candidates['id'][i]),
+            'score': float(scores[i]),
+            'distance': float(distances[i]),
+        }
+        for i in eligible
+    ]
+
+
+def refresh_recommendations(user: User, min_score: float = RECOMMENDATION_MIN_SCORE,
+                            batch_size: int = RECOMMENDATION_BATCH_SIZE) -> int:
+    """
+    Recompute and store the user's location-based recommendations.
+    Previous recommendations are expired and the new set is upserted in chunks,
+    all in one transaction; rows of other algorithms are left alone. Returns
+    the number of active recommendations.
+    """
+    candidates = score_candidates(user, min_score=min_score)
+
+    with transaction.atomic():
+        # Expire everything, the upsert below re-activates what is still valid
+        RecommendationEngine.objects.filter(
+            user=user,
+            algorithm='location_based',
+            is_active=True
+        ).update(is_active=False)
+
+        RecommendationEngine.objects.bulk_create(
+            [
+                RecommendationEngine(
+                    user=user,
+                    recommended_user_id=candidate['user_id'],
+                    score=candidate['score'],
+                    algorithm='location_based',
+                    is_active=True
+                )
+                for candidate in candidates
+            ],
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['user', 'recommended_user', 'algorithm'],
+            update_fields=['score', 'is_active'],
+        )
+
+    return len(candidates)
+
+
+def get_recommendation_cache_key(user_id: int) -> str:
+    """
+    Cache key of the user's recommendation feed for the current version stamp
+    """
+    version = cache.get_or_set(_recommendation_version_key(user_id), time.time_ns, timeout=None)
+    return f'recommendations:{user_id}:{version}'
+
+
+def invalidate_recommendations(user_id: int) -> None:
+    """
+    Invalidate the user's cached recommendation feed by moving to a new version
+    stamp. Entries under the old stamp are never read again and expire by TTL.
+    Other processes see the new stamp when the default cache is shared
+    (REDIS_URL); with the per-process default they serve their copy until
+    RECOMMENDATION_CACHE_TTL runs out.
+    """
+    cache.set(_recommendation_version_key(user_id), time.time_ns(), timeout=None)
+
+
+def _recommendation_version_key(user_id: int) -> str:
+    return f'recommendations:version:{user_id}'
+
+
+def _truthy(values: np.ndarray) -> np.ndarray:
+    """Elementwise truthiness of an object array (None and '' are falsy)"""
+    return np.array([bool(value) for value in values], dtype=bool)
@@ -0,0 +1,249 @@
+"""
+Full-text search utilities for user and post search
+
+On PostgreSQL every user (and every searchable post) has a search document
+holding a weighted tsvector behind a GIN index; queries are prefix tsqueries
+ranked with ts_rank. Other databases (SQLite in development) use a local
+inverted index of term rows, one per distinct term per user/post, where a
+prefix lookup is an indexed range scan on the term column.
+
+The indexes are updated incrementally from User.save() and Post.save() when
+a searchable field changes; renaming a user also re-indexes their posts,
+whose documents include the author's name.
+"""
+
+import re
+from typing import Dict, List
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery as TextSearchQuery, SearchRank, SearchVector
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Max, OuterRef, Q, Subquery, Sum, Value, When
+
+from .hashtag_utils import normalize_hashtags
+from .models import Post, User, UserSearchDocument, UserSearchTerm, PostSearchDocument, PostSearchTerm
+
+SEARCH_CONFIG = getattr(settings, 'SEARCH_CONFIG', 'simple')
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TERMS = 8
+
+# Field weights: PostgreSQL tsvector labels and the matching local index weights
+USER_SEARCH_WEIGHTS = {
+    'name': ('A', 4),
+    'city': ('B', 2),
+    'state': ('B', 2),
+    'country': ('B', 2),
+    'bio': ('C', 1),
+}
+POST_SEARCH_WEIGHTS = {
+    'hashtags': ('A', 4),
+    'content': ('B', 2),
+    'author': ('C', 1),
+    'location': ('C', 1),
+}
+
+# Upsert the weighted tsvector of users from their current row in one statement
+USER_SEARCH_VECTOR_SQL = """
+    INSERT INTO {document_table} (user_id, search_vector, updated_at)
+    SELECT u.id,
+        setweight(to_tsvector(%(config)s::regconfig, coalesce(u.name, '')), 'A') ||
+        setweight(to_tsvector(%(config)s::regconfig, concat_ws(' ', u.city, u.state, u.country)), 'B') ||
+        setweight(to_tsvector(%(config)s::regconfig, coalesce(u.bio, '')), 'C'),
+        now()
+    FROM {user_table} AS u
+    WHERE {where}
+    ON CONFLICT (user_id) DO UPDATE
+    SET search_vector = EXCLUDED.search_vector, updated_at = EXCLUDED.updated_at
+"""
+
+
+def uses_postgres_search() -> bool:
+    """Whether the database supports native full-text search"""
+    return connection.vendor == 'postgresql'
+
+
+def tokenize(text) -> List[str]:
+    """
+    Split text into distinct casefolded word terms (order preserved)
+    """
+    terms = []
+    for term in re.findall(r'\w+', str(text or '').casefold()):
+        term = term[:MAX_TERM_LENGTH]
+        if term not in terms:
+            terms.append(term)
+    return terms
+
+
+def build_search_terms(texts: Dict[str, str], weights: Dict[str, tuple]) -> Dict[str, int]:
+    """
+    Get {term: weight} for a document's fields; a term found in several
+    fields keeps its highest weight
+    """
+    terms = {}
+    for field, (_, weight) in weights.items():
+        for term in tokenize(texts.get(field)):
+            terms[term] = max(weight, terms.get(term, 0))
+    return terms
+
+
+def build_user_search_terms(user) -> Dict[str, int]:
+    """Get {term: weight} for a user's searchable fields"""
+    return build_search_terms({field: getattr(user, field, '') for field in USER_SEARCH_WEIGHTS}, USER_SEARCH_WEIGHTS)
+
+
+def post_search_texts(post) -> Dict[str, str]:
+    """Searchable text of a post, by field"""
+    return {
+        'hashtags': ' '.join(normalize_hashtags(post.hashtags)),
+        'content': post.content or '',
+        'author': post.author.name or '',
+        'location': post.location or '',
+    }
+
+
+def user_search_vector_sql(where: str = 'TRUE') -> str:
+    """SQL upserting search documents for the users matching `where` (alias u)"""
+    return USER_SEARCH_VECTOR_SQL.format(
+        document_table=UserSearchDocument._meta.db_table,
+        user_table=User._meta.db_table,
+        where=where,
+    )
+
+
+def update_user_search_index(user) -> None:
+    """
+    Refresh the search index entry of one user after a profile change
+    """
+    if uses_postgres_search():
+        with connection.cursor() as cursor:
+            cursor.execute(user_search_vector_sql('u.id = %(user_id)s'), {'config': SEARCH_CONFIG, 'user_id': user.id})
+        return
+
+    _replace_local_terms(UserSearchTerm, 'user', user, build_user_search_terms(user))
+
+
+def update_post_search_index(post) -> None:
+    """
+    Refresh the search index entry of one post after it changed.
+    Posts that are not searchable (inactive or non-public) are removed from the index.
+    """
+    if not post.is_searchable:
+        PostSearchDocument.objects.filter(post=post).delete()
+        PostSearchTerm.objects.filter(post=post).delete()
+        return
+
+    texts = post_search_texts(post)
+    if uses_postgres_search():
+        vector = None
+        for field, (label, _) in POST_SEARCH_WEIGHTS.items():
+            field_vector = SearchVector(Value(texts[field]), weight=label, config=SEARCH_CONFIG)
+            vector = field_vector if vector is None else vector + field_vector
+        PostSearchDocument.objects.update_or_create(post=post, defaults={'search_vector': vector})
+        return
+
+    _replace_local_terms(PostSearchTerm, 'post', post, build_search_terms(texts, POST_SEARCH_WEIGHTS))
+
+
+def update_author_posts_search_index(author_id) -> int:
+    """
+    Refresh the search index entries of an author's searchable posts, e.g.
+    after the author was renamed. Returns the number of posts re-indexed.
+    """
+    posts = Post.objects.filter(author_id=author_id, is_active=True, visibility='public').select_related('author')
+    reindexed = 0
+    for post in posts.iterator():
+        update_post_search_index(post)
+        reindexed += 1
+    return reindexed
+
+
+def search_users(queryset, query: str):
+    """
+    Restrict a User queryset to users matching every word of the query, each
+    word also matching as a prefix (typeahead), and annotate `search_rank`.
+    """
+    terms = tokenize(query)[:MAX_QUERY_TERMS]
+    if not terms:
+        return queryset.none()
+
+    if uses_postgres_search():
+        text_query = _prefix_text_query(terms)
+        return queryset.filter(search_document__search_vector=text_query).annotate(
+            search_rank=SearchRank(F('search_document__search_vector'), text_query)
+        )
+
+    matched_users, rank = _local_index_matches(UserSearchTerm, 'user', terms)
+    return queryset.filter(id__in=matched_users).annotate(search_rank=rank)
+
+
+def search_posts(queryset, query: str):
+    """
+    Restrict a Post queryset to indexed posts matching every word of the query
+    (prefix matching included), annotated with `search_rank`.
+    Returns (queryset, index_matches) where index_matches counts the matches
+    from the index alone.
+    """
+    terms = tokenize(query)[:MAX_QUERY_TERMS]
+    if not terms:
+        return queryset.none(), PostSearchDocument.objects.none()
+
+    if uses_postgres_search():
+        text_query = _prefix_text_query(terms)
+        queryset = queryset.filter(search_document__search_vector=text_query).annotate(
+            search_rank=SearchRank(F('search_document__search_vector'), text_query)
+        )
+        return queryset, PostSearchDocument.objects.filter(search_vector=text_query)
+
+    matched_posts, rank = _local_index_matches(PostSearchTerm, 'post', terms)
+    return queryset.filter(id__in=matched_posts).annotate(search_rank=rank), matched_posts
+
+
+def _prefix_text_query(terms: List[str]) -> TextSearchQuery:
+    """tsquery requiring every term, each as a prefix"""
+    return TextSearchQuery(
+        ' & '.join(f"'{term}':*" for term in terms),
+        search_type='raw',
+        config=SEARCH_CONFIG
+    )
+
+
+def _local_index_matches(term_model, owner_field: str, terms: List[str]):
+    """
+    Query the local inverted index: ids of owners (users/posts) having a
+    prefix match for every term, and a correlated subquery of their rank
+    """
+    owner_id = f'{owner_field}_id'
+    term_matches = [_prefix_range(term) for term in terms]
+
+    matched_ids = term_model.objects.filter(_any(term_matches)).values(owner_id).annotate(**{
+        f'matched_{i}': Max(Case(When(match, then=1), default=0, output_field=IntegerField()))
+        for i, match in enumerate(term_matches)
+    }).filter(**{f'matched_{i}': 1 for i in range(len(terms))}).values(owner_id)
+
+    rank = term_model.objects.filter(**{owner_id: OuterRef('pk')}).filter(
+        _any(term_matches)
+    ).values(owner_id).annotate(rank=Sum('weight')).values('rank')
+
+    return matched_ids, Subquery(rank[:1])
+
+
+def _replace_local_terms(term_model, owner_field: str, owner, terms: Dict[str, int]) -> None:
+    """Replace the local index terms of one user/post"""
+    with transaction.atomic():
+        term_model.objects.filter(**{owner_field: owner}).delete()
+        term_model.objects.bulk_create([
+            term_model(**{owner_field: owner}, term=term, weight=weight)
+            for term, weight in terms.items()
+        ])
+
+
+def _prefix_range(term: str) -> Q:
+    """Index-friendly prefix match: term <= value < term + U+10FFFF"""
+    return Q(term__gte=term, term__lt=term + '\U0010ffff')
+
+
+def _any(conditions: List[Q]) -> Q:
+    combined = Q()
+    for condition in conditions:
+        combined |= condition
+    return combined
@@ -4,7 +4,7 @@ from django.contrib.auth.password_validation import validate_password
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
-from .models import User, NewsletterSubscriber, PuzzleVerification, CoinTransaction, Waitlist, Job, JobApplication, AdminUser, AdminOTP, TranslationLog, SocialAccount, DeviceRegistration, LocationHistory, UserMatch, LocationPermission, LivenessVerification, UserVerificationStatus, EmailVerification, PhoneVerification, UserRoleSelection, UserInterest, UserProfileView, UserInteraction, SearchQuery, RecommendationEngine, Chat, Message, VoiceNote, Call, ChatParticipant, ChatReport, Post, PostComment, PostInteraction, CommentInteraction, PostReport, Story, StoryView, StoryReaction, PostShare, FeedSearch, LiveSession, LiveParticipant, UserSocialHandle, UserSecurityQuestion, DocumentVerification, UsernameValidation, SubscriptionPlan, UserSubscription, BondcoinPackage, BondcoinTransaction, GiftCategory, VirtualGift, GiftTransaction, LiveGift, LiveJoinRequest, PaymentMethod, PaymentTransaction, PaymentWebhook
+from .models import User, NewsletterSubscriber, NewsletterCampaign, PuzzleVerification, CoinTransaction, Waitlist, Job, JobApplication, AdminUser, AdminOTP, TranslationLog, SocialAccount, DeviceRegistration, LocationHistory, UserMatch, LocationPermission, LivenessVerification, UserVerificationStatus, EmailVerification, PhoneVerification, UserRoleSelection, UserInterest, UserProfileView, UserInteraction, SearchQuery, RecommendationEngine, Chat, Message, VoiceNote, Call, ChatParticipant, ChatReport, Post, PostComment, PostInteraction, CommentInteraction, PostReport, Story, StoryView, StoryReaction, PostShare, FeedSearch, LiveSession, LiveParticipant, UserSocialHandle, UserSecurityQuestion, DocumentVerification, UsernameValidation, SubscriptionPlan, UserSubscription, BondcoinPackage, BondcoinTransaction, GiftCategory, VirtualGift, GiftTransaction, LiveGift, LiveJoinRequest, PaymentMethod, PaymentTransaction, PaymentWebhook
 
 class UserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=False)
@@ -310,6 +310,24 @@ class NewsletterSubscriberSerializer(serializers.ModelSerializer):
         }
 
 
+class NewsletterCampaignSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = NewsletterCampaign
+        fields = ['id', 'subject', 'message', 'status', 'recipients_queued', 'created_at', 'started_at', 'completed_at']
+        read_only_fields = ['status', 'recipients_queued', 'created_at', 'started_at', 'completed_at']
+
+    def validate(self, data):
+        from django.template import Template, TemplateSyntaxError
+
+        # Reject broken templates up front rather than when the campaign is sent
+        for field in ('subject', 'message'):
+            try:
+                Template(data[field])
+            except TemplateSyntaxError as e:
+                raise serializers.ValidationError({field: f"Invalid template: {e}"})
+        return data
+
+
 class PuzzleVerificationSerializer(serializers.ModelSerializer):
     class Meta:
         model = PuzzleVerification
@@ -1150,6 +1168,22 @@ class ResendOTPSerializer(serializers.Serializer):
 # ADVANCED USER PROFILE SERIALIZERS
 # =============================================================================
 
+class PresenceListSerializer(serializers.ListSerializer):
+    """
+    List serializer resolving the online status of every user on the page
+    with one cache multi-get. The child serializer lists the user ids of
+    each item in get_presence_user_ids().
+    """
+    def to_representation(self, data):
+        from django.db.models.manager import BaseManager
+        from .presence_utils import preload_presence
+        items = list(data.all() if isinstance(data, BaseManager) else data)
+        preload_presence(self.context, [
+            user_id for item in items for user_id in self.child.get_presence_user_ids(item)
+        ])
+        return super().to_representation(items)
+
+
 class UserProfileDetailSerializer(serializers.ModelSerializer):
     """Detailed user profile serializer for viewing other users"""
     profile_views_count = serializers.SerializerMethodField()
@@ -1169,13 +1203,17 @@ class UserProfileDetailSerializer(serializers.ModelSerializer):
             'profile_views_count', 'is_online', 'distance', 'compatibility_score'
         ]
         read_only_fields = ['id', 'profile_views_count', 'is_online', 'distance', 'compatibility_score']
+        list_serializer_class = PresenceListSerializer
+    
+    def get_presence_user_ids(self, obj):
+        return [obj.id]
     
     def get_profile_views_count(self, obj):
         return UserProfileView.objects.filter(viewed_user=obj).count()
     
     def get_is_online(self, obj):
-        # Simple online status - can be enhanced with last_seen tracking
-        return False
+        from .presence_utils import get_context_presence
+        return get_context_presence(self.context, obj.id)['is_online']
     
     def get_distance(self, obj):
         request = self.context.get('request')
@@ -1205,6 +1243,9 @@ class UserSearchSerializer(serializers.ModelSerializer):
         ]
     
     def get_distance(self, obj):
+        # Use the distance annotated by the database when the search computed it
+        if getattr(obj, 'distance', None) is not None:
+            return obj.distance
         request = self.context.get('request')
         if request and request.user.has_location and obj.has_location:
             return request.user.get_distance_to(obj)
@@ -1214,7 +1255,7 @@ class UserSearchSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         if request and request.user != obj:
             from .location_utils import calculate_match_score
-            return calculate_match_score(request.user, obj)
+            return calculate_match_score(request.user, obj, distance=getattr(obj, 'distance', None))
         return None
 
 
@@ -1286,6 +1327,10 @@ class UserSearchFilterSerializer(serializers.Serializer):
     is_matchmaker = serializers.BooleanField(required=False)
     has_photos = serializers.BooleanField(required=False)
     online_only = serializers.BooleanField(required=False)
+    sort_by = serializers.ChoiceField(choices=['relevance', 'newest', 'distance'], required=False,
+                                      help_text="Defaults to relevance when a query is given, otherwise newest")
+    tag_match = serializers.ChoiceField(choices=['all', 'any'], required=False, default='all',
+                                        help_text="Match all (AND) or any (OR) of the interests/hobbies")
     
     def validate(self, attrs):
         age_min = attrs.get('age_min')
@@ -1330,11 +1375,15 @@ class ChatParticipantSerializer(serializers.ModelSerializer):
             'notifications_enabled', 'is_muted'
         ]
         read_only_fields = ['user_id', 'name', 'profile_picture', 'is_online', 'joined_at', 'last_seen_at']
+        list_serializer_class = PresenceListSerializer
+    
+    def get_presence_user_ids(self, obj):
+        return [obj.user_id]
     
     def get_is_online(self, obj):
-        """Check if user is online (placeholder - implement with real-time status)"""
-        # This would typically check last activity or WebSocket connection
-        return False
+        """Check if user is online from their presence heartbeats"""
+        from .presence_utils import get_context_presence
+        return get_context_presence(self.context, obj.user_id)['is_online']
 
 
 class MessageSerializer(serializers.ModelSerializer):
@@ -1343,6 +1392,7 @@ class MessageSerializer(serializers.ModelSerializer):
     sender_name = serializers.CharField(source='sender.name', read_only=True)
     sender_profile_picture = serializers.URLField(source='sender.profile_picture', read_only=True)
     is_from_current_user = serializers.SerializerMethodField()
+    is_read = serializers.SerializerMethodField()
     reply_to_message = serializers.SerializerMethodField()
     formatted_timestamp = serializers.SerializerMethodField()
     
@@ -1366,9 +1416,17 @@ class MessageSerializer(serializers.ModelSerializer):
         """Check if message is from the current user"""
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return obj.sender == request.user
+            return obj.sender_id == request.user.id
         return False
     
+    def get_is_read(self, obj):
+        """Derived from the participants' read cursors when the view provides them"""
+        read_cursors = self.context.get('read_cursors')
+        if read_cursors is None:
+            return obj.is_read
+        from .chat_utils import is_message_read
+        return is_message_read(obj, read_cursors)
+    
     def get_reply_to_message(self, obj):
         """Get the message being replied to"""
         if obj.reply_to:
@@ -1398,8 +1456,12 @@ class MessageSerializer(serializers.ModelSerializer):
 
 
 class ChatSerializer(serializers.ModelSerializer):
-    """Serializer for chat list view"""
-    participants = ChatParticipantSerializer(many=True, read_only=True)
+    """
+    Serializer for chat list view.
+    Reads only denormalized state: expects last_message__sender selected and
+    chat_participants__user prefetched (see ChatListView.get_queryset).
+    """
+    participants = ChatParticipantSerializer(source='chat_participants', many=True, read_only=True)
     last_message = serializers.SerializerMethodField()
     unread_count = serializers.SerializerMethodField()
     other_participant = serializers.SerializerMethodField()
@@ -1415,10 +1477,14 @@ class ChatSerializer(serializers.ModelSerializer):
             'id', 'created_at', 'updated_at', 'last_message_at',
             'last_message', 'unread_count', 'other_participant'
         ]
+        list_serializer_class = PresenceListSerializer
+    
+    def get_presence_user_ids(self, obj):
+        return [participant.user_id for participant in obj.chat_participants.all()]
     
     def get_last_message(self, obj):
         """Get the last message in the chat"""
-        last_msg = obj.messages.order_by('-timestamp').first()
+        last_msg = obj.last_message
         if last_msg:
             return {
                 'id': last_msg.id,
@@ -1426,7 +1492,12 @@ class ChatSerializer(serializers.ModelSerializer):
                 'message_type': last_msg.message_type,
                 'sender_name': last_msg.sender.name if last_msg.sender else 'System',
                 'timestamp': last_msg.timestamp,
-                'is_read': last_msg.is_read
+                # Read once no one but the sender has unread messages
+                'is_read': all(
+                    participant.unread_count == 0
+                    for participant in obj.chat_participants.all()
+                    if participant.user_id != last_msg.sender_id and participant.is_active
+                )
             }
         return None
     
@@ -1434,27 +1505,31 @@ class ChatSerializer(serializers.ModelSerializer):
         """Get unread message count for current user"""
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return obj.get_unread_count(request.user)
+            for participant in obj.chat_participants.all():
+                if participant.user_id == request.user.id:
+                    return participant.unread_count
         return 0
     
     def get_other_participant(self, obj):
         """Get the other participant in direct message chats"""
         request = self.context.get('request')
         if request and request.user.is_authenticated and obj.chat_type == 'direct':
-            other_user = obj.get_other_participant(request.user)
-            if other_user:
-                return {
-                    'id': other_user.id,
-                    'name': other_user.name,
-                    'profile_picture': other_user.profile_picture,
-                    'is_online': False  # Placeholder
-                }
+            for participant in obj.chat_participants.all():
+                if participant.user_id != request.user.id:
+                    from .presence_utils import get_context_presence
+                    other_user = participant.user
+                    return {
+                        'id': other_user.id,
+                        'name': other_user.name,
+                        'profile_picture': other_user.profile_picture,
+                        'is_online': get_context_presence(self.context, other_user.id)['is_online']
+                    }
         return None
 
 
 class ChatDetailSerializer(serializers.ModelSerializer):
     """Serializer for a single chat with all its messages"""
-    participants = ChatParticipantSerializer(many=True, read_only=True)
+    participants = ChatParticipantSerializer(source='chat_participants', many=True, read_only=True)
     messages = MessageSerializer(many=True, read_only=True)
     other_participant = serializers.SerializerMethodField()
     
@@ -1476,11 +1551,12 @@ class ChatDetailSerializer(serializers.ModelSerializer):
         if request and request.user.is_authenticated and obj.chat_type == 'direct':
             other_user = obj.get_other_participant(request.user)
             if other_user:
+                from .presence_utils import get_context_presence
                 return {
                     'id': other_user.id,
                     'name': other_user.name,
                     'profile_picture': other_user.profile_picture,
-                    'is_online': False  # Placeholder
+                    'is_online': get_context_presence(self.context, other_user.id)['is_online']
                 }
         return None
 
@@ -1512,9 +1588,10 @@ class ChatCreateSerializer(serializers.ModelSerializer):
     
     def create(self, validated_data):
         """Create chat with participants"""
+        from .chat_utils import add_chat_participants
         participant_ids = validated_data.pop('participant_ids')
         chat = Chat.objects.create(**validated_data)
-        chat.participants.set(participant_ids)
+        add_chat_participants(chat, participant_ids)
         return chat
 
 
@@ -1675,7 +1752,7 @@ class PostCommentSerializer(serializers.ModelSerializer):
         """Check if comment is from the current user"""
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return obj.author == request.user
+            return obj.author_id == request.user.id
         return False
     
     def get_formatted_timestamp(self, obj):
@@ -1694,6 +1771,20 @@ class PostCommentSerializer(serializers.ModelSerializer):
             return obj.created_at.strftime('%m/%d/%Y')
 
 
+class PagePreloadListSerializer(serializers.ListSerializer):
+    """
+    List serializer letting the child load per-page data (the viewer's own
+    interactions, comment previews) for every item at once, one query per
+    kind, before the items are rendered. The child serializer loads it in
+    preload_page(items).
+    """
+    def to_representation(self, data):
+        from django.db.models.manager import BaseManager
+        items = list(data.all() if isinstance(data, BaseManager) else data)
+        self.child.preload_page(items)
+        return super().to_representation(items)
+
+
 class PostSerializer(serializers.ModelSerializer):
     """Serializer for posts in the Bond Story feed"""
     author_id = serializers.IntegerField(source='author.id', read_only=True)
@@ -1703,7 +1794,7 @@ class PostSerializer(serializers.ModelSerializer):
     is_from_current_user = serializers.SerializerMethodField()
     formatted_timestamp = serializers.SerializerMethodField()
     engagement_score = serializers.IntegerField(source='get_engagement_score', read_only=True)
-    comments = PostCommentSerializer(many=True, read_only=True)
+    comments = serializers.SerializerMethodField()
     user_interactions = serializers.SerializerMethodField()
     
     class Meta:
@@ -1722,12 +1813,25 @@ class PostSerializer(serializers.ModelSerializer):
             'is_active', 'is_featured', 'created_at', 'updated_at', 'formatted_timestamp',
             'is_from_current_user', 'comments', 'user_interactions'
         ]
+        list_serializer_class = PagePreloadListSerializer
+    
+    def preload_page(self, posts):
+        from .viewer_utils import preload_post_interactions
+        from .comment_utils import preload_comment_previews
+        post_ids = [post.id for post in posts]
+        preload_post_interactions(self.context, post_ids)
+        preload_comment_previews(self.context, post_ids)
+    
+    def get_comments(self, obj):
+        """Preview of the post's top comments; the full list is paginated at feed/posts/<id>/comments/"""
+        from .comment_utils import get_context_comment_preview
+        return PostCommentSerializer(get_context_comment_preview(self.context, obj.id), many=True, context=self.context).data
     
     def get_is_from_current_user(self, obj):
         """Check if post is from the current user"""
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return obj.author == request.user
+            return obj.author_id == request.user.id
         return False
     
     def get_formatted_timestamp(self, obj):
@@ -1751,11 +1855,8 @@ class PostSerializer(serializers.ModelSerializer):
     
     def get_user_interactions(self, obj):
         """Get current user's interactions with this post"""
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            interactions = obj.interactions.filter(user=request.user).values_list('interaction_type', flat=True)
-            return list(interactions)
-        return []
+        from .viewer_utils import get_context_post_interactions
+        return list(get_context_post_interactions(self.context, obj.id))
 
 
 class PostCreateSerializer(serializers.ModelSerializer):
@@ -1812,21 +1913,23 @@ class StorySerializer(serializers.ModelSerializer):
             'reactions_count', 'is_active', 'expires_at', 'created_at', 'is_expired',
             'user_has_viewed', 'user_reaction'
         ]
+        list_serializer_class = PagePreloadListSerializer
+    
+    def preload_page(self, stories):
+        from .viewer_utils import preload_story_viewer_state
+        preload_story_viewer_state(self.context, [story.id for story in stories])
     
     def get_user_has_viewed(self, obj):
         """Check if current user has viewed this story"""
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return obj.views.filter(viewer=request.user).exists()
-        return False
+        from .viewer_utils import get_context_story_viewer_state
+        state = get_context_story_viewer_state(self.context, obj.id)
+        return state['viewed'] if state else False
     
     def get_user_reaction(self, obj):
         """Get current user's reaction to this story"""
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            reaction = obj.reactions.filter(user=request.user).first()
-            return reaction.reaction_type if reaction else None
-        return None
+        from .viewer_utils import get_context_story_viewer_state
+        state = get_context_story_viewer_state(self.context, obj.id)
+        return state['reaction'] if state else None
 
 
 class StoryCreateSerializer(serializers.ModelSerializer):
@@ -2147,18 +2250,19 @@ class GiftTransactionCreateSerializer(serializers.ModelSerializer):
         quantity = validated_data.get('quantity', 1)
         validated_data['total_cost'] = gift.cost_bondcoins * quantity
         
-        # Create Bondcoin transaction for the gift
-        bondcoin_transaction = BondcoinTransaction.objects.create(
-            user=validated_data['sender'],
-            transaction_type='gift_sent',
-            amount=-validated_data['total_cost'],
-            gift=gift,
-            description=f"Gift sent: {gift.name}",
-            status='completed'
-        )
-        validated_data['bondcoin_transaction'] = bondcoin_transaction
-        
-        return super().create(validated_data)
+        # Debit the sender and record the gift in one transaction;
+        # raises InsufficientBondcoinsError when the balance does not cover it
+        from django.db import transaction
+        from .bondcoin_utils import debit
+        with transaction.atomic():
+            validated_data['bondcoin_transaction'] = debit(
+                validated_data['sender'],
+                validated_data['total_cost'],
+                'gift_sent',
+                f"Gift sent: {gift.name}",
+                gift=gift
+            )
+            return super().create(validated_data)
 
 
 # =============================================================================
@@ -2201,18 +2305,21 @@ class LiveGiftCreateSerializer(serializers.ModelSerializer):
         # Create chat message
         validated_data['chat_message'] = f"{request.user.name} sent {gift.name}"
         
-        # Create Bondcoin transaction
-        bondcoin_transaction = BondcoinTransaction.objects.create(
-            user=validated_data['sender'],
-            transaction_type='gift_sent',
-            amount=-validated_data['total_cost'],
-            gift=gift,
-            description=f"Live gift sent: {gift.name}",
-            status='completed'
-        )
-        validated_data['bondcoin_transaction'] = bondcoin_transaction
-        
-        return super().create(validated_data)
+        # Debit the sender and record the gift in one transaction
+        from django.db import transaction
+        from .bondcoin_utils import debit, InsufficientBondcoinsError
+        with transaction.atomic():
+            try:
+                validated_data['bondcoin_transaction'] = debit(
+                    validated_data['sender'],
+                    validated_data['total_cost'],
+                    'gift_sent',
+                    f"Live gift sent: {gift.name}",
+                    gift=gift
+                )
+            except InsufficientBondcoinsError:
+                raise serializers.ValidationError("Insufficient Bondcoin balance")
+            return super().create(validated_data)
 
 
 class LiveJoinRequestSerializer(serializers.ModelSerializer):
@@ -0,0 +1,202 @@
+"""
+Story tray - active stories grouped by author, cached per author until they expire
+
+Each author's active stories are cached as one group, until the earliest
+expires_at in it: nothing in a group can change before then except the
+author's new or edited stories, which invalidate it once committed. A small
+index of the authors with active stories (id -> newest story time) is cached
+the same way. A request reads the index, picks the authors the viewer
+follows, fetches just their groups with one cache multi-get (misses are
+built with one query) and marks which stories the viewer has seen, with
+one more query.
+
+Cache keys carry version numbers that invalidation bumps, instead of being
+deleted, so a rebuild that read the database before a change cannot cache
+its stale result under the current key. The groups, index and version keys
+live in the default cache, which is shared between processes when REDIS_URL
+is set; with the per-process default, a worker only sees its own
+invalidations and serves other workers' changes once its copies expire
+(after STORY_TRAY_CACHE_MAX_TTL at most).
+
+Expired stories are deactivated in bulk by a sweep (run before every index
+rebuild and by the expire_stories management command), so building the tray
+reads is_active rows only instead of comparing expires_at against the clock.
+"""
+
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+STORY_TRAY_MAX_AUTHORS = getattr(settings, 'STORY_TRAY_MAX_AUTHORS', 100)
+# Upper bound on cache lifetimes, in case an invalidation is missed
+STORY_TRAY_CACHE_MAX_TTL = getattr(settings, 'STORY_TRAY_CACHE_MAX_TTL', 60 * 60)
+STORY_AUTHORS_GENERATION_KEY = 'stories:authors:generation'
+
+STORY_TRAY_FIELDS = (
+    'id', 'author_id', 'story_type', 'content', 'image_url', 'video_url', 'video_duration',
+    'background_color', 'text_color', 'font_size', 'expires_at', 'created_at',
+)
+
+
+def _author_version_key(author_id) -> str:
+    return f'stories:author:{author_id}:version'
+
+
+def _author_group_key(author_id, version) -> str:
+    return f'stories:author:{author_id}:{version}'
+
+
+def _bump(key) -> None:
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(key, 1, None)
+
+
+def _cache_timeout(expires_at: Optional[datetime]) -> int:
+    """Seconds until expires_at, capped at STORY_TRAY_CACHE_MAX_TTL"""
+    if expires_at is None:
+        return STORY_TRAY_CACHE_MAX_TTL
+    return min(STORY_TRAY_CACHE_MAX_TTL, max(1, int((expires_at - timezone.now()).total_seconds())))
+
+
+def invalidate_author_stories(author_ids: Iterable[int]) -> None:
+    """
+    Drop the cached story groups of these authors and the author index,
+    once the current transaction commits
+    """
+    author_ids = set(author_ids)
+
+    def invalidate():
+        for author_id in author_ids:
+            _bump(_author_version_key(author_id))
+        _bump(STORY_AUTHORS_GENERATION_KEY)
+
+    transaction.on_commit(invalidate)
+
+
+def deactivate_expired_stories() -> int:
+    """Deactivate every expired story in one UPDATE. Returns the number deactivated."""
+    from .models import Story
+
+    expired = list(Story.objects.filter(is_active=True, expires_at__lte=timezone.now()).values_list('id', 'author_id'))
+    if not expired:
+        return 0
+    deactivated = Story.objects.filter(id__in=[story_id for story_id, _ in expired]).update(is_active=False)
+    invalidate_author_stories(author_id for _, author_id in expired)
+    return deactivated
+
+
+def get_story_authors() -> Dict[int, datetime]:
+    """
+    Authors with active stories and their newest story's time (cached until
+    the earliest story expires)
+    """
+    from .models import Story
+
+    generation = cache.get_or_set(STORY_AUTHORS_GENERATION_KEY, 0, None)
+    key = f'stories:authors:{generation}'
+    authors = cache.get(key)
+    if authors is None:
+        deactivate_expired_stories()
+        rows = list(Story.objects.filter(is_active=True).values('author_id').annotate(
+            latest_story_at=Max('created_at'), earliest_expiry=Min('expires_at')
+        ).order_by())
+        authors = {row['author_id']: row['latest_story_at'] for row in rows}
+        cache.set(key, authors, _cache_timeout(min((row['earliest_expiry'] for row in rows), default=None)))
+    return authors
+
+
+def get_author_story_groups(author_ids: Iterable[int]) -> Dict[int, dict]:
+    """
+    The cached story groups of these authors, with one cache multi-get and
+    one query for the authors not cached:
+    {author_id: {'author_id', 'author_name', 'author_profile_picture', 'latest_story_at', 'stories': [...]}}
+    Authors without active stories are left out.
+    """
+    from .models import Story
+
+    author_ids = list(author_ids)
+    if not author_ids:
+        return {}
+    versions = cache.get_many([_author_version_key(author_id) for author_id in author_ids])
+    keys = {
+        author_id: _author_group_key(author_id, versions.get(_author_version_key(author_id), 0))
+        for author_id in author_ids
+    }
+    cached = cache.get_many(keys.values())
+    groups = {author_id: cached[key] for author_id, key in keys.items() if key in cached}
+
+    missing = [author_id for author_id in author_ids if author_id not in groups]
+    if missing:
+        built = {author_id: None for author_id in missing}
+        stories = Story.objects.filter(is_active=True, author_id__in=missing).order_by('author_id', 'created_at', 'id').values(
+            *STORY_TRAY_FIELDS, 'author__name', 'author__profile_picture'
+        )
+        for story in stories:
+            group = built[story['author_id']]
+            if group is None:
+                group = built[story['author_id']] = {
+                    'author_id': story['author_id'],
+                    'author_name': story['author__name'],
+                    'author_profile_picture': story['author__profile_picture'],
+                    'stories': [],
+                }
+            group['stories'].append({field: story[field] for field in STORY_TRAY_FIELDS if field != 'author_id'})
+            group['latest_story_at'] = story['created_at']
+        for author_id, group in built.items():
+            # Authors without active stories are cached as None too
+            cache.set(keys[author_id], group, _cache_timeout(get_tray_expiry([group] if group else [])))
+        groups.update(built)
+    return {author_id: group for author_id, group in groups.items() if group}
+
+
+def get_tray_expiry(tray: list) -> Optional[datetime]:
+    """The earliest expires_at in a tray, or None if it is empty"""
+    return min((story['expires_at'] for group in tray for story in group['stories']), default=None)
+
+
+def get_viewer_story_tray(user) -> list:
+    """
+    The viewer's tray: their own stories first, then the authors they follow
+    (everyone while they follow nobody), unseen before seen, newest first,
+    up to STORY_TRAY_MAX_AUTHORS authors. Each story carries is_viewed and
+    each author has_unseen.
+    """
+    from .feed_utils import get_following_ids
+    from .models import StoryView
+
+    authors = get_story_authors()
+    following_ids = get_following_ids(user.id)
+    author_ids = [
+        author_id for author_id in authors
+        if author_id == user.id or not following_ids or author_id in following_ids
+    ]
+    author_ids.sort(key=lambda author_id: (author_id != user.id, -authors[author_id].timestamp()))
+    groups = get_author_story_groups(author_ids[:STORY_TRAY_MAX_AUTHORS])
+
+    # Skip stories that expired since their group was cached
+    now = timezone.now()
+    groups = [
+        dict(group, stories=[story for story in group['stories'] if story['expires_at'] > now])
+        for group in (groups[author_id] for author_id in author_ids if author_id in groups)
+    ]
+    groups = [group for group in groups if group['stories']]
+
+    story_ids = [story['id'] for group in groups for story in group['stories']]
+    viewed = set(StoryView.objects.filter(viewer=user, story_id__in=story_ids).values_list('story_id', flat=True))
+
+    tray = []
+    for group in groups:
+        stories = [dict(story, is_viewed=story['id'] in viewed) for story in group['stories']]
+        tray.append(dict(group, stories=stories, has_unseen=not all(story['is_viewed'] for story in stories)))
+    # Stable sort: keeps newest-first within each bucket
+    tray.sort(key=lambda group: (group['author_id'] != user.id, not group['has_unseen']))
+    return tray
@@ -0,0 +1,117 @@
+"""
+Interest/hobby tag utilities - normalized tag store for indexed tag filtering
+
+User.interests and User.hobbies are free-form JSON lists. Matching them with
+``icontains`` scans every row and also matches substrings ("art" in "party").
+Each listed value is stored once as an InterestTag and linked to the user with
+a UserInterestTag row, so tag filters become indexed joins.
+"""
+
+from typing import Iterable, List
+
+from django.db import transaction
+from django.db.models import Count
+
+from .models import InterestTag, UserInterestTag
+
+TAG_TYPE_FIELDS = {
+    'interest': 'interests',
+    'hobby': 'hobbies',
+}
+
+
+def normalize_tag(value) -> str:
+    """
+    Normalize a tag for storage and lookup: trimmed, whitespace-collapsed, casefolded
+    """
+    return ' '.join(str(value).split()).casefold()[:100]
+
+
+def normalize_tags(values: Iterable) -> List[str]:
+    """
+    Normalize a list of tags, dropping empty values and duplicates (order preserved)
+    """
+    tags = []
+    for value in values or []:
+        tag = normalize_tag(value)
+        if tag and tag not in tags:
+            tags.append(tag)
+    return tags
+
+
+def get_or_create_tags(names: Iterable[str]) -> dict:
+    """
+    Get {name: tag_id} for the given normalized names, creating missing tags in bulk
+    """
+    names = set(names)
+    if not names:
+        return {}
+
+    tag_ids = dict(InterestTag.objects.filter(name__in=names).values_list('name', 'id'))
+    missing = names - set(tag_ids)
+    if missing:
+        InterestTag.objects.bulk_create(
+            [InterestTag(name=name) for name in missing],
+            ignore_conflicts=True
+        )
+        tag_ids.update(InterestTag.objects.filter(name__in=missing).values_list('name', 'id'))
+    return tag_ids
+
+
+def sync_user_tags(user) -> None:
+    """
+    Bring the user's tag join rows in line with user.interests and user.hobbies.
+    Only the difference is written: new links are bulk-inserted, stale ones deleted.
+    """
+    wanted = {
+        (name, tag_type)
+        for tag_type, field in TAG_TYPE_FIELDS.items()
+        for name in normalize_tags(getattr(user, field))
+    }
+
+    with transaction.atomic():
+        existing = {
+            (name, tag_type): link_id
+            for link_id, name, tag_type in UserInterestTag.objects.filter(user=user).values_list(
+                'id', 'tag__name', 'tag_type'
+            )
+        }
+
+        stale = [link_id for key, link_id in existing.items() if key not in wanted]
+        if stale:
+            UserInterestTag.objects.filter(id__in=stale).delete()
+
+        new = wanted - set(existing)
+        if new:
+            tag_ids = get_or_create_tags(name for name, _ in new)
+            UserInterestTag.objects.bulk_create(
+                [UserInterestTag(user=user, tag_id=tag_ids[name], tag_type=tag_type) for name, tag_type in new],
+                ignore_conflicts=True
+            )
+
+
+def filter_by_tags(queryset, values: Iterable, tag_type: str, match: str = 'all'):
+    """
+    Restrict a User queryset to users having the given tags of one type.
+    match='all' requires every tag (AND), match='any' requires at least one (OR).
+    """
+    names = normalize_tags(values)
+    if not names:
+        return queryset
+
+    tag_ids = list(InterestTag.objects.filter(name__in=names).values_list('id', flat=True))
+    if match == 'all' and len(tag_ids) < len(names):
+        # A requested tag nobody has can never be matched
+        return queryset.none()
+    if not tag_ids:
+        return queryset.none()
+
+    links = UserInterestTag.objects.filter(tag_id__in=tag_ids, tag_type=tag_type)
+    if match == 'any':
+        return queryset.filter(id__in=links.values('user_id'))
+
+    # Users linked to every requested tag
+    user_ids = links.values('user_id').annotate(
+        tag_count=Count('tag_id', distinct=True)
+    ).filter(tag_count=len(tag_ids)).values('user_id')
+    return queryset.filter(id__in=user_ids)
@@ -0,0 +1,70 @@
+"""
+Background job utilities - run slow work off the request thread
+
+Jobs run on a process-wide thread pool so a request can return as soon as
+its rows are committed. Jobs are submitted on transaction commit, so a job
+never starts before the rows it works on are visible, and each job closes
+its database connection when it finishes.
+
+Long-running jobs go to their own named pool (e.g. email delivery, which is
+paced to the provider's send rate and can run for hours during a newsletter
+campaign), so they never take the default pool's workers from short jobs
+such as payment capture or feed fan-out.
+
+The pools are in-memory: jobs still queued when a process exits are lost, so
+anything submitted here must be recoverable from database state (see e.g.
+the process_pending_payments management command).
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+BACKGROUND_JOB_WORKERS = getattr(settings, 'BACKGROUND_JOB_WORKERS', 4)
+# Workers per job pool, by pool name
+BACKGROUND_JOB_POOLS = {
+    'default': BACKGROUND_JOB_WORKERS,
+    'email': getattr(settings, 'EMAIL_MAX_CONNECTIONS', 2),
+    **getattr(settings, 'BACKGROUND_JOB_POOLS', {}),
+}
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(pool: str = 'default') -> ThreadPoolExecutor:
+    """A named job pool, created on first use"""
+    with _executors_lock:
+        if pool not in _executors:
+            _executors[pool] = ThreadPoolExecutor(
+                max_workers=BACKGROUND_JOB_POOLS[pool], thread_name_prefix=f'background-job-{pool}'
+            )
+        return _executors[pool]
+
+
+def submit_job(func, *args, **kwargs) -> None:
+    """
+    Run func(*args, **kwargs) on the default job pool once the current transaction commits
+    """
+    submit_pool_job('default', func, *args, **kwargs)
+
+
+def submit_pool_job(pool: str, func, *args, **kwargs) -> None:
+    """
+    Run func(*args, **kwargs) on a named job pool once the current transaction commits
+    """
+    transaction.on_commit(lambda: get_executor(pool).submit(_run_job, func, args, kwargs))
+
+
+def _run_job(func, args, kwargs):
+    try:
+        return func(*args, **kwargs)
+    except Exception:
+        logger.exception('Background job %s failed', getattr(func, '__name__', func))
+    finally:
+        connection.close()
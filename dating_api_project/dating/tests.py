@@ -1,3 +1,1189 @@
-from django.test import TestCase
+import base64
+import hashlib
+import hmac
+import json
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from channels.db import database_sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .consumers import CLOSE_UNAUTHORIZED, TokenAuthMiddleware
+from .models import (
+    BondcoinTransaction, Chat, ChatParticipant, EmailLog, FeedEntry, Hashtag, Message, NewsletterCampaign,
+    NewsletterSubscriber, PaymentMethod, PaymentTransaction, PaymentWebhook, Post, PostComment, PostHashtag,
+    PostInteraction, RecommendationEngine, Story, StoryReaction, StoryView, SubscriptionPlan, User, UserInteraction,
+    UserMatch, UserSubscription
+)
+from .routing import websocket_urlpatterns
+
+
+class RecommendationCacheTests(TestCase):
+    """The recommendation feed is served from cache until the user's location, preferences or profile change"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seeker = User.objects.create(
+            username='seeker', email='seeker@example.com', name='Seeker', age=30, gender='male',
+            preferred_gender='female', latitude=40.7128, longitude=-74.0060, max_distance=50
+        )
+        cls.candidate = cls.create_candidate('candidate', latitude=40.7200)
+
+    @classmethod
+    def create_candidate(cls, username, latitude):
+        return User.objects.create(
+            username=username, email=f'{username}@example.com', name=username.title(), age=28, gender='female',
+            preferred_gender='male', latitude=latitude, longitude=-74.0060
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.seeker)
+
+    def recommended_ids(self):
+        response = self.client.get('/api/users/recommendations/')
+        self.assertEqual(response.status_code, 200)
+        return [recommendation['recommended_user']['id'] for recommendation in response.data['recommendations']]
+
+    def test_repeat_request_is_served_from_cache(self):
+        self.assertEqual(self.recommended_ids(), [self.candidate.id])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.recommended_ids(), [self.candidate.id])
+        self.assertEqual(len(queries), 0)
+
+    def test_preference_change_invalidates_cached_feed(self):
+        self.recommended_ids()
+        newcomer = self.create_candidate('newcomer', latitude=40.7150)
+        self.assertEqual(self.recommended_ids(), [self.candidate.id])  # still cached
+
+        response = self.client.put('/api/location/match-preferences/', {'max_distance': 40})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.recommended_ids(), [newcomer.id, self.candidate.id])
+
+    def test_refresh_leaves_other_algorithms_rows_alone(self):
+        from .recommendation_utils import refresh_recommendations
+
+        other = RecommendationEngine.objects.create(
+            user=self.seeker, recommended_user=self.candidate, score=12.5, algorithm='interest_based'
+        )
+        self.assertEqual(refresh_recommendations(self.seeker), 1)
+        self.assertEqual(refresh_recommendations(self.seeker), 1)
+
+        other.refresh_from_db()
+        self.assertEqual((other.algorithm, other.score, other.is_active), ('interest_based', 12.5, True))
+        location_based = RecommendationEngine.objects.get(user=self.seeker, algorithm='location_based')
+        self.assertEqual(location_based.recommended_user, self.candidate)
+        self.assertTrue(location_based.is_active)
+
+
+class UserSearchFilterTests(TestCase):
+    """User search sorts by distance and filters by interest tags in the database"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.searcher = User.objects.create(
+            username='explorer', email='explorer@example.com', name='Explorer', latitude=51.5074, longitude=-0.1278
+        )
+        # About 1, 5 and 30 km north of the searcher
+        cls.near = cls.create_user('near', 51.5164, ['Hiking', 'Art'])
+        cls.middle = cls.create_user('middle', 51.5524, ['hiking'])
+        cls.far = cls.create_user('far', 51.7774, ['Party'])
+        cls.unlocated = cls.create_user('unlocated', None, ['art'])
+
+    @classmethod
+    def create_user(cls, username, latitude, interests):
+        return User.objects.create(
+            username=username, email=f'{username}@example.com', name=username.title(), interests=interests,
+            latitude=latitude, longitude=-0.1278 if latitude is not None else None
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.searcher)
+
+    def search(self, params):
+        response = self.client.get('/api/search/users/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [user['id'] for user in response.data['results']]
+
+    def test_sort_by_distance_nearest_first(self):
+        self.assertEqual(self.search({'sort_by': 'distance'}), [self.near.id, self.middle.id, self.far.id])
+        self.assertEqual(self.search({'sort_by': 'distance', 'max_distance': 10}), [self.near.id, self.middle.id])
+
+    def test_interest_filter_all_and_any(self):
+        params = {'interests': ['hiking', 'ART'], 'sort_by': 'newest'}
+        self.assertEqual(self.search(params), [self.near.id])
+        self.assertEqual(
+            set(self.search({**params, 'tag_match': 'any'})), {self.near.id, self.middle.id, self.unlocated.id}
+        )
+        # Whole tags only: 'art' does not match 'party'
+        self.assertNotIn(self.far.id, self.search({'interests': ['art'], 'tag_match': 'any'}))
+
+
+class UserSearchIndexTests(TestCase):
+    """User search through the local term index (the fallback used outside PostgreSQL)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.searcher = User.objects.create(username='searcher', email='searcher@example.com', name='Searcher')
+        cls.amelia = User.objects.create(username='amelia', email='amelia@example.com', name='Amelia Hart', city='Lagos')
+        cls.fan = User.objects.create(
+            username='lagosfan', email='lagosfan@example.com', name='Tunde', city='Abuja', bio='Amelia fan from Lagos'
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.searcher)
+
+    def test_user_search_matches_every_word_by_prefix_and_ranks_by_field(self):
+        from .search_utils import search_users
+
+        # Name beats bio for 'ame'; both have a 'lag...' term
+        matches = search_users(User.objects.all(), 'ame lag').order_by('-search_rank', 'id')
+        self.assertEqual(list(matches), [self.amelia, self.fan])
+        self.assertEqual(list(search_users(User.objects.all(), 'ame tokyo')), [])
+
+        response = self.client.get('/api/search/users/', {'query': 'amel'})
+        self.assertEqual([user['id'] for user in response.data['results']], [self.amelia.id, self.fan.id])
+
+    def test_profile_change_reindexes_user(self):
+        from .search_utils import search_users
+
+        self.fan.bio = 'Into hiking'
+        self.fan.save()
+        self.assertEqual(list(search_users(User.objects.all(), 'amelia')), [self.amelia])
+
+
+class PostSearchIndexTests(TestCase):
+    """Feed search through the local term index, counted from the index and kept in sync with author names"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.searcher = User.objects.create(username='searcher', email='searcher@example.com', name='Searcher')
+        cls.amelia = User.objects.create(username='amelia', email='amelia@example.com', name='Amelia Hart')
+        cls.friend = User.objects.create(username='tunde', email='tunde@example.com', name='Tunde Hart')
+        for i in range(3):
+            Post.objects.create(author=cls.amelia, content=f'Sunset walk {i}', hashtags=['beach'])
+        Post.objects.create(author=cls.friend, content='Sunset walk, friends only', visibility='friends')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.searcher)
+
+    def test_feed_search_counts_from_the_index(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/feed/search/', {'q': 'sunset hart', 'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+
+        # Non-public posts are not indexed
+        self.assertEqual(response.data['results_count'], 3)
+        self.assertEqual(len(response.data['posts']), 2)
+        count_queries = [query['sql'] for query in queries.captured_queries if 'COUNT(' in query['sql']]
+        self.assertEqual(len(count_queries), 1)
+        self.assertIn('dating_postsearchterm', count_queries[0])
+        self.assertNotIn('"dating_post"', count_queries[0])
+
+    def test_renamed_author_posts_are_reindexed(self):
+        from .search_utils import search_posts
+
+        with mock.patch('dating.task_utils.submit_job', side_effect=lambda func, *args: func(*args)) as submit_job:
+            self.amelia.name = 'Amelia Stone'
+            self.amelia.save()
+        submit_job.assert_called_once()
+
+        posts = Post.objects.filter(is_active=True)
+        self.assertEqual(search_posts(posts, 'stone')[0].count(), 3)
+        self.assertEqual(search_posts(posts, 'hart')[0].count(), 0)
+
+
+class HashtagIndexTests(TestCase):
+    """Hashtag links and usage counts follow post edits and deletes; suggestions are prefix matches"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='tagger', email='tagger@example.com', name='Tagger')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def usage(self, name):
+        hashtag = Hashtag.objects.filter(name=name).first()
+        return hashtag.usage_count if hashtag else 0
+
+    def test_usage_counts_follow_post_changes(self):
+        first = Post.objects.create(author=self.author, content='Beach day', hashtags=['#Beach', 'beach', '#sunset'])
+        second = Post.objects.create(author=self.author, content='Beach night', hashtags=['#beach'])
+        self.assertEqual((self.usage('beach'), self.usage('sunset')), (2, 1))
+
+        first.hashtags = ['#sunset', '#surf']
+        first.save()
+        self.assertEqual((self.usage('beach'), self.usage('sunset'), self.usage('surf')), (1, 1, 1))
+
+        # Non-public posts keep no links
+        second.visibility = 'friends'
+        second.save()
+        self.assertEqual(self.usage('beach'), 0)
+        self.assertFalse(PostHashtag.objects.filter(post=second).exists())
+
+    def test_deleting_a_post_releases_its_hashtags(self):
+        post = Post.objects.create(author=self.author, content='Beach day', hashtags=['#beach'])
+        Post.objects.create(author=self.author, content='Beach night', hashtags=['#beach'])
+
+        post.delete()
+        self.assertEqual(self.usage('beach'), 1)
+
+    def test_recount_corrects_drifted_counts(self):
+        from .hashtag_utils import recount_hashtag_usage
+
+        Post.objects.create(author=self.author, content='Beach day', hashtags=['#beach'])
+        Hashtag.objects.filter(name='beach').update(usage_count=7)
+
+        self.assertEqual(recount_hashtag_usage(), 1)
+        self.assertEqual(self.usage('beach'), 1)
+
+    def test_suggestions_are_prefix_matches_most_used_first(self):
+        from .hashtag_utils import suggest_hashtags
+
+        for hashtags in (['#beach', '#bees'], ['#beach'], ['#seabed']):
+            Post.objects.create(author=self.author, content='Tagged', hashtags=hashtags)
+
+        self.assertEqual(suggest_hashtags('#BE'), ['beach', 'bees'])
+        self.assertEqual(suggest_hashtags('bed'), [])  # infix matches are not suggested
+
+        # The API shows hashtags the way posts carry them, with '#'
+        response = self.client.get('/api/feed/suggestions/', {'q': 'be'})
+        self.assertEqual(response.data['hashtags'], ['#beach', '#bees'])
+        response = self.client.get('/api/feed/suggestions/')
+        self.assertEqual(response.data['trending_hashtags'], ['#beach', '#bees', '#seabed'])
+
+
+class ViewerStateQueryCountTests(TestCase):
+    """Feed and story pages look up the viewer's own interactions once per page, not once per item"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = User.objects.create(username='viewer', email='viewer@example.com', name='Viewer')
+        cls.author = User.objects.create(username='author', email='author@example.com', name='Author')
+
+        cls.posts = [Post.objects.create(author=cls.author, content=f'Post {i}') for i in range(25)]
+        PostInteraction.objects.create(user=cls.viewer, post=cls.posts[-1], interaction_type='like')
+        PostInteraction.objects.create(user=cls.viewer, post=cls.posts[-1], interaction_type='save')
+
+        expires_at = timezone.now() + timedelta(hours=24)
+        cls.stories = [
+            Story.objects.create(author=cls.author, story_type='text', content=f'Story {i}', expires_at=expires_at)
+            for i in range(25)
+        ]
+        StoryView.objects.create(story=cls.stories[-1], viewer=cls.viewer)
+        StoryReaction.objects.create(story=cls.stories[-1], user=cls.viewer, reaction_type='love')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def count_queries(self, url, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.data['results']
+
+    def test_feed_query_count_does_not_grow_with_page_size(self):
+        small_page_queries, _ = self.count_queries('/api/feed/', {'page_size': 5})
+        large_page_queries, results = self.count_queries('/api/feed/', {'page_size': 20})
+
+        self.assertEqual(len(results), 20)
+        self.assertEqual(small_page_queries, large_page_queries)
+
+    def test_feed_interactions_query_runs_once_per_page(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/feed/', {'page_size': 20})
+
+        interaction_queries = [query for query in queries.captured_queries if 'dating_postinteraction' in query['sql']]
+        self.assertEqual(len(interaction_queries), 1)
+
+    def test_feed_reports_viewer_interactions(self):
+        _, results = self.count_queries('/api/feed/', {'page_size': 20})
+        interactions = {post['id']: post['user_interactions'] for post in results}
+
+        self.assertCountEqual(interactions[self.posts[-1].id], ['like', 'save'])
+        self.assertEqual(interactions[self.posts[-2].id], [])
+
+    def test_story_list_query_count_does_not_grow_with_page_size(self):
+        # 25 stories: a full first page of 20 and a second page of 5
+        large_page_queries, results = self.count_queries('/api/feed/stories/', {'page': 1})
+        small_page_queries, small_results = self.count_queries('/api/feed/stories/', {'page': 2})
+
+        self.assertEqual((len(results), len(small_results)), (20, 5))
+        self.assertEqual(small_page_queries, large_page_queries)
+
+    def test_story_list_reports_viewer_state(self):
+        _, results = self.count_queries('/api/feed/stories/', {'page': 1})
+        stories = {story['id']: story for story in results}
+
+        self.assertTrue(stories[self.stories[-1].id]['user_has_viewed'])
+        self.assertEqual(stories[self.stories[-1].id]['user_reaction'], 'love')
+        self.assertFalse(stories[self.stories[-2].id]['user_has_viewed'])
+        self.assertIsNone(stories[self.stories[-2].id]['user_reaction'])
+
+
+class CommentPreviewTests(TestCase):
+    """Posts carry a bounded comment preview; the full thread is cursor-paginated"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = User.objects.create(username='reader', email='reader@example.com', name='Reader')
+        cls.post = Post.objects.create(author=cls.viewer, content='Viral post')
+        cls.quiet_post = Post.objects.create(author=cls.viewer, content='Quiet post')
+        cls.comments = PostComment.objects.bulk_create([
+            PostComment(post=cls.post, author=cls.viewer, content=f'Comment {i}', likes_count=i % 7)
+            for i in range(60)
+        ])
+        PostComment.objects.create(post=cls.quiet_post, author=cls.viewer, content='Only comment')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def test_feed_shows_top_comments_only(self):
+        response = self.client.get('/api/feed/')
+        posts = {post['id']: post for post in response.data['results']}
+
+        preview = posts[self.post.id]['comments']
+        self.assertEqual(len(preview), 3)
+        self.assertEqual([comment['likes_count'] for comment in preview], [6, 6, 6])
+        self.assertEqual(len(posts[self.quiet_post.id]['comments']), 1)
+
+    def test_preview_size_is_requestable_and_bounded(self):
+        response = self.client.get('/api/feed/', {'comment_preview': 50})
+        posts = {post['id']: post for post in response.data['results']}
+        self.assertEqual(len(posts[self.post.id]['comments']), 10)
+
+        response = self.client.get('/api/feed/', {'comment_preview': 0})
+        self.assertTrue(all(post['comments'] == [] for post in response.data['results']))
+
+    def test_comment_list_walks_every_comment_by_cursor(self):
+        url = f'/api/feed/posts/{self.post.id}/comments/'
+        seen = []
+        params = {'page_size': 25}
+        while True:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(comment['id'] for comment in response.data['results'])
+            if not response.data['next_cursor']:
+                break
+            params = {'page_size': 25, 'cursor': response.data['next_cursor']}
+
+        self.assertEqual(seen, [comment.id for comment in self.comments])
+
+
+class KeysetPaginationTests(TestCase):
+    """Cursors that cannot be decoded, or whose values do not fit the ordering, are rejected with 400"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = User.objects.create(username='pager', email='pager@example.com', name='Pager')
+        cls.post = Post.objects.create(author=cls.viewer, content='Thread')
+        PostComment.objects.create(post=cls.post, author=cls.viewer, content='Reply')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def raw_cursor(self, ordering, values):
+        """A well-formed cursor carrying arbitrary values"""
+        return base64.urlsafe_b64encode(json.dumps({'o': ordering, 'v': values}).encode()).decode().rstrip('=')
+
+    def assertBadCursor(self, url, cursor, **params):
+        response = self.client.get(url, {'cursor': cursor, **params})
+        self.assertEqual(response.status_code, 400, response.data)
+
+    def test_malformed_cursor_is_a_bad_request(self):
+        comments_url = f'/api/feed/posts/{self.post.id}/comments/'
+        self.assertBadCursor(comments_url, 'not-a-cursor')
+        self.assertBadCursor(comments_url, self.raw_cursor(['-created_at', '-id'], ['2024-01-01T00:00:00+00:00', 1]))
+
+    def test_cursor_values_of_the_wrong_type_are_a_bad_request(self):
+        comments_url = f'/api/feed/posts/{self.post.id}/comments/'
+        self.assertBadCursor(comments_url, self.raw_cursor(['created_at', 'id'], ['not-a-date', 1]))
+        self.assertBadCursor(comments_url, self.raw_cursor(['created_at', 'id'], ['2024-01-01T00:00:00+00:00', 'x']))
+        self.assertBadCursor(comments_url, self.raw_cursor(['created_at', 'id'], [{'a': 1}, [1]]))
+
+        # APIViews paging with paginate_queryset reject them the same way
+        self.assertBadCursor('/api/users/category/', self.raw_cursor(['-date_joined', '-id'], ['not-a-date', 1]), category='all')
+
+    def test_valid_cursor_pages_on(self):
+        from .pagination import encode_cursor
+
+        comment = PostComment.objects.get()
+        cursor = encode_cursor(['created_at', 'id'], [comment.created_at - timedelta(seconds=1), 0])
+        response = self.client.get(f'/api/feed/posts/{self.post.id}/comments/', {'cursor': cursor})
+        self.assertEqual([item['id'] for item in response.data['results']], [comment.id])
+
+
+class EngagementCounterTests(TestCase):
+    """Engagement counters are atomic F() updates applied on commit and can be rebuilt from their rows"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='poster', email='poster@example.com', name='Poster')
+        cls.fans = [User.objects.create(username=f'fan{i}', email=f'fan{i}@example.com', name=f'Fan {i}') for i in range(5)]
+        cls.post = Post.objects.create(author=cls.author, content='Hot post')
+
+    def like(self, user):
+        """Like the post; returns the counter updates queued to run on commit"""
+        client = APIClient()
+        client.force_authenticate(user)
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = client.post(f'/api/feed/posts/{self.post.id}/interact/', {'interaction_type': 'like'})
+        self.assertEqual(response.status_code, 200)
+        return callbacks
+
+    def test_likes_are_counted_atomically_and_rerank(self):
+        old_rank_score = self.post.rank_score
+        callbacks = [callback for fan in self.fans for callback in self.like(fan)]
+        callbacks += self.like(self.fans[0])  # toggled off again
+
+        with CaptureQueriesContext(connection) as queries:
+            for callback in callbacks:
+                callback()
+        counter_writes = [query['sql'] for query in queries.captured_queries if 'SET "likes_count"' in query['sql']]
+        self.assertEqual(len(counter_writes), 6)
+        self.assertTrue(all('"likes_count" + ' in sql for sql in counter_writes))  # computed in SQL, not in Python
+
+        post = Post.objects.get(id=self.post.id)
+        self.assertEqual(post.likes_count, 4)
+        self.assertGreater(post.rank_score, old_rank_score)
+
+    def test_rolled_back_interaction_is_not_counted(self):
+        from .counter_utils import increment_counter
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                increment_counter(Post, self.post.id, 'likes_count')
+                raise RuntimeError('request failed')
+        self.assertEqual(callbacks, [])
+        self.assertEqual(Post.objects.get(id=self.post.id).likes_count, 0)
+
+    def test_recount_rebuilds_counters_from_rows(self):
+        from .counter_utils import recount_counters
+
+        PostInteraction.objects.bulk_create([PostInteraction(user=fan, post=self.post, interaction_type='like') for fan in self.fans])
+        PostComment.objects.create(post=self.post, author=self.fans[0], content='First')
+        Post.objects.filter(id=self.post.id).update(shares_count=3)
+
+        self.assertEqual(recount_counters(), {'Post': 1, 'PostComment': 0, 'Story': 0})
+        post = Post.objects.get(id=self.post.id)
+        self.assertEqual((post.likes_count, post.comments_count, post.shares_count), (5, 1, 0))
+        self.assertEqual(post.rank_score, post.get_rank_score())
+        self.assertEqual(recount_counters(), {'Post': 0, 'PostComment': 0, 'Story': 0})
+
+
+class StoryTrayTests(TestCase):
+    """The story tray groups active stories by author and is cached until the next expiry"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = User.objects.create(username='watcher', email='watcher@example.com', name='Watcher')
+        cls.authors = [User.objects.create(username=f'storyteller{i}', email=f'storyteller{i}@example.com', name=f'Storyteller {i}') for i in range(3)]
+        expires_at = timezone.now() + timedelta(hours=24)
+        cls.stories = {
+            author.id: [
+                Story.objects.create(author=author, story_type='text', content=f'Story {i}', expires_at=expires_at)
+                for i in range(2)
+            ]
+            for author in cls.authors
+        }
+        # The first author's stories have all been seen
+        for story in cls.stories[cls.authors[0].id]:
+            StoryView.objects.create(story=story, viewer=cls.viewer)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def test_tray_groups_by_author_unseen_first(self):
+        response = self.client.get('/api/feed/stories/tray/')
+        self.assertEqual(response.status_code, 200)
+
+        tray = response.data['results']
+        self.assertEqual(len(tray), 3)
+        self.assertEqual(tray[-1]['author_id'], self.authors[0].id)
+        self.assertFalse(tray[-1]['has_unseen'])
+        self.assertTrue(all(group['has_unseen'] for group in tray[:-1]))
+        self.assertTrue(all(len(group['stories']) == 2 for group in tray))
+
+    def test_cached_tray_skips_story_queries_until_invalidated(self):
+        self.client.get('/api/feed/stories/tray/')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/feed/stories/tray/')
+        self.assertFalse(any('FROM "dating_story"' in query['sql'] for query in queries.captured_queries))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Story.objects.create(
+                author=self.authors[1], story_type='text', content='Fresh story', expires_at=timezone.now() + timedelta(hours=24)
+            )
+        response = self.client.get('/api/feed/stories/tray/')
+        self.assertEqual(len(response.data['results'][0]['stories']), 3)
+
+    def test_tray_is_invalidated_only_after_commit(self):
+        self.client.get('/api/feed/stories/tray/')
+        with self.captureOnCommitCallbacks() as callbacks:
+            Story.objects.create(
+                author=self.authors[1], story_type='text', content='Fresh story', expires_at=timezone.now() + timedelta(hours=24)
+            )
+            # Not committed yet: the cached tray is still served
+            response = self.client.get('/api/feed/stories/tray/')
+            self.assertEqual(sum(len(group['stories']) for group in response.data['results']), 6)
+
+        for callback in callbacks:
+            callback()
+        response = self.client.get('/api/feed/stories/tray/')
+        self.assertEqual(sum(len(group['stories']) for group in response.data['results']), 7)
+
+    def test_tray_holds_followed_authors_only(self):
+        UserInteraction.objects.create(user=self.viewer, target_user=self.authors[1], interaction_type='like')
+
+        response = self.client.get('/api/feed/stories/tray/')
+        self.assertEqual([group['author_id'] for group in response.data['results']], [self.authors[1].id])
+
+    def test_expired_stories_are_swept_on_rebuild(self):
+        expired = self.stories[self.authors[2].id][0]
+        Story.objects.filter(id=expired.id).update(expires_at=timezone.now() - timedelta(minutes=1))
+        cache.clear()
+
+        response = self.client.get('/api/feed/stories/tray/')
+        story_ids = {story['id'] for group in response.data['results'] for story in group['stories']}
+        self.assertNotIn(expired.id, story_ids)
+        self.assertFalse(Story.objects.get(id=expired.id).is_active)
+
+
+class ChatTestMixin:
+    """Two participants chatting, and helpers to send messages between them"""
+
+    @classmethod
+    def setUpTestData(cls):
+        from .chat_utils import add_chat_participants
+
+        cls.alice = User.objects.create(username='alice', email='alice@example.com', name='Alice')
+        cls.bob = User.objects.create(username='bob', email='bob@example.com', name='Bob')
+        cls.chat = Chat.objects.create(chat_type='direct', created_by=cls.alice)
+        add_chat_participants(cls.chat, [cls.alice, cls.bob])
+
+    def send(self, sender, count=1, chat=None):
+        return [
+            Message.objects.create(chat=chat or self.chat, sender=sender, content=f'Message {i}')
+            for i in range(count)
+        ]
+
+    def participant(self, user, chat=None):
+        return ChatParticipant.objects.get(chat=chat or self.chat, user=user)
+
+
+class ChatInboxTests(ChatTestMixin, TestCase):
+    """New messages update the chat's last message and the recipients' unread counts at write time"""
+
+    def test_new_message_updates_inbox_state(self):
+        first, second = self.send(self.bob, 2)
+
+        chat = Chat.objects.get(id=self.chat.id)
+        self.assertEqual((chat.last_message_id, chat.last_message_at), (second.id, second.timestamp))
+        self.assertEqual(self.participant(self.alice).unread_count, 2)
+        self.assertEqual(self.participant(self.bob).unread_count, 0)
+
+    def test_last_message_never_moves_backwards(self):
+        from .chat_utils import record_new_message
+
+        older, newer = self.send(self.bob, 2)
+        older.timestamp = newer.timestamp - timedelta(seconds=1)
+        record_new_message(older)  # recorded late, e.g. by a slower request
+
+        self.assertEqual(Chat.objects.get(id=self.chat.id).last_message_id, newer.id)
+
+    def test_chat_list_query_count_does_not_grow_with_chats(self):
+        from .chat_utils import add_chat_participants
+
+        client = APIClient()
+        client.force_authenticate(self.alice)
+        self.send(self.bob, 3)
+
+        def list_chats():
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get('/api/chat/')
+            self.assertEqual(response.status_code, 200)
+            return len(queries)
+
+        few_chats_queries = list_chats()
+        for i in range(5):
+            friend = User.objects.create(username=f'friend{i}', email=f'friend{i}@example.com', name=f'Friend {i}')
+            chat = Chat.objects.create(chat_type='direct', created_by=self.alice)
+            add_chat_participants(chat, [self.alice, friend])
+            self.send(friend, 2, chat=chat)
+
+        self.assertEqual(list_chats(), few_chats_queries)
+        self.assertLessEqual(few_chats_queries, 3)
+
+
+class ChatReadCursorTests(ChatTestMixin, TestCase):
+    """Reading advances a per-participant cursor that only moves forward; read state is derived from it"""
+
+    def setUp(self):
+        self.messages = self.send(self.bob, 3)
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def read(self, data=None, **kwargs):
+        return self.client.post(f'/api/chat/{self.chat.id}/read/', data, **kwargs)
+
+    def test_read_cursor_only_moves_forward(self):
+        from .chat_utils import advance_read_cursor
+
+        self.assertTrue(advance_read_cursor(self.chat, self.alice, self.messages[2]))
+        self.assertFalse(advance_read_cursor(self.chat, self.alice, self.messages[0]))
+
+        participant = self.participant(self.alice)
+        self.assertEqual((participant.last_read_message_id, participant.unread_count), (self.messages[2].id, 0))
+
+    def test_read_state_is_derived_from_cursors(self):
+        from .chat_utils import advance_read_cursor, get_read_cursors, is_message_read
+
+        advance_read_cursor(self.chat, self.alice, self.messages[1])
+        self.assertEqual(self.participant(self.alice).unread_count, 1)
+
+        cursors = get_read_cursors(self.chat)
+        self.assertEqual(cursors[self.alice.id], (self.messages[1].timestamp, self.messages[1].id))
+        self.assertIsNone(cursors[self.bob.id])
+        self.assertEqual([is_message_read(message, cursors) for message in self.messages], [True, True, False])
+
+        response = self.client.get(f'/api/chat/{self.chat.id}/messages/', {'since': self.messages[0].id})
+        self.assertEqual([message['is_read'] for message in response.data['results']], [True, False])
+
+    def test_read_endpoint_acknowledges_messages(self):
+        response = self.read({'message_ids': [self.messages[0].id, self.messages[1].id]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['last_read_message_id'], response.data['unread_count']), (self.messages[1].id, 1))
+
+        # Acknowledging an older message leaves the cursor where it is
+        response = self.read({'message_id': self.messages[0].id}, format='json')
+        self.assertEqual(response.data['last_read_message_id'], self.messages[1].id)
+
+        # Without ids the whole chat is read
+        response = self.read()
+        self.assertEqual((response.data['last_read_message_id'], response.data['unread_count']), (self.messages[2].id, 0))
+
+    def test_read_endpoint_accepts_form_encoded_ids(self):
+        response = self.read({'message_ids': [self.messages[0].id, self.messages[2].id]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['last_read_message_id'], self.messages[2].id)
+
+    def test_read_endpoint_rejects_bad_ids_and_outsiders(self):
+        self.assertEqual(self.read({'message_ids': 'all'}, format='json').status_code, 400)
+
+        outsider = User.objects.create(username='mallory', email='mallory@example.com', name='Mallory')
+        self.client.force_authenticate(outsider)
+        self.assertEqual(self.read().status_code, 404)
+        self.assertIsNone(self.participant(self.alice).last_read_message_id)
+
+
+class RealtimeConsumerTests(TestCase):
+    """WebSocket gateway: token auth, chat subscriptions and event fan-out over the in-memory channel layer"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create(username='alice', email='alice@example.com', name='Alice')
+        cls.bob = User.objects.create(username='bob', email='bob@example.com', name='Bob')
+        cls.chat = Chat.objects.create(chat_type='direct', created_by=cls.alice)
+        cls.chat.participants.add(cls.alice, cls.bob)
+        for user in (cls.alice, cls.bob):
+            ChatParticipant.objects.get_or_create(chat=cls.chat, user=user)
+        cls.other_chat = Chat.objects.create(chat_type='direct', created_by=cls.alice)
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        from .presence_utils import flush_presence
+        # Write buffered last-seen times inside this test's transaction
+        flush_presence()
+
+    async def open_connection(self, user=None, token=None):
+        if user is not None:
+            token = str(AccessToken.for_user(user))
+        path = f'/ws/realtime/?token={token}' if token else '/ws/realtime/'
+        communicator = WebsocketCommunicator(TokenAuthMiddleware(URLRouter(websocket_urlpatterns)), path)
+        connected, close_code = await communicator.connect()
+        return communicator, connected, close_code
+
+    async def subscribe(self, communicator, chat_id):
+        await communicator.send_json_to({'action': 'subscribe', 'chat_id': chat_id})
+        return await communicator.receive_json_from()
+
+    def run_committed(self, func, *args, **kwargs):
+        """Run func in a captured transaction, firing its on-commit publishes"""
+        with self.captureOnCommitCallbacks(execute=True):
+            return func(*args, **kwargs)
+
+    async def test_connection_without_valid_token_is_rejected(self):
+        for token in (None, 'not-a-token'):
+            communicator, connected, close_code = await self.open_connection(token=token)
+            self.assertFalse(connected)
+            self.assertEqual(close_code, CLOSE_UNAUTHORIZED)
+
+    async def test_subscribe_only_to_own_chats(self):
+        communicator, connected, _ = await self.open_connection(self.alice)
+        self.assertTrue(connected)
+
+        self.assertEqual(await self.subscribe(communicator, self.chat.id), {'type': 'subscribed', 'chat_id': self.chat.id})
+        reply = await self.subscribe(communicator, self.other_chat.id)
+        self.assertEqual(reply['type'], 'error')
+        await communicator.disconnect()
+
+    async def test_new_message_is_pushed_to_subscribers(self):
+        communicator, _, _ = await self.open_connection(self.bob)
+        await self.subscribe(communicator, self.chat.id)
+
+        message = await database_sync_to_async(self.run_committed)(
+            Message.objects.create, chat=self.chat, sender=self.alice, content='Hello Bob'
+        )
+
+        event = await communicator.receive_json_from()
+        self.assertEqual(event['type'], 'message.created')
+        self.assertEqual(event['message']['id'], message.id)
+        await communicator.disconnect()
+
+    async def test_read_receipt_is_broadcast(self):
+        from .chat_utils import mark_chat_read
+
+        communicator, _, _ = await self.open_connection(self.bob)
+        await self.subscribe(communicator, self.chat.id)
+        message = await database_sync_to_async(Message.objects.create)(chat=self.chat, sender=self.bob, content='Hi Alice')
+        await communicator.receive_nothing()
+
+        await database_sync_to_async(self.run_committed)(mark_chat_read, self.chat, self.alice)
+
+        self.assertEqual(await communicator.receive_json_from(), {
+            'type': 'chat.read', 'chat_id': self.chat.id, 'user_id': self.alice.id, 'last_read_message_id': message.id,
+        })
+        await communicator.disconnect()
+
+    async def test_user_stays_online_until_last_connection_closes(self):
+        from .presence_utils import is_online
+
+        phone, _, _ = await self.open_connection(self.alice)
+        laptop, _, _ = await self.open_connection(self.alice)
+
+        await phone.disconnect()
+        self.assertTrue(await database_sync_to_async(is_online)(self.alice.id))
+        await laptop.disconnect()
+        self.assertFalse(await database_sync_to_async(is_online)(self.alice.id))
+
+
+class BondcoinLedgerTests(TestCase):
+    """Balance changes are conditional F() updates: no overdrafts, no double spends"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.spender = User.objects.create(username='spender', email='spender@example.com', name='Spender', bondcoin_balance=100)
+        cls.recipient = User.objects.create(username='recipient', email='recipient@example.com', name='Recipient')
+
+    def test_debit_beyond_balance_is_rejected(self):
+        from .bondcoin_utils import InsufficientBondcoinsError, debit, get_balance
+
+        with self.assertRaises(InsufficientBondcoinsError) as raised:
+            debit(self.spender, 150, 'spend', 'Too expensive')
+
+        self.assertEqual((raised.exception.required, raised.exception.balance), (150, 100))
+        self.assertEqual(get_balance(self.spender.id), 100)
+        self.assertFalse(BondcoinTransaction.objects.filter(user=self.spender).exists())
+
+    def test_balance_covering_one_debit_is_not_spent_twice(self):
+        from .bondcoin_utils import InsufficientBondcoinsError, debit, get_balance
+
+        # Two requests that both loaded the user while the balance was 100
+        first, second = User.objects.get(id=self.spender.id), User.objects.get(id=self.spender.id)
+        debit(first, 80, 'spend', 'First purchase')
+        with self.assertRaises(InsufficientBondcoinsError):
+            debit(second, 80, 'spend', 'Second purchase')
+
+        self.assertEqual(get_balance(self.spender.id), 20)
+        self.assertEqual(BondcoinTransaction.objects.filter(user=self.spender).count(), 1)
+
+    def test_failed_transfer_credits_nobody(self):
+        from .bondcoin_utils import InsufficientBondcoinsError, get_balance, transfer
+
+        with self.assertRaises(InsufficientBondcoinsError):
+            transfer(self.spender, [(self.recipient, 60), (self.recipient, 60)])
+
+        self.assertEqual((get_balance(self.spender.id), get_balance(self.recipient.id)), (100, 0))
+
+
+class PaymentCaptureTests(TestCase):
+    """Payments are captured in the background through conditional pending -> processing -> completed/failed moves"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.buyer = User.objects.create(username='shopper', email='shopper@example.com', name='Shopper')
+        cls.card = PaymentMethod.objects.create(name='credit_card', display_name='Credit Card')
+        cls.plan = SubscriptionPlan.objects.create(name='pro', display_name='BONDAH Pro', price_bondcoins=100, price_usd=10)
+
+    def create_payment(self, **fields):
+        fields.setdefault('transaction_type', 'bondcoin_purchase')
+        return PaymentTransaction.objects.create(
+            user=self.buyer, payment_method=self.card, amount_usd=10, total_amount=10, description='Payment', **fields
+        )
+
+    def purchase_payment(self):
+        ledger_entry = BondcoinTransaction.objects.create(
+            user=self.buyer, transaction_type='purchase', amount=100, status='pending', description='100 Bondcoins'
+        )
+        return self.create_payment(bondcoin_transaction=ledger_entry)
+
+    def test_capture_completes_and_credits_once(self):
+        from .bondcoin_utils import get_balance
+        from .payment_utils import capture_payment
+
+        payment = self.purchase_payment()
+        self.assertEqual(capture_payment(payment.id), 'completed')
+        self.assertEqual(capture_payment(payment.id), 'completed')  # a second job does nothing
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.provider, 'stripe')
+        self.assertIsNotNone(payment.processed_at)
+        self.assertEqual(get_balance(self.buyer.id), 100)
+        self.assertEqual(BondcoinTransaction.objects.get(id=payment.bondcoin_transaction_id).status, 'completed')
+
+    def test_failed_subscription_debit_fails_the_payment(self):
+        from .payment_utils import capture_payment
+
+        subscription = UserSubscription.objects.create(
+            user=self.buyer, plan=self.plan, status='pending', end_date=timezone.now() + timedelta(days=30)
+        )
+        payment = self.create_payment(transaction_type='subscription', subscription=subscription)
+
+        # The buyer has no Bondcoins to cover the plan
+        self.assertEqual(capture_payment(payment.id), 'failed')
+        payment.refresh_from_db()
+        self.assertIn('error', payment.provider_response)
+        self.assertEqual(UserSubscription.objects.get(id=subscription.id).status, 'pending')
+        self.assertFalse(BondcoinTransaction.objects.filter(user=self.buyer).exists())
+
+    def test_stalled_payments_are_resumed(self):
+        from .bondcoin_utils import get_balance
+        from .payment_utils import STALLED_PAYMENT_AGE, resume_stalled_payments
+
+        stalled = self.purchase_payment()
+        live = self.create_payment()
+        PaymentTransaction.objects.filter(id=stalled.id).update(
+            status='processing', updated_at=timezone.now() - STALLED_PAYMENT_AGE - timedelta(minutes=1)
+        )
+        PaymentTransaction.objects.filter(id=live.id).update(status='processing')  # a worker is on it
+
+        self.assertEqual(resume_stalled_payments(), 1)
+        self.assertEqual(PaymentTransaction.objects.get(id=stalled.id).status, 'completed')
+        self.assertEqual(PaymentTransaction.objects.get(id=live.id).status, 'processing')
+        self.assertEqual(get_balance(self.buyer.id), 100)
+
+    def test_process_payment_returns_202_with_status_url(self):
+        client = APIClient()
+        client.force_authenticate(self.buyer)
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = client.post('/api/payments/process/', {
+                'transaction_type': 'bondcoin_purchase', 'payment_method': self.card.id,
+                'amount_usd': '10.00', 'description': '100 Bondcoins',
+            }, format='json')
+
+        self.assertEqual(response.status_code, 202)
+        payment = PaymentTransaction.objects.get(id=response.data['data']['id'])
+        self.assertEqual(payment.status, 'pending')
+        self.assertEqual(response.data['status_url'], f'/api/payments/transactions/{payment.id}/')
+        self.assertEqual(len(callbacks), 1)  # the capture job, submitted on commit
+
+        self.assertEqual(client.get(response.data['status_url']).status_code, 200)
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET='whsec_test')
+class PaymentWebhookTests(TestCase):
+    """Webhooks are signature-checked, stored once per event and processed in leased batches with backoff"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.buyer = User.objects.create(username='buyer', email='buyer@example.com', name='Buyer')
+        cls.payment = PaymentTransaction.objects.create(
+            user=cls.buyer,
+            transaction_type='bondcoin_purchase',
+            payment_method=PaymentMethod.objects.create(name='credit_card', display_name='Credit Card'),
+            amount_usd=10,
+            total_amount=10,
+            description='100 Bondcoins'
+        )
+
+    def event(self, event_id='evt_1'):
+        return {
+            'id': event_id,
+            'type': 'payment_intent.succeeded',
+            'data': {'object': {'id': 'pi_1', 'metadata': {'transaction_id': str(self.payment.id)}}},
+        }
+
+    def deliver(self, event, secret='whsec_test', timestamp=None):
+        body = json.dumps(event)
+        timestamp = str(int(timestamp or time.time()))
+        signature = hmac.new(secret.encode(), f'{timestamp}.{body}'.encode(), hashlib.sha256).hexdigest()
+        return self.client.post(
+            '/api/payments/webhooks/stripe/', body, content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=f't={timestamp},v1={signature}'
+        )
+
+    def test_unsigned_or_forged_events_are_rejected(self):
+        body = json.dumps(self.event())
+        unsigned = self.client.post('/api/payments/webhooks/stripe/', body, content_type='application/json')
+        self.assertEqual(unsigned.status_code, 401)
+        self.assertEqual(self.deliver(self.event(), secret='whsec_forged').status_code, 401)
+        self.assertEqual(self.deliver(self.event(), timestamp=time.time() - 3600).status_code, 401)
+        unknown = self.client.post('/api/payments/webhooks/acme/', body, content_type='application/json')
+        self.assertEqual(unknown.status_code, 401)
+        with override_settings(STRIPE_WEBHOOK_SECRET=''):
+            self.assertEqual(self.deliver(self.event()).status_code, 401)
+        self.assertFalse(PaymentWebhook.objects.exists())
+
+        self.assertEqual(self.deliver(self.event()).status_code, 200)
+        self.assertEqual(PaymentWebhook.objects.count(), 1)
+
+    @override_settings(PAYPAL_CLIENT_ID='client', PAYPAL_CLIENT_SECRET='secret', PAYPAL_WEBHOOK_ID='WH-1')
+    def test_paypal_events_are_verified_with_paypal(self):
+        event = {'id': 'WH-EVT-1', 'event_type': 'PAYMENT.CAPTURE.COMPLETED', 'resource': {'id': 'CAP-1'}}
+        headers = {
+            'HTTP_PAYPAL_AUTH_ALGO': 'SHA256withRSA', 'HTTP_PAYPAL_CERT_URL': 'https://api.paypal.com/cert',
+            'HTTP_PAYPAL_TRANSMISSION_ID': 'tx-1', 'HTTP_PAYPAL_TRANSMISSION_SIG': 'sig',
+            'HTTP_PAYPAL_TRANSMISSION_TIME': '2026-10-17T12:00:00Z',
+        }
+
+        def deliver(verification_status):
+            token = mock.Mock(**{'json.return_value': {'access_token': 'token'}})
+            verification = mock.Mock(**{'json.return_value': {'verification_status': verification_status}})
+            with mock.patch('dating.webhook_utils.requests.post', side_effect=[token, verification]) as post:
+                response = self.client.post(
+                    '/api/payments/webhooks/paypal/', json.dumps(event), content_type='application/json', **headers
+                )
+            return response, post
+
+        response, post = deliver('FAILURE')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(post.call_args.kwargs['json']['webhook_id'], 'WH-1')
+        self.assertEqual(post.call_args.kwargs['json']['transmission_id'], 'tx-1')
+        self.assertEqual(post.call_args.kwargs['json']['webhook_event'], event)
+
+        response, _ = deliver('SUCCESS')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(PaymentWebhook.objects.get().event_id, 'WH-EVT-1')
+
+    def test_duplicate_delivery_is_processed_once(self):
+        from .webhook_utils import process_due_webhooks
+
+        self.assertFalse(self.deliver(self.event()).data['duplicate'])
+        self.assertTrue(self.deliver(self.event()).data['duplicate'])
+        self.assertEqual(PaymentWebhook.objects.count(), 1)
+
+        with mock.patch('dating.webhook_utils.complete_payment') as complete_payment:
+            self.assertEqual(process_due_webhooks(), 1)
+            self.assertEqual(process_due_webhooks(), 0)
+        self.assertEqual(complete_payment.call_count, 1)
+        self.assertTrue(PaymentWebhook.objects.get().processed)
+
+    def test_failed_event_is_retried_with_backoff(self):
+        from .webhook_utils import WEBHOOK_RETRY_BASE_DELAY, process_due_webhooks
+
+        self.deliver(self.event())
+        with mock.patch('dating.webhook_utils.apply_webhook_event', side_effect=RuntimeError('provider down')), \
+                self.assertLogs('dating.webhook_utils', 'WARNING'):
+            self.assertEqual(process_due_webhooks(), 0)
+        webhook = PaymentWebhook.objects.get()
+        self.assertEqual((webhook.attempts, webhook.processed, webhook.processing_error), (1, False, 'provider down'))
+        self.assertAlmostEqual(
+            (webhook.next_attempt_at - timezone.now()).total_seconds(), WEBHOOK_RETRY_BASE_DELAY.total_seconds(), delta=5
+        )
+
+        # Not retried before the backoff elapses
+        self.assertEqual(process_due_webhooks(), 0)
+        self.assertEqual(PaymentWebhook.objects.get().attempts, 1)
+
+        PaymentWebhook.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(process_due_webhooks(), 1)
+        webhook = PaymentWebhook.objects.get()
+        self.assertEqual((webhook.attempts, webhook.processed), (2, True))
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'completed')
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    """Email backend whose server rejects every message"""
+
+    def send_messages(self, email_messages):
+        raise ConnectionRefusedError('SMTP server unavailable')
+
+
+class EmailQueueTests(TestCase):
+    """Queued emails are delivered in batches, retried with backoff and given up on after EMAIL_MAX_ATTEMPTS"""
+
+    def test_queued_emails_are_delivered_and_secrets_redacted(self):
+        from .email_utils import REDACTED_MESSAGE, deliver_queued_emails, queue_email
+
+        queue_email('waitlist_confirmation', 'one@example.com', 'Welcome', 'You are on the list')
+        reset = queue_email('password_reset', 'two@example.com', 'Reset', 'https://bondah.org/reset/secret-token')
+        EmailLog.objects.update(sent_at=timezone.now() - timedelta(hours=1))  # queued an hour ago
+
+        delivered_at = timezone.now()
+        self.assertEqual(deliver_queued_emails(), 2)
+        self.assertEqual([email.to for email in mail.outbox], [['one@example.com'], ['two@example.com']])
+        self.assertIn('secret-token', mail.outbox[1].body)
+        self.assertFalse(EmailLog.objects.exclude(status='sent').exists())
+        self.assertFalse(EmailLog.objects.filter(sent_at__lt=delivered_at).exists())
+        self.assertEqual(EmailLog.objects.get(id=reset.id).message, REDACTED_MESSAGE)
+        self.assertEqual(EmailLog.objects.exclude(id=reset.id).get().message, 'You are on the list')
+
+    @override_settings(EMAIL_BACKEND='dating.tests.FailingEmailBackend')
+    def test_failed_email_is_retried_with_backoff_then_given_up(self):
+        from .email_utils import (
+            EMAIL_MAX_ATTEMPTS, EMAIL_RETRY_BASE_DELAY, REDACTED_MESSAGE, deliver_queued_emails, queue_email
+        )
+
+        email_log = queue_email('admin_otp', 'admin@example.com', 'Your code', 'Code: 123456')
+        with self.assertLogs('dating.email_utils', 'WARNING'):
+            self.assertEqual(deliver_queued_emails(), 0)
+        email_log.refresh_from_db()
+        self.assertEqual((email_log.status, email_log.attempts), ('queued', 1))
+        self.assertAlmostEqual(
+            (email_log.next_attempt_at - timezone.now()).total_seconds(), EMAIL_RETRY_BASE_DELAY.total_seconds(), delta=5
+        )
+        self.assertEqual(deliver_queued_emails(), 0)  # not due yet: nothing claimed
+        self.assertEqual(EmailLog.objects.get(id=email_log.id).attempts, 1)
+
+        for _ in range(EMAIL_MAX_ATTEMPTS - 1):
+            EmailLog.objects.filter(id=email_log.id).update(next_attempt_at=timezone.now())
+            with self.assertLogs('dating.email_utils', 'WARNING'):
+                deliver_queued_emails()
+
+        email_log.refresh_from_db()
+        self.assertEqual((email_log.status, email_log.attempts), ('failed', EMAIL_MAX_ATTEMPTS))
+        self.assertIsNone(email_log.next_attempt_at)
+        self.assertEqual(email_log.error_message, 'SMTP server unavailable')
+        self.assertEqual(email_log.message, REDACTED_MESSAGE)
+
+
+class NewsletterCampaignTests(TestCase):
+    """Campaigns queue each subscriber once and complete when their last email is delivered"""
+
+    @classmethod
+    def setUpTestData(cls):
+        NewsletterSubscriber.objects.bulk_create([NewsletterSubscriber(email=f'reader{i}@example.com') for i in range(5)])
+
+    def test_campaign_completes_when_delivered(self):
+        from .email_utils import deliver_queued_emails
+        from .newsletter_utils import queue_campaign
+
+        campaign = NewsletterCampaign.objects.create(subject='News', message='Hello', status='queuing', recipients_queued=1)
+        # A concurrent run already queued (and counted) the first subscriber
+        EmailLog.objects.create(
+            email_type='newsletter_campaign', recipient_email='reader0@example.com', subject='News',
+            message='Hello', status='queued', campaign=campaign
+        )
+
+        self.assertEqual(queue_campaign(campaign.id, chunk_size=2), 4)
+        campaign.refresh_from_db()
+        self.assertEqual((campaign.status, campaign.recipients_queued), ('sending', 5))
+
+        self.assertEqual(deliver_queued_emails(), 5)
+        campaign.refresh_from_db()
+        self.assertEqual(campaign.status, 'completed')
+        self.assertIsNotNone(campaign.completed_at)
+
+
+@mock.patch('dating.feed_utils.FEED_FANOUT_THRESHOLD', 2)
+class FeedFanOutTests(TestCase):
+    """Every followed post reaches the feed, pushed (fan-out on write) or pulled (fan-out on read)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='celebrity', email='celebrity@example.com', name='Celebrity')
+        cls.fan = User.objects.create(username='fan', email='fan@example.com', name='Fan')
+        cls.match = User.objects.create(username='match', email='match@example.com', name='Match')
+        cls.post = Post.objects.create(author=cls.author, content='Hello followers')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_follower_from_a_match_counts_towards_the_threshold(self):
+        from .feed_utils import fan_out_post, get_feed_queryset, get_high_reach_author_ids
+
+        # One interaction row, but two distinct followers
+        UserInteraction.objects.create(user=self.fan, target_user=self.author, interaction_type='like')
+        UserMatch.objects.create(user1=self.author, user2=self.match, distance=1, status='matched')
+
+        self.assertEqual(get_high_reach_author_ids(), {self.author.id})
+        self.assertEqual(fan_out_post(self.post.id), 0)
+        for follower in (self.fan, self.match):
+            self.assertIn(self.post, get_feed_queryset(follower))
+
+    def test_like_and_super_like_count_one_follower(self):
+        from .feed_utils import fan_out_post, get_feed_queryset, get_high_reach_author_ids
+
+        # Two interaction rows, one follower: pushed, not pulled
+        UserInteraction.objects.create(user=self.fan, target_user=self.author, interaction_type='like')
+        UserInteraction.objects.create(user=self.fan, target_user=self.author, interaction_type='super_like')
+
+        self.assertEqual(get_high_reach_author_ids(), set())
+        self.assertEqual(fan_out_post(self.post.id), 1)
+        self.assertIn(self.post, get_feed_queryset(self.fan))
+        self.assertTrue(Post.objects.get(id=self.post.id).fanned_out)
+
+    def test_pulled_post_stays_in_feed_after_author_drops_below_threshold(self):
+        from .feed_utils import fan_out_post, get_feed_queryset
+
+        UserInteraction.objects.create(user=self.fan, target_user=self.author, interaction_type='like')
+        match = UserMatch.objects.create(user1=self.author, user2=self.match, distance=1, status='matched')
+        self.assertEqual(fan_out_post(self.post.id), 0)
+        self.assertFalse(Post.objects.get(id=self.post.id).fanned_out)
+
+        # The author is no longer high-reach, but the post was never pushed
+        match.delete()
+        cache.clear()
+        self.assertIn(self.post, get_feed_queryset(self.fan))
+        self.assertFalse(FeedEntry.objects.filter(user=self.fan, post=self.post).exists())
+
+    @mock.patch('dating.feed_utils.submit_job', lambda func, *args: func(*args))
+    def test_new_like_backfills_the_authors_recent_posts(self):
+        from .feed_utils import fan_out_post, get_feed_queryset
+
+        # Pushed to nobody: the author had no followers yet
+        self.assertEqual(fan_out_post(self.post.id), 0)
+        self.assertTrue(Post.objects.get(id=self.post.id).fanned_out)
+        old_post = Post.objects.create(author=self.author, content='Too old')
+        Post.objects.filter(id=old_post.id).update(created_at=timezone.now() - timedelta(days=30))
+
+        UserInteraction.objects.create(user=self.fan, target_user=self.author, interaction_type='like')
+        self.assertEqual(
+            set(FeedEntry.objects.filter(user=self.fan).values_list('post_id', flat=True)), {self.post.id}
+        )
+        self.assertIn(self.post, get_feed_queryset(self.fan))
+
+    @mock.patch('dating.feed_utils.submit_job', lambda func, *args: func(*args))
+    def test_match_backfills_both_timelines(self):
+        match_post = Post.objects.create(author=self.match, content='Hi there')
+        UserMatch.objects.create(user1=self.author, user2=self.match, distance=1, status='matched')
+
+        self.assertTrue(FeedEntry.objects.filter(user=self.match, post=self.post).exists())
+        self.assertTrue(FeedEntry.objects.filter(user=self.author, post=match_post).exists())
@@ -25,6 +25,9 @@ from .views import (
     AdminUpdateApplicationStatusView,
     AdminWaitlistListView,
     AdminNewsletterListView,
+    AdminNewsletterCampaignListView,
+    AdminNewsletterCampaignDetailView,
+    AdminNewsletterCampaignSendView,
     AdminTokenRefreshView,
     AdminLogoutView,
     AdminVerifyTokenView,
@@ -81,6 +84,9 @@ from .views import (
     ChatDetailView,
     MessageListView,
     MessageDetailView,
+    ChatReadView,
+    PresenceHeartbeatView,
+    PresenceView,
     CallInitiateView,
     CallAnswerView,
     CallEndView,
@@ -96,6 +102,7 @@ from .views import (
     PostShareView,
     StoryListView,
     StoryDetailView,
+    StoryTrayView,
     StoryReactionView,
     FeedSearchView,
     FeedSuggestionsView,
@@ -143,6 +150,7 @@ from .views import (
     PaymentTransactionDetailView,
     ProcessPaymentView,
     PaymentWebhookView,
+    PaymentWebhookMetricsView,
     RefundPaymentView,
 )
 
@@ -185,6 +193,9 @@ urlpatterns = [
     path('admin/applications/<int:application_id>/status/', AdminUpdateApplicationStatusView.as_view(), name='admin-update-application-status'),
     path('admin/waitlist/', AdminWaitlistListView.as_view(), name='admin-waitlist-list'),
     path('admin/newsletter/', AdminNewsletterListView.as_view(), name='admin-newsletter-list'),
+    path('admin/newsletter/campaigns/', AdminNewsletterCampaignListView.as_view(), name='admin-newsletter-campaigns'),
+    path('admin/newsletter/campaigns/<int:campaign_id>/', AdminNewsletterCampaignDetailView.as_view(), name='admin-newsletter-campaign-detail'),
+    path('admin/newsletter/campaigns/<int:campaign_id>/send/', AdminNewsletterCampaignSendView.as_view(), name='admin-newsletter-campaign-send'),
     
     # Mobile App Authentication Endpoints
     path('auth/register/', UserRegisterView.as_view(), name='user-register'),
@@ -247,9 +258,12 @@ urlpatterns = [
     path('chat/<int:pk>/', ChatDetailView.as_view(), name='chat-detail'),
     path('chat/<int:chat_id>/messages/', MessageListView.as_view(), name='message-list'),
     path('chat/<int:chat_id>/messages/<int:pk>/', MessageDetailView.as_view(), name='message-detail'),
+    path('chat/<int:chat_id>/read/', ChatReadView.as_view(), name='chat-read'),
     path('chat/<int:chat_id>/report/', ChatReportView.as_view(), name='chat-report'),
     path('chat/<int:chat_id>/messages/<int:message_id>/report/', ChatReportView.as_view(), name='message-report'),
     path('chat/matchmaker-intro/', MatchmakerIntroView.as_view(), name='matchmaker-intro'),
+    path('presence/', PresenceView.as_view(), name='presence'),
+    path('presence/heartbeat/', PresenceHeartbeatView.as_view(), name='presence-heartbeat'),
     
     # Voice/Video Call Endpoints (NEW)
     path('calls/initiate/', CallInitiateView.as_view(), name='call-initiate'),
@@ -266,6 +280,7 @@ urlpatterns = [
     path('feed/comments/<int:comment_id>/report/', PostReportView.as_view(), name='comment-report'),
     path('feed/posts/<int:post_id>/share/', PostShareView.as_view(), name='post-share'),
     path('feed/stories/', StoryListView.as_view(), name='story-list'),
+    path('feed/stories/tray/', StoryTrayView.as_view(), name='story-tray'),
     path('feed/stories/<int:pk>/', StoryDetailView.as_view(), name='story-detail'),
     path('feed/stories/<int:story_id>/react/', StoryReactionView.as_view(), name='story-reaction'),
     path('feed/search/', FeedSearchView.as_view(), name='feed-search'),
@@ -327,6 +342,7 @@ urlpatterns = [
     path('payments/transactions/', PaymentTransactionListView.as_view(), name='payment-transactions'),
     path('payments/transactions/<int:pk>/', PaymentTransactionDetailView.as_view(), name='payment-transaction-detail'),
     path('payments/process/', ProcessPaymentView.as_view(), name='process-payment'),
+    path('payments/webhooks/metrics/', PaymentWebhookMetricsView.as_view(), name='payment-webhook-metrics'),
     path('payments/webhooks/<str:provider>/', PaymentWebhookView.as_view(), name='payment-webhook'),
     path('payments/refund/<int:transaction_id>/', RefundPaymentView.as_view(), name='refund-payment'),
 ]
\ No newline at end of file
@@ -0,0 +1,72 @@
+"""
+Viewer state - the requesting user's own interactions with a page of items
+
+Post and story serializers show whether the viewer liked/shared/bonded a
+post, viewed a story and how they reacted to it. Looking that up per item
+costs a query per item; instead the page's list serializer preloads the
+viewer's rows for every id on the page, one query per table, into the
+serializer context, and the per-item fields read from it.
+"""
+
+from typing import Iterable, Optional
+
+
+def get_context_viewer(context: dict):
+    """The authenticated user the serializer renders for, or None"""
+    request = context.get('request')
+    if request and request.user.is_authenticated:
+        return request.user
+    return None
+
+
+def preload_post_interactions(context: dict, post_ids: Iterable[int]) -> None:
+    """
+    Load the viewer's interaction types for a page of posts in one query,
+    skipping posts already loaded
+    """
+    from .models import PostInteraction
+
+    viewer = get_context_viewer(context)
+    interactions = context.setdefault('post_interactions', {})
+    missing = set(post_ids) - set(interactions)
+    if not viewer or not missing:
+        return
+
+    interactions.update({post_id: [] for post_id in missing})
+    for post_id, interaction_type in PostInteraction.objects.filter(
+        user=viewer, post_id__in=missing
+    ).values_list('post_id', 'interaction_type'):
+        interactions[post_id].append(interaction_type)
+
+
+def get_context_post_interactions(context: dict, post_id) -> list:
+    """The viewer's interaction types with one post, looked up if not preloaded"""
+    preload_post_interactions(context, [post_id])
+    return context['post_interactions'].get(post_id, [])
+
+
+def preload_story_viewer_state(context: dict, story_ids: Iterable[int]) -> None:
+    """
+    Load which of a page of stories the viewer has viewed and their reactions,
+    one query each, skipping stories already loaded
+    """
+    from .models import StoryReaction, StoryView
+
+    viewer = get_context_viewer(context)
+    story_state = context.setdefault('story_viewer_state', {})
+    missing = set(story_ids) - set(story_state)
+    if not viewer or not missing:
+        return
+
+    viewed = set(StoryView.objects.filter(viewer=viewer, story_id__in=missing).values_list('story_id', flat=True))
+    reactions = dict(StoryReaction.objects.filter(user=viewer, story_id__in=missing).values_list('story_id', 'reaction_type'))
+    story_state.update({
+        story_id: {'viewed': story_id in viewed, 'reaction': reactions.get(story_id)}
+        for story_id in missing
+    })
+
+
+def get_context_story_viewer_state(context: dict, story_id) -> Optional[dict]:
+    """The viewer's view/reaction state for one story, looked up if not preloaded"""
+    preload_story_viewer_state(context, [story_id])
+    return context['story_viewer_state'].get(story_id)
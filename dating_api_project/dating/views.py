@@ -1,4 +1,4 @@
-from django.shortcuts import render
+from django.shortcuts import render, get_object_or_404
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from django.db.models import Sum
@@ -9,10 +9,8 @@ import string
 from django.utils import timezone
 from datetime import timedelta
 from django.contrib.auth.hashers import make_password, check_password
-from .models import NewsletterSubscriber, PuzzleVerification, CoinTransaction, Waitlist, EmailLog, Job, JobApplication, AdminUser, AdminOTP, TranslationLog, SocialAccount, DeviceRegistration, LocationHistory, UserMatch, LocationPermission, EmailVerification, PhoneVerification, UserRoleSelection
+from .models import NewsletterSubscriber, PuzzleVerification, CoinTransaction, Waitlist, Job, JobApplication, AdminUser, AdminOTP, TranslationLog, SocialAccount, DeviceRegistration, LocationHistory, UserMatch, LocationPermission, EmailVerification, PhoneVerification, UserRoleSelection
 from django.contrib.auth import get_user_model
-from django.core.mail import send_mail
-from django.conf import settings
 from .serializers import (
     UserSerializer, 
     NewsletterSubscriberSerializer, 
@@ -41,6 +39,7 @@ from .serializers import (
     PasswordResetConfirmSerializer,
     UserProfileSerializer,
     UserProfileUpdateSerializer,
+    UserProfileDetailSerializer,
     SocialLoginSerializer,
     DeviceRegistrationSerializer,
     # OAuth Serializers
@@ -69,7 +68,9 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.parsers import MultiPartParser, FormParser
 from django.db.models import Q
 from .jwt_utils import generate_tokens, refresh_access_token, revoke_refresh_token
+from .email_utils import queue_email
 from .permissions import AdminJWTPermission
+from .pagination import FeedPagination, CommentPagination
 
 User = get_user_model()
 
@@ -121,32 +122,8 @@ The Bondah Team
 P.S. Follow us on social media for daily dating insights!
                 """.strip()
                 
-                # Log email attempt
-                email_log = EmailLog.objects.create(
-                    email_type='newsletter_welcome',
-                    recipient_email=email,
-                    subject=subject,
-                    message=message
-                )
-                
-                try:
-                    # Send email using Django's email functionality
-                    send_mail(
-                        subject=subject,
-                        message=message,
-                        from_email=settings.DEFAULT_FROM_EMAIL,
-                        recipient_list=[email],
-                        fail_silently=False,
-                    )
-                    
-                    email_log.is_sent = True
-                    email_log.save()
-                    
-                except Exception as e:
-                    email_log.is_sent = False
-                    email_log.error_message = str(e)
-                    email_log.save()
-                    # Don't fail the signup if email fails
+                # Queue the welcome email; it is delivered in the background
+                queue_email('newsletter_welcome', email, subject, message)
                 
                 # Return success response
                 return Response({
@@ -409,40 +386,13 @@ Best regards,
 The Bondah Team
             """.strip()
             
-            # Log email attempt
-            email_log = EmailLog.objects.create(
-                email_type='newsletter_welcome',
-                recipient_email=email,
-                subject=subject,
-                message=message
-            )
+            email_log = queue_email('newsletter_welcome', email, subject, message)
             
-            try:
-                # Send email using Django's email functionality
-                send_mail(
-                    subject=subject,
-                    message=message,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[email],
-                    fail_silently=False,
-                )
-                
-                email_log.is_sent = True
-                email_log.save()
-                
-                return Response({
-                    "message": "Welcome email sent successfully!",
-                    "status": "success"
-                }, status=status.HTTP_200_OK)
-            except Exception as e:
-                email_log.is_sent = False
-                email_log.error_message = str(e)
-                email_log.save()
-                
-                return Response({
-                    "message": f"Failed to send email: {str(e)}",
-                    "status": "error"
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            return Response({
+                "message": "Welcome email queued for delivery!",
+                "status": "success",
+                "emailLogId": email_log.id
+            }, status=status.HTTP_202_ACCEPTED)
         
         return Response({
             "message": "Invalid data provided",
@@ -479,40 +429,13 @@ The Bondah Team
 P.S. Share this with friends who might be interested in joining too!
             """.strip()
             
-            # Log email attempt
-            email_log = EmailLog.objects.create(
-                email_type='waitlist_confirmation',
-                recipient_email=email,
-                subject=subject,
-                message=message
-            )
+            email_log = queue_email('waitlist_confirmation', email, subject, message)
             
-            try:
-                # Send email using Django's email functionality
-                send_mail(
-                    subject=subject,
-                    message=message,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[email],
-                    fail_silently=False,
-                )
-                
-                email_log.is_sent = True
-                email_log.save()
-                
-                return Response({
-                    "message": "Waitlist confirmation email sent!",
-                    "status": "success"
-                }, status=status.HTTP_200_OK)
-            except Exception as e:
-                email_log.is_sent = False
-                email_log.error_message = str(e)
-                email_log.save()
-                
-                return Response({
-                    "message": f"Failed to send email: {str(e)}",
-                    "status": "error"
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            return Response({
+                "message": "Waitlist confirmation email queued for delivery!",
+                "status": "success",
+                "emailLogId": email_log.id
+            }, status=status.HTTP_202_ACCEPTED)
         
         return Response({
             "message": "Invalid data provided",
@@ -529,40 +452,13 @@ class SendGenericEmailView(APIView):
             subject = serializer.validated_data['subject']
             message = serializer.validated_data['message']
             
-            # Log email attempt
-            email_log = EmailLog.objects.create(
-                email_type='generic',
-                recipient_email=to_email,
-                subject=subject,
-                message=message
-            )
+            email_log = queue_email('generic', to_email, subject, message)
             
-            try:
-                # Send email using Django's email functionality
-                send_mail(
-                    subject=subject,
-                    message=message,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[to_email],
-                    fail_silently=False,
-                )
-                
-                email_log.is_sent = True
-                email_log.save()
-                
-                return Response({
-                    "message": "Email sent successfully!",
-                    "status": "success"
-                }, status=status.HTTP_200_OK)
-            except Exception as e:
-                email_log.is_sent = False
-                email_log.error_message = str(e)
-                email_log.save()
-                
-                return Response({
-                    "message": f"Failed to send email: {str(e)}",
-                    "status": "error"
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            return Response({
+                "message": "Email queued for delivery!",
+                "status": "success",
+                "emailLogId": email_log.id
+            }, status=status.HTTP_202_ACCEPTED)
         
         return Response({
             "message": "Invalid data provided",
@@ -653,32 +549,8 @@ The Bondah Team
 P.S. Follow us on social media to stay updated on our journey!
                 """.strip()
                 
-                # Log email attempt
-                email_log = EmailLog.objects.create(
-                    email_type='job_application_confirmation',
-                    recipient_email=applicant_email,
-                    subject=subject,
-                    message=message
-                )
-                
-                try:
-                    # Send email using Django's email functionality
-                    send_mail(
-                        subject=subject,
-                        message=message,
-                        from_email=settings.DEFAULT_FROM_EMAIL,
-                        recipient_list=[applicant_email],
-                        fail_silently=False,
-                    )
-                    
-                    email_log.is_sent = True
-                    email_log.save()
-                    
-                except Exception as e:
-                    email_log.is_sent = False
-                    email_log.error_message = str(e)
-                    email_log.save()
-                    # Don't fail the application if email fails
+                # Queue the confirmation email; it is delivered in the background
+                queue_email('job_application_confirmation', applicant_email, subject, message)
                 
                 # Return success response
                 return Response({
@@ -747,28 +619,12 @@ The Bondah Team
 P.S. Keep your admin credentials secure!
                     """.strip()
                     
-                    try:
-                        # Send email with timeout handling
-                        send_mail(
-                            subject=subject,
-                            message=message,
-                            from_email=settings.DEFAULT_FROM_EMAIL,
-                            recipient_list=[email],
-                            fail_silently=True,  # Don't fail the request if email fails
-                        )
-                        
-                        return Response({
-                            "message": "OTP sent to your email",
-                            "status": "success"
-                        }, status=status.HTTP_200_OK)
-                    except Exception as e:
-                        # Log the error but don't fail the request
-                        print(f"Email sending failed: {str(e)}")
-                        return Response({
-                            "message": "OTP generated but email delivery may be delayed",
-                            "status": "success",
-                            "otp_code": otp_code  # Temporarily return OTP for debugging
-                        }, status=status.HTTP_200_OK)
+                    queue_email('admin_otp', email, subject, message)
+                    
+                    return Response({
+                        "message": "OTP sent to your email",
+                        "status": "success"
+                    }, status=status.HTTP_200_OK)
                 else:
                     return Response({
                         "message": "Invalid credentials",
@@ -1380,6 +1236,89 @@ class AdminNewsletterListView(APIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class AdminNewsletterCampaignListView(APIView):
+    """Admin view to list newsletter campaigns and create new ones"""
+    permission_classes = [AdminJWTPermission]
+    
+    def get(self, request):
+        from .models import NewsletterCampaign
+        from .serializers import NewsletterCampaignSerializer
+        
+        campaigns = NewsletterCampaign.objects.all()[:100]
+        return Response({
+            "message": "Newsletter campaigns retrieved successfully",
+            "status": "success",
+            "campaigns": NewsletterCampaignSerializer(campaigns, many=True).data
+        }, status=status.HTTP_200_OK)
+    
+    def post(self, request):
+        """Create a campaign; with "send": true it starts sending immediately"""
+        from .serializers import NewsletterCampaignSerializer
+        from .newsletter_utils import start_campaign
+        
+        serializer = NewsletterCampaignSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({
+                "message": "Invalid campaign data",
+                "status": "error",
+                "errors": serializer.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        campaign = serializer.save(created_by=request.admin_user)
+        if request.data.get('send') in (True, 'true', '1'):
+            start_campaign(campaign)
+            campaign.refresh_from_db()
+        
+        return Response({
+            "message": "Newsletter campaign created successfully",
+            "status": "success",
+            "campaign": NewsletterCampaignSerializer(campaign).data
+        }, status=status.HTTP_201_CREATED)
+
+
+class AdminNewsletterCampaignDetailView(APIView):
+    """Admin view of a campaign's delivery progress"""
+    permission_classes = [AdminJWTPermission]
+    
+    def get(self, request, campaign_id):
+        from .models import NewsletterCampaign
+        from .serializers import NewsletterCampaignSerializer
+        from .newsletter_utils import get_campaign_progress
+        
+        campaign = get_object_or_404(NewsletterCampaign, id=campaign_id)
+        progress = get_campaign_progress(campaign)
+        return Response({
+            "message": "Newsletter campaign retrieved successfully",
+            "status": "success",
+            "campaign": NewsletterCampaignSerializer(campaign).data,
+            "progress": progress
+        }, status=status.HTTP_200_OK)
+
+
+class AdminNewsletterCampaignSendView(APIView):
+    """Admin view to start sending a draft campaign to every subscriber"""
+    permission_classes = [AdminJWTPermission]
+    
+    def post(self, request, campaign_id):
+        from .models import NewsletterCampaign
+        from .serializers import NewsletterCampaignSerializer
+        from .newsletter_utils import start_campaign
+        
+        campaign = get_object_or_404(NewsletterCampaign, id=campaign_id)
+        if not start_campaign(campaign):
+            return Response({
+                "message": f"Campaign has already been started ({campaign.get_status_display()})",
+                "status": "error"
+            }, status=status.HTTP_409_CONFLICT)
+        
+        campaign.refresh_from_db()
+        return Response({
+            "message": "Newsletter campaign is being sent",
+            "status": "success",
+            "campaign": NewsletterCampaignSerializer(campaign).data
+        }, status=status.HTTP_202_ACCEPTED)
+
+
 class AdminTokenRefreshView(APIView):
     """Refresh access token using refresh token"""
     permission_classes = [AllowAny]
@@ -1652,24 +1591,12 @@ Best regards,
 The Bondah Team
             """.strip()
             
-            try:
-                send_mail(
-                    subject=subject,
-                    message=message,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[email],
-                    fail_silently=False,
-                )
-                
-                return Response({
-                    "message": "Password reset email sent",
-                    "status": "success"
-                }, status=status.HTTP_200_OK)
-            except Exception as e:
-                return Response({
-                    "message": f"Failed to send reset email: {str(e)}",
-                    "status": "error"
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            queue_email('password_reset', email, subject, message)
+            
+            return Response({
+                "message": "Password reset email sent",
+                "status": "success"
+            }, status=status.HTTP_200_OK)
         
         return Response({
             "message": "Invalid email",
@@ -1728,7 +1655,10 @@ class UserProfileView(APIView):
             user = request.user
             serializer = UserProfileDetailSerializer(user, data=request.data, partial=True)
             if serializer.is_valid():
+                from .recommendation_utils import invalidate_recommendations
+                
                 updated_user = serializer.save()
+                invalidate_recommendations(updated_user.id)
                 return Response({
                     "message": "Profile updated successfully",
                     "status": "success",
@@ -2315,7 +2245,10 @@ class LocationPrivacyUpdateView(APIView):
         serializer = LocationPrivacyUpdateSerializer(request.user, data=request.data, partial=True)
         if serializer.is_valid():
             try:
+                from .recommendation_utils import invalidate_recommendations
+                
                 serializer.save()
+                invalidate_recommendations(request.user.id)
                 
                 return Response({
                     "message": "Location privacy settings updated successfully",
@@ -2422,11 +2355,9 @@ class NearbyUsersView(APIView):
             results = []
             for user_data in nearby_users:
                 user = user_data['user']
-                serializer = NearbyUserSerializer(user)
-                result = serializer.data
-                result['distance'] = user_data['distance']
-                result['coordinates'] = user_data['coordinates']
-                results.append(result)
+                user.distance = user_data['distance']
+                user.coordinates = user_data['coordinates']
+                results.append(NearbyUserSerializer(user).data)
             
             return Response({
                 "message": "Nearby users retrieved successfully",
@@ -2465,7 +2396,10 @@ class MatchPreferencesView(APIView):
         serializer = MatchPreferencesSerializer(request.user, data=request.data, partial=True)
         if serializer.is_valid():
             try:
+                from .recommendation_utils import invalidate_recommendations
+                
                 serializer.save()
+                invalidate_recommendations(request.user.id)
                 
                 return Response({
                     "message": "Match preferences updated successfully",
@@ -2584,27 +2518,14 @@ Best regards,
 The Bondah Team
                 """.strip()
                 
-                try:
-                    send_mail(
-                        subject=subject,
-                        message=message,
-                        from_email=settings.DEFAULT_FROM_EMAIL,
-                        recipient_list=[email],
-                        fail_silently=False,
-                    )
-                    
-                    return Response({
-                        "message": "OTP sent to your email",
-                        "status": "success",
-                        "email": email,
-                        "expires_in": 600  # 10 minutes
-                    }, status=status.HTTP_200_OK)
-                    
-                except Exception as e:
-                    return Response({
-                        "message": "OTP generated but email delivery failed. Please try again.",
-                        "status": "error"
-                    }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+                queue_email('email_verification', email, subject, message)
+                
+                return Response({
+                    "message": "OTP sent to your email",
+                    "status": "success",
+                    "email": email,
+                    "expires_in": 600  # 10 minutes
+                }, status=status.HTTP_200_OK)
                     
             except Exception as e:
                 return Response({
@@ -2907,13 +2828,7 @@ Best regards,
 The Bondah Team
                 """.strip()
                 
-                send_mail(
-                    subject=subject,
-                    message=message,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[identifier],
-                    fail_silently=False,
-                )
+                queue_email('email_verification', identifier, subject, message)
                 
                 return Response({
                     "message": "New OTP sent to your email",
@@ -3042,66 +2957,69 @@ class UserSearchView(APIView):
         if filters.get('has_photos'):
             queryset = queryset.exclude(profile_picture__isnull=True).exclude(profile_picture='')
         
-        # Text search
+        # Text search through the full-text index, ranked and prefix-matched
         if filters.get('query'):
-            query = filters['query']
-            queryset = queryset.filter(
-                models.Q(name__icontains=query) |
-                models.Q(bio__icontains=query) |
-                models.Q(city__icontains=query) |
-                models.Q(state__icontains=query) |
-                models.Q(country__icontains=query)
-            )
+            from .search_utils import search_users
+            queryset = search_users(queryset, filters['query'])
+        
+        # Interest and hobby filtering through the normalized tag index
+        if filters.get('interests') or filters.get('hobbies'):
+            from .tag_utils import filter_by_tags
+            tag_match = filters.get('tag_match', 'all')
+            queryset = filter_by_tags(queryset, filters.get('interests'), 'interest', tag_match)
+            queryset = filter_by_tags(queryset, filters.get('hobbies'), 'hobby', tag_match)
+        
+        # Distance filtering and ordering, done in the database
+        sort_by = filters.get('sort_by') or ('relevance' if filters.get('query') else 'newest')
+        if request.user.has_location and (filters.get('max_distance') or sort_by == 'distance'):
+            from .location_utils import distance_expression, filter_within_bounding_box
+            
+            latitude, longitude = request.user.location_coordinates
+            queryset = queryset.filter(latitude__isnull=False, longitude__isnull=False)
+            if filters.get('max_distance'):
+                # Indexed geohash/bounding-box prefilter, then the exact distance
+                queryset = filter_within_bounding_box(queryset, latitude, longitude, filters['max_distance'])
+            queryset = queryset.annotate(distance=distance_expression(latitude, longitude))
+            if filters.get('max_distance'):
+                queryset = queryset.filter(distance__lte=filters['max_distance'])
+        
+        if sort_by == 'distance' and request.user.has_location:
+            ordering = ('distance', 'id')
+        elif sort_by == 'relevance' and filters.get('query'):
+            ordering = ('-search_rank', 'id')
+        else:
+            # Order by relevance (can be enhanced with ML)
+            ordering = ('-date_joined', '-id')
+        queryset = queryset.order_by(*ordering)
         
-        # Interest and hobby filtering
-        if filters.get('interests'):
-            for interest in filters['interests']:
-                queryset = queryset.filter(interests__icontains=interest)
-        
-        if filters.get('hobbies'):
-            for hobby in filters['hobbies']:
-                queryset = queryset.filter(hobbies__icontains=hobby)
-        
-        # Distance filtering
-        if filters.get('max_distance') and request.user.has_location:
-            max_distance = filters['max_distance']
-            nearby_users = []
-            for user in queryset:
-                if user.has_location:
-                    distance = request.user.get_distance_to(user)
-                    if distance and distance <= max_distance:
-                        nearby_users.append(user)
-            queryset = User.objects.filter(id__in=[u.id for u in nearby_users])
-        
-        # Order by relevance (can be enhanced with ML)
-        queryset = queryset.order_by('-date_joined')
-        
-        # Pagination
-        page_size = int(request.GET.get('page_size', 20))
-        page = int(request.GET.get('page', 1))
-        start = (page - 1) * page_size
-        end = start + page_size
-        
-        users = queryset[start:end]
+        # Pagination (page number or keyset cursor), counted once
+        from .pagination import paginate_queryset
+        try:
+            users, pagination = paginate_queryset(request, queryset, ordering)
+        except ValueError as e:
+            return Response({
+                "message": "Invalid pagination parameters",
+                "status": "error",
+                "errors": str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
         
         # Serialize results
         serializer = UserSearchSerializer(users, many=True, context={'request': request})
         
         # Store search query for analytics
+        from .models import SearchQuery
         SearchQuery.objects.create(
             user=request.user,
             query=filters.get('query', ''),
             filters=filters,
-            results_count=queryset.count()
+            results_count=pagination['total_count']
         )
         
         return Response({
             "message": "Search completed successfully",
             "status": "success",
             "results": serializer.data,
-            "total_count": queryset.count(),
-            "page": page,
-            "page_size": page_size
+            **pagination
         }, status=status.HTTP_200_OK)
 
 
@@ -3205,51 +3123,37 @@ class UserRecommendationsView(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
+        from django.core.cache import cache
         from .serializers import RecommendationSerializer
+        from .models import RecommendationEngine
+        from .recommendation_utils import (
+            refresh_recommendations, get_recommendation_cache_key, RECOMMENDATION_CACHE_TTL
+        )
         
-        # Get user's preferences
         user = request.user
         
-        # Simple recommendation algorithm (can be enhanced with ML)
-        recommendations = []
-        
-        # Location-based recommendations
-        if user.has_location:
-            nearby_users = User.objects.filter(
-                is_active=True,
-                latitude__isnull=False,
-                longitude__isnull=False
-            ).exclude(id=user.id)
-            
-            for nearby_user in nearby_users:
-                distance = user.get_distance_to(nearby_user)
-                if distance and distance <= user.max_distance:
-                    # Calculate compatibility score
-                    from .location_utils import calculate_match_score
-                    score = calculate_match_score(user, nearby_user)
-                    
-                    if score > 50:  # Only recommend users with >50% compatibility
-                        RecommendationEngine.objects.get_or_create(
-                            user=user,
-                            recommended_user=nearby_user,
-                            defaults={
-                                'score': score,
-                                'algorithm': 'location_based'
-                            }
-                        )
+        # Serve the cached feed until the user's location/preferences/profile change
+        cache_key = get_recommendation_cache_key(user.id)
+        recommendations_data = cache.get(cache_key)
         
-        # Get active recommendations
-        recommendations = RecommendationEngine.objects.filter(
-            user=user,
-            is_active=True
-        ).order_by('-score')[:20]
-        
-        serializer = RecommendationSerializer(recommendations, many=True)
+        if recommendations_data is None:
+            # Location-based recommendations, scored and stored in bulk
+            if user.has_location:
+                refresh_recommendations(user)
+            
+            # Get active recommendations
+            recommendations = RecommendationEngine.objects.filter(
+                user=user,
+                is_active=True
+            ).select_related('recommended_user').order_by('-score')[:20]
+            
+            recommendations_data = list(RecommendationSerializer(recommendations, many=True).data)
+            cache.set(cache_key, recommendations_data, RECOMMENDATION_CACHE_TTL)
         
         return Response({
             "message": "Recommendations retrieved successfully",
             "status": "success",
-            "recommendations": serializer.data
+            "recommendations": recommendations_data
         }, status=status.HTTP_200_OK)
 
 
@@ -3290,15 +3194,19 @@ class CategoryFilterView(APIView):
         # 'all' category shows all users
         
         # Order by relevance
-        queryset = queryset.order_by('-date_joined')
+        ordering = ('-date_joined', '-id')
+        queryset = queryset.order_by(*ordering)
         
-        # Pagination
-        page_size = int(request.GET.get('page_size', 20))
-        page = int(request.GET.get('page', 1))
-        start = (page - 1) * page_size
-        end = start + page_size
-        
-        users = queryset[start:end]
+        # Pagination (page number or keyset cursor)
+        from .pagination import paginate_queryset
+        try:
+            users, pagination = paginate_queryset(request, queryset, ordering)
+        except ValueError as e:
+            return Response({
+                "message": "Invalid pagination parameters",
+                "status": "error",
+                "errors": str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
         
         # Serialize results
         serializer = UserSearchSerializer(users, many=True, context={'request': request})
@@ -3307,9 +3215,7 @@ class CategoryFilterView(APIView):
             "message": f"Category '{category}' results retrieved successfully",
             "status": "success",
             "results": serializer.data,
-            "total_count": queryset.count(),
-            "page": page,
-            "page_size": page_size
+            **pagination
         }, status=status.HTTP_200_OK)
 
 
@@ -3340,10 +3246,10 @@ class UserInterestsView(APIView):
                 "status": "error"
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Update user's interests and hobbies
+        # Update user's interests and hobbies (save() also syncs the tag index)
         request.user.interests = interests
         request.user.hobbies = hobbies
-        request.user.save()
+        request.user.save(update_fields=['interests', 'hobbies'])
         
         return Response({
             "message": "Interests updated successfully",
@@ -3371,16 +3277,23 @@ class ChatListView(generics.ListCreateAPIView):
         return ChatSerializer
     
     def get_queryset(self):
+        from .models import Chat, ChatParticipant
         user = self.request.user
-        return Chat.objects.filter(participants=user, is_active=True).annotate(
-            last_message_at=models.Max('messages__timestamp')
-        ).order_by('-last_message_at')
+        
+        # Last message and unread counters are denormalized at write time, so the
+        # inbox is one query for the chats plus one for all their participants
+        return Chat.objects.filter(chat_participants__user=user, is_active=True).select_related(
+            'last_message__sender'
+        ).prefetch_related(
+            models.Prefetch('chat_participants', queryset=ChatParticipant.objects.select_related('user'))
+        ).order_by(models.F('last_message_at').desc(nulls_last=True), '-id')
     
     def perform_create(self, serializer):
         """Create chat with current user as creator"""
+        from .chat_utils import add_chat_participants
         chat = serializer.save(created_by=self.request.user)
         # Add current user to participants
-        chat.participants.add(self.request.user)
+        add_chat_participants(chat, [self.request.user])
 
 
 class ChatDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -3420,26 +3333,67 @@ class MessageListView(generics.ListCreateAPIView):
         from .serializers import MessageSerializer
         return MessageSerializer
     
-    def get_queryset(self):
-        chat_id = self.kwargs['chat_id']
-        user = self.request.user
-        
+    def get_chat(self):
+        from .models import Chat
         # Ensure the user is a participant of the chat
-        chat = get_object_or_404(Chat, id=chat_id, participants=user, is_active=True)
+        return get_object_or_404(Chat, id=self.kwargs['chat_id'], participants=self.request.user, is_active=True)
+    
+    def get_queryset(self):
+        from .models import Message
+        # Listing is read-only: read receipts are acknowledged through ChatReadView
+        return Message.objects.filter(chat=self.get_chat()).select_related(
+            'sender', 'reply_to__sender'
+        ).order_by('timestamp', 'id')
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request.method == 'GET':
+            from .chat_utils import get_read_cursors
+            context['read_cursors'] = get_read_cursors(self.kwargs['chat_id'])
+        return context
+    
+    def list(self, request, *args, **kwargs):
+        """
+        ?since=<message_id> returns messages newer than that message (incremental sync),
+        ?before=<message_id> pages backwards through history. Without either, the
+        full history is returned page by page.
+        """
+        if 'since' not in request.GET and 'before' not in request.GET:
+            return super().list(request, *args, **kwargs)
+        
+        from .chat_utils import get_message_page, MESSAGE_PAGE_SIZE, MAX_MESSAGE_PAGE_SIZE
+        from .models import Message
+        try:
+            since = int(request.GET['since']) if 'since' in request.GET else None
+            before = int(request.GET['before']) if 'before' in request.GET else None
+            limit = max(1, min(int(request.GET.get('limit', MESSAGE_PAGE_SIZE)), MAX_MESSAGE_PAGE_SIZE))
+        except ValueError:
+            return Response({
+                "message": "since, before and limit must be integers",
+                "status": "error"
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Mark messages as read when retrieved by the recipient
-        Message.objects.filter(chat=chat, is_read=False).exclude(sender=user).update(
-            is_read=True, read_at=timezone.now()
-        )
+        chat = self.get_chat()
+        try:
+            messages, has_more = get_message_page(chat, since=since, before=before, limit=limit)
+        except Message.DoesNotExist:
+            return Response({
+                "message": "Anchor message not found in this chat",
+                "status": "error"
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        return Message.objects.filter(chat=chat).order_by('timestamp')
+        serializer = self.get_serializer(messages, many=True)
+        return Response({
+            "results": serializer.data,
+            "has_more": has_more,
+            "oldest_id": messages[0].id if messages else before,
+            "newest_id": messages[-1].id if messages else since
+        }, status=status.HTTP_200_OK)
     
     def perform_create(self, serializer):
         """Create message with current user as sender"""
-        chat_id = self.kwargs['chat_id']
         user = self.request.user
-        
-        chat = get_object_or_404(Chat, id=chat_id, participants=user, is_active=True)
+        chat = self.get_chat()
         
         # Handle file uploads for voice notes and media
         voice_note_file = self.request.FILES.get('voice_note_file')
@@ -3476,53 +3430,30 @@ class MessageListView(generics.ListCreateAPIView):
         tip_gift = serializer.validated_data.get('tip_gift')
         
         # For tip messages, process the tip transaction
-        if message_type == 'tip' and tip_amount > 0:
-            # Check if user has enough Bondcoins
-            if user.bondcoin_balance < tip_amount:
-                raise serializers.ValidationError("Insufficient Bondcoins for this tip")
-            
-            # Get the recipient (other participant in the chat)
-            recipient = chat.participants.exclude(id=user.id).first()
-            if not recipient:
-                raise serializers.ValidationError("No recipient found for this tip")
-            
-            # Create Bondcoin transaction for the tip
-            from .models import BondcoinTransaction
-            tip_transaction = BondcoinTransaction.objects.create(
-                user=user,
-                transaction_type='spend',
-                amount=-tip_amount,  # Negative for spending
-                status='completed',
-                description=f"Tip sent to {recipient.name}",
-                payment_method='bondcoin'
-            )
-            
-            # Update user's Bondcoin balance
-            user.bondcoin_balance -= tip_amount
-            user.save()
+        from django.db import transaction
+        from rest_framework.exceptions import ValidationError
+        from .bondcoin_utils import transfer, InsufficientBondcoinsError
+        with transaction.atomic():
+            if message_type == 'tip' and tip_amount > 0:
+                # Get the recipient (other participant in the chat)
+                recipient = chat.participants.exclude(id=user.id).first()
+                if not recipient:
+                    raise ValidationError("No recipient found for this tip")
+                
+                # Debit the sender and credit the recipient atomically
+                try:
+                    transfer(user, [(recipient, tip_amount)], debit_type='spend', credit_type='gift_received', description='Tip')
+                except InsufficientBondcoinsError:
+                    raise ValidationError("Insufficient Bondcoins for this tip")
             
-            # Credit the recipient
-            recipient.bondcoin_balance += tip_amount
-            recipient.save()
-            
-            # Create transaction for recipient
-            BondcoinTransaction.objects.create(
-                user=recipient,
-                transaction_type='gift_received',
-                amount=tip_amount,
-                status='completed',
-                description=f"Tip received from {user.name}",
-                payment_method='bondcoin'
+            serializer.save(
+                chat=chat,
+                sender=user,
+                voice_note_url=voice_note_url,
+                image_url=image_url,
+                video_url=video_url,
+                document_url=document_url
             )
-        
-        serializer.save(
-            chat=chat,
-            sender=user,
-            voice_note_url=voice_note_url,
-            image_url=image_url,
-            video_url=video_url,
-            document_url=document_url
-        )
     
     def _save_uploaded_file(self, file, folder):
         """Save uploaded file and return URL"""
@@ -3552,12 +3483,19 @@ class MessageDetailView(generics.RetrieveUpdateDestroyAPIView):
         return MessageSerializer
     
     def get_queryset(self):
+        from .models import Chat, Message
         chat_id = self.kwargs['chat_id']
         user = self.request.user
         
         # Ensure the user is a participant of the chat
         chat = get_object_or_404(Chat, id=chat_id, participants=user, is_active=True)
-        return Message.objects.filter(chat=chat)
+        return Message.objects.filter(chat=chat).select_related('sender', 'reply_to__sender')
+    
+    def get_serializer_context(self):
+        from .chat_utils import get_read_cursors
+        context = super().get_serializer_context()
+        context['read_cursors'] = get_read_cursors(self.kwargs['chat_id'])
+        return context
     
     def perform_update(self, serializer):
         """Mark message as edited"""
@@ -3570,6 +3508,101 @@ class MessageDetailView(generics.RetrieveUpdateDestroyAPIView):
         instance.save()
 
 
+class ChatReadView(APIView):
+    """
+    Acknowledge read messages in a chat by advancing the user's read cursor.
+    Body: {"message_ids": [...]} for a batch of acknowledgements, {"message_id": id},
+    or nothing to mark the whole chat as read.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request, chat_id):
+        from .models import Chat, ChatParticipant
+        from .chat_utils import mark_chat_read
+        
+        chat = get_object_or_404(Chat, id=chat_id, participants=request.user, is_active=True)
+        
+        from django.http import QueryDict
+        
+        if isinstance(request.data, QueryDict):
+            # Form-encoded/multipart lists arrive as repeated keys
+            message_ids = request.data.getlist('message_ids') or None
+        else:
+            message_ids = request.data.get('message_ids')
+        if message_ids is None and request.data.get('message_id') is not None:
+            message_ids = [request.data.get('message_id')]
+        try:
+            if message_ids is not None:
+                if not isinstance(message_ids, (list, tuple)):
+                    raise ValueError
+                message_ids = [int(message_id) for message_id in message_ids]
+        except (TypeError, ValueError):
+            return Response({
+                "message": "message_ids must be a list of message ids",
+                "status": "error"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        mark_chat_read(chat, request.user, message_ids)
+        
+        participant = ChatParticipant.objects.filter(chat=chat, user=request.user).values(
+            'last_read_message_id', 'unread_count'
+        ).first() or {'last_read_message_id': None, 'unread_count': 0}
+        return Response({
+            "message": "Chat marked as read",
+            "status": "success",
+            "last_read_message_id": participant['last_read_message_id'],
+            "unread_count": participant['unread_count']
+        }, status=status.HTTP_200_OK)
+
+
+class PresenceHeartbeatView(APIView):
+    """
+    Record a presence heartbeat for clients without a WebSocket connection.
+    Clients should call it at least every PRESENCE_TTL seconds to stay online.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request):
+        from .presence_utils import record_heartbeat, PRESENCE_TTL
+        record_heartbeat(request.user.id)
+        return Response({
+            "message": "Heartbeat recorded",
+            "status": "success",
+            "ttl": PRESENCE_TTL
+        }, status=status.HTTP_200_OK)
+
+
+class PresenceView(APIView):
+    """
+    Batched online status lookup: ?user_ids=1,2,3 (at most 100 users)
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        from .presence_utils import get_presence
+        try:
+            user_ids = [int(user_id) for user_id in request.GET.get('user_ids', '').split(',') if user_id.strip()]
+        except ValueError:
+            return Response({
+                "message": "user_ids must be a comma-separated list of ids",
+                "status": "error"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        if len(user_ids) > 100:
+            return Response({
+                "message": "At most 100 user_ids per request",
+                "status": "error"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        presence = get_presence(user_ids)
+        return Response({
+            "presence": [
+                {"user_id": user_id, **presence[user_id]}
+                for user_id in user_ids
+            ]
+        }, status=status.HTTP_200_OK)
+
+
 class CallInitiateView(APIView):
     """
     Initiate a voice or video call
@@ -3577,6 +3610,7 @@ class CallInitiateView(APIView):
     permission_classes = [IsAuthenticated]
     
     def post(self, request):
+        from .models import Call, Chat, Message
         from .serializers import CallInitiateSerializer
         import uuid
         
@@ -3606,7 +3640,8 @@ class CallInitiateView(APIView):
                         chat_type='direct',
                         created_by=request.user
                     )
-                    chat.participants.set([request.user, callee])
+                    from .chat_utils import add_chat_participants
+                    add_chat_participants(chat, [request.user, callee])
                 
                 # Generate unique call ID
                 call_id = str(uuid.uuid4())
@@ -3658,6 +3693,7 @@ class CallAnswerView(APIView):
     permission_classes = [IsAuthenticated]
     
     def post(self, request, call_id):
+        from .models import Call, Message
         try:
             call = Call.objects.get(
                 call_id=call_id,
@@ -3727,11 +3763,12 @@ class CallEndView(APIView):
     permission_classes = [IsAuthenticated]
     
     def post(self, request, call_id):
+        from .models import Call, Message
         try:
             call = Call.objects.get(
+                Q(caller=request.user) | Q(callee=request.user),
                 call_id=call_id,
-                status='active',
-                participants=request.user
+                status='active'
             )
             
             call.status = 'ended'
@@ -3843,7 +3880,8 @@ class MatchmakerIntroView(APIView):
                 created_by=request.user,
                 chat_name=f"Introduction: {user1.name} & {user2.name}"
             )
-            chat.participants.set([user1, user2, request.user])
+            from .chat_utils import add_chat_participants
+            add_chat_participants(chat, [user1, user2, request.user])
             
             # Create system messages
             Message.objects.create(
@@ -4035,6 +4073,7 @@ class FeedListView(generics.ListCreateAPIView):
     """
     permission_classes = [IsAuthenticated]
     parser_classes = [MultiPartParser, FormParser]
+    pagination_class = FeedPagination
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -4044,15 +4083,11 @@ class FeedListView(generics.ListCreateAPIView):
         return PostSerializer
     
     def get_queryset(self):
-        from .models import Post
-        user = self.request.user
+        from .feed_utils import get_feed_queryset
         
-        # Get posts from users the current user follows or is connected with
-        # For now, return all public posts (can be enhanced with follow relationships)
-        return Post.objects.filter(
-            is_active=True,
-            visibility='public'
-        ).select_related('author').prefetch_related('comments__author').order_by('-created_at')
+        # Ranked home timeline of the people the user follows (see feed_utils);
+        # comments are rendered as a bounded preview (see comment_utils)
+        return get_feed_queryset(self.request.user).select_related('author').order_by('-rank_score', '-id')
     
     def perform_create(self, serializer):
         """Create post with current user as author"""
@@ -4114,7 +4149,7 @@ class PostDetailView(generics.RetrieveUpdateDestroyAPIView):
     
     def get_queryset(self):
         from .models import Post
-        return Post.objects.filter(is_active=True).select_related('author').prefetch_related('comments__author')
+        return Post.objects.filter(is_active=True).select_related('author')
     
     def perform_destroy(self, instance):
         """Soft delete post by deactivating it"""
@@ -4127,6 +4162,7 @@ class PostCommentListView(generics.ListCreateAPIView):
     List comments for a specific post or add a new comment
     """
     permission_classes = [IsAuthenticated]
+    pagination_class = CommentPagination
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -4136,7 +4172,7 @@ class PostCommentListView(generics.ListCreateAPIView):
         return PostCommentSerializer
     
     def get_queryset(self):
-        from .models import PostComment
+        from .models import Post, PostComment
         post_id = self.kwargs['post_id']
         
         # Ensure the post exists and is active
@@ -4146,10 +4182,11 @@ class PostCommentListView(generics.ListCreateAPIView):
             post=post,
             is_active=True,
             parent_comment__isnull=True  # Only top-level comments
-        ).select_related('author').prefetch_related('replies__author').order_by('created_at')
+        ).select_related('author').order_by('created_at', 'id')
     
     def perform_create(self, serializer):
         """Create comment with current user as author"""
+        from .models import Post
         post_id = self.kwargs['post_id']
         post = get_object_or_404(Post, id=post_id, is_active=True)
         
@@ -4158,9 +4195,9 @@ class PostCommentListView(generics.ListCreateAPIView):
             author=self.request.user
         )
         
-        # Update post comments count
-        post.comments_count = post.comments.filter(is_active=True).count()
-        post.save(update_fields=['comments_count'])
+        # Update post comments count (atomic, once committed)
+        from .counter_utils import increment_counter
+        increment_counter(Post, post.id, 'comments_count')
 
 
 class PostInteractionView(APIView):
@@ -4171,6 +4208,7 @@ class PostInteractionView(APIView):
     
     def post(self, request, post_id):
         from .models import Post, PostInteraction
+        from .counter_utils import increment_counter
         
         try:
             post = Post.objects.get(id=post_id, is_active=True)
@@ -4193,27 +4231,15 @@ class PostInteractionView(APIView):
                 # Remove interaction (toggle)
                 interaction.delete()
                 action = 'removed'
-                
-                # Update post counts
-                if interaction_type == 'like':
-                    post.likes_count = max(0, post.likes_count - 1)
-                elif interaction_type == 'share':
-                    post.shares_count = max(0, post.shares_count - 1)
-                elif interaction_type == 'bond':
-                    post.bonds_count = max(0, post.bonds_count - 1)
+                delta = -1
             else:
                 # Add interaction
                 action = 'added'
-                
-                # Update post counts
-                if interaction_type == 'like':
-                    post.likes_count += 1
-                elif interaction_type == 'share':
-                    post.shares_count += 1
-                elif interaction_type == 'bond':
-                    post.bonds_count += 1
+                delta = 1
             
-            post.save(update_fields=['likes_count', 'shares_count', 'bonds_count'])
+            # Update post counts (atomic, once committed)
+            if interaction_type != 'save':
+                increment_counter(Post, post.id, f'{interaction_type}s_count', delta)
             
             return Response({
                 "message": f"Interaction {action} successfully",
@@ -4237,6 +4263,7 @@ class CommentInteractionView(APIView):
     
     def post(self, request, comment_id):
         from .models import PostComment, CommentInteraction
+        from .counter_utils import increment_counter
         
         try:
             comment = PostComment.objects.get(id=comment_id, is_active=True)
@@ -4253,13 +4280,14 @@ class CommentInteractionView(APIView):
                 # Remove interaction (toggle)
                 interaction.delete()
                 action = 'removed'
-                comment.likes_count = max(0, comment.likes_count - 1)
+                delta = -1
             else:
                 # Add interaction
                 action = 'added'
-                comment.likes_count += 1
+                delta = 1
             
-            comment.save(update_fields=['likes_count'])
+            # Atomic, once committed
+            increment_counter(PostComment, comment.id, 'likes_count', delta)
             
             return Response({
                 "message": f"Comment interaction {action} successfully",
@@ -4327,9 +4355,9 @@ class PostShareView(generics.CreateAPIView):
             post=post
         )
         
-        # Update post shares count
-        post.shares_count += 1
-        post.save(update_fields=['shares_count'])
+        # Update post shares count (atomic, once committed)
+        from .counter_utils import increment_counter
+        increment_counter(Post, post.id, 'shares_count')
 
 
 class StoryListView(generics.ListCreateAPIView):
@@ -4416,24 +4444,44 @@ class StoryDetailView(generics.RetrieveAPIView):
     
     def retrieve(self, request, *args, **kwargs):
         """Mark story as viewed by current user"""
-        from .models import StoryView
+        from .models import Story, StoryView
+        from .counter_utils import increment_counter
         
         story = self.get_object()
         
         # Mark as viewed if not already viewed
-        StoryView.objects.get_or_create(
+        _, created = StoryView.objects.get_or_create(
             story=story,
             viewer=request.user
         )
         
-        # Update views count
-        story.views_count = story.views.count()
-        story.save(update_fields=['views_count'])
+        # Count first views only (atomic, once committed; shown in this response straight away)
+        if created:
+            increment_counter(Story, story.id, 'views_count')
+            story.views_count += 1
         
         serializer = self.get_serializer(story)
         return Response(serializer.data)
 
 
+class StoryTrayView(APIView):
+    """
+    Story tray: active stories grouped by author, with the viewer's seen state
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        from .story_utils import get_tray_expiry, get_viewer_story_tray
+        
+        tray = get_viewer_story_tray(request.user)
+        
+        return Response({
+            "results": tray,
+            "expires_at": get_tray_expiry(tray),
+            "status": "success"
+        }, status=status.HTTP_200_OK)
+
+
 class StoryReactionView(APIView):
     """
     Handle story reactions
@@ -4442,6 +4490,7 @@ class StoryReactionView(APIView):
     
     def post(self, request, story_id):
         from .models import Story, StoryReaction
+        from .counter_utils import increment_counter
         
         try:
             story = Story.objects.get(id=story_id, is_active=True)
@@ -4464,13 +4513,14 @@ class StoryReactionView(APIView):
                 # Remove reaction (toggle)
                 reaction.delete()
                 action = 'removed'
-                story.reactions_count = max(0, story.reactions_count - 1)
+                delta = -1
             else:
                 # Add reaction
                 action = 'added'
-                story.reactions_count += 1
+                delta = 1
             
-            story.save(update_fields=['reactions_count'])
+            # Atomic, once committed
+            increment_counter(Story, story.id, 'reactions_count', delta)
             
             return Response({
                 "message": f"Story reaction {action} successfully",
@@ -4494,7 +4544,6 @@ class FeedSearchView(APIView):
     
     def get(self, request):
         from .models import Post, FeedSearch
-        from django.db.models import Q
         
         query = request.GET.get('q', '').strip()
         if not query:
@@ -4503,33 +4552,55 @@ class FeedSearchView(APIView):
                 "status": "error"
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Search posts by content, hashtags, and author name
         posts = Post.objects.filter(
-            Q(content__icontains=query) |
-            Q(hashtags__icontains=query) |
-            Q(author__name__icontains=query) |
-            Q(location__icontains=query),
             is_active=True,
             visibility='public'
-        ).select_related('author').prefetch_related('comments__author').order_by('-created_at')
+        ).select_related('author')
+        
+        if query.startswith('#'):
+            # Hashtag search through the normalized hashtag table, newest first
+            from .hashtag_utils import filter_by_hashtag, normalize_hashtag
+            from .models import PostHashtag
+            posts = filter_by_hashtag(posts, query)
+            ordering = ('-created_at', '-id')
+            index_matches = PostHashtag.objects.filter(hashtag__name=normalize_hashtag(query))
+        else:
+            # Full-text search over content, hashtags, author name and location, best match first
+            from .search_utils import search_posts
+            posts, index_matches = search_posts(posts, query)
+            ordering = ('-search_rank', '-id')
+        posts = posts.order_by(*ordering)
+        
+        # Paginate; the total comes from the search index, counted once
+        from .pagination import paginate_queryset
+        try:
+            page_posts, pagination = paginate_queryset(request, posts, ordering, count_queryset=index_matches)
+        except ValueError as e:
+            return Response({
+                "message": "Invalid pagination parameters",
+                "status": "error",
+                "errors": str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        results_count = pagination.pop('total_count')
         
         # Store search query for analytics
         FeedSearch.objects.create(
             user=request.user,
             query=query,
-            results_count=posts.count()
+            results_count=results_count
         )
         
         # Serialize results
         from .serializers import PostSerializer
-        serializer = PostSerializer(posts, many=True, context={'request': request})
+        serializer = PostSerializer(page_posts, many=True, context={'request': request})
         
         return Response({
             "message": "Search completed successfully",
             "status": "success",
             "query": query,
-            "results_count": posts.count(),
-            "posts": serializer.data
+            "results_count": results_count,
+            "posts": serializer.data,
+            **pagination
         }, status=status.HTTP_200_OK)
 
 
@@ -4540,7 +4611,7 @@ class FeedSuggestionsView(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
-        from .models import FeedSearch, Post
+        from .models import FeedSearch
         from django.db.models import Count
         
         query = request.GET.get('q', '').strip()
@@ -4553,26 +4624,14 @@ class FeedSuggestionsView(APIView):
                 count=Count('query')
             ).order_by('-count')[:5]
             
-            # Also get hashtag suggestions from posts
-            hashtag_suggestions = Post.objects.filter(
-                hashtags__icontains=query,
-                is_active=True
-            ).values_list('hashtags', flat=True)
-            
-            # Flatten and deduplicate hashtags
-            all_hashtags = []
-            for hashtags in hashtag_suggestions:
-                if hashtags:
-                    all_hashtags.extend(hashtags)
-            
-            # Filter hashtags that contain the query
-            filtered_hashtags = [tag for tag in set(all_hashtags) if query.lower() in tag.lower()]
+            # Hashtag suggestions from the prefix index, most used first
+            from .hashtag_utils import format_hashtag, suggest_hashtags
             
             return Response({
                 "message": "Suggestions retrieved successfully",
                 "status": "success",
                 "suggestions": [s['query'] for s in suggestions],
-                "hashtags": filtered_hashtags[:5]
+                "hashtags": [format_hashtag(name) for name in suggest_hashtags(query)]
             }, status=status.HTTP_200_OK)
         else:
             # Get popular searches
@@ -4580,10 +4639,13 @@ class FeedSuggestionsView(APIView):
                 count=Count('query')
             ).order_by('-count')[:10]
             
+            from .hashtag_utils import format_hashtag, trending_hashtags
+            
             return Response({
                 "message": "Popular searches retrieved successfully",
                 "status": "success",
-                "popular_searches": [s['query'] for s in popular_searches]
+                "popular_searches": [s['query'] for s in popular_searches],
+                "trending_hashtags": [format_hashtag(name) for name in trending_hashtags()]
             }, status=status.HTTP_200_OK)
 
 
@@ -5041,7 +5103,7 @@ class BondcoinPurchaseView(APIView):
                     "status": "error"
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            from .models import BondcoinPackage, BondcoinTransaction
+            from .models import BondcoinPackage
             
             try:
                 package = BondcoinPackage.objects.get(id=package_id, is_active=True)
@@ -5051,21 +5113,17 @@ class BondcoinPurchaseView(APIView):
                     "status": "error"
                 }, status=status.HTTP_404_NOT_FOUND)
             
-            # Create transaction
-            transaction = BondcoinTransaction.objects.create(
-                user=request.user,
-                transaction_type='purchase',
-                amount=package.bondcoin_amount,
+            # Record the purchase and credit the balance atomically
+            from .bondcoin_utils import credit
+            transaction = credit(
+                request.user,
+                package.bondcoin_amount,
+                'purchase',
+                f"Purchased {package.name}",
                 package=package,
-                payment_method=payment_method,
-                description=f"Purchased {package.name}",
-                status='completed'
+                payment_method=payment_method
             )
             
-            # Update user balance
-            request.user.bondcoin_balance += package.bondcoin_amount
-            request.user.save(update_fields=['bondcoin_balance'])
-            
             from .serializers import BondcoinTransactionSerializer
             serializer = BondcoinTransactionSerializer(transaction)
             
@@ -5168,26 +5226,19 @@ class SendGiftView(APIView):
             
             serializer = GiftTransactionCreateSerializer(data=request.data, context={'request': request})
             if serializer.is_valid():
-                # Check if user has enough Bondcoins
-                gift = serializer.validated_data['gift']
-                quantity = serializer.validated_data.get('quantity', 1)
-                total_cost = gift.cost_bondcoins * quantity
+                from .bondcoin_utils import InsufficientBondcoinsError
                 
-                if request.user.bondcoin_balance < total_cost:
+                # Create gift transaction (debits the sender's balance atomically)
+                try:
+                    gift_transaction = serializer.save()
+                except InsufficientBondcoinsError as e:
                     return Response({
                         "message": "Insufficient Bondcoin balance",
                         "status": "error",
-                        "required": total_cost,
-                        "current_balance": request.user.bondcoin_balance
+                        "required": e.required,
+                        "current_balance": e.balance
                     }, status=status.HTTP_400_BAD_REQUEST)
                 
-                # Create gift transaction
-                gift_transaction = serializer.save()
-                
-                # Update user balance
-                request.user.bondcoin_balance -= total_cost
-                request.user.save(update_fields=['bondcoin_balance'])
-                
                 from .serializers import GiftTransactionSerializer
                 response_serializer = GiftTransactionSerializer(gift_transaction)
                 
@@ -5368,14 +5419,19 @@ class PaymentTransactionDetailView(generics.RetrieveAPIView):
 
 
 class ProcessPaymentView(APIView):
-    """Process payment for subscriptions or Bondcoin purchases"""
+    """
+    Process payment for subscriptions or Bondcoin purchases.
+    The payment is captured in the background: the response is 202 with the
+    pending payment, whose status can be polled at status_url.
+    """
     permission_classes = [IsAuthenticated]
     
     def post(self, request):
         try:
-            from .models import PaymentTransaction, PaymentMethod, UserSubscription, BondcoinPackage, BondcoinTransaction
+            from .models import PaymentTransaction
+            from .payment_utils import enqueue_capture
             from .serializers import PaymentTransactionCreateSerializer
-            from django.utils import timezone
+            from django.urls import reverse
             from decimal import Decimal
             
             # Validate payment data
@@ -5389,87 +5445,45 @@ class ProcessPaymentView(APIView):
             
             validated_data = serializer.validated_data
             transaction_type = validated_data['transaction_type']
-            payment_method = validated_data['payment_method']
             amount_usd = validated_data['amount_usd']
             
-            # Create payment transaction
+            # Only the user's own subscription or Bondcoin transaction can be paid for
+            subscription = validated_data.get('subscription') if transaction_type == 'subscription' else None
+            bondcoin_transaction = validated_data.get('bondcoin_transaction') if transaction_type == 'bondcoin_purchase' else None
+            if (subscription and subscription.user_id != request.user.id) or (
+                bondcoin_transaction and bondcoin_transaction.user_id != request.user.id
+            ):
+                return Response({
+                    "message": "Subscription or Bondcoin transaction not found",
+                    "status": "error"
+                }, status=status.HTTP_404_NOT_FOUND)
+            
+            # Create the payment once, fully populated; capture happens in the background
             payment_transaction = PaymentTransaction.objects.create(
                 user=request.user,
                 transaction_type=transaction_type,
-                payment_method=payment_method,
+                payment_method=validated_data['payment_method'],
                 amount_usd=amount_usd,
                 processing_fee=validated_data.get('processing_fee', Decimal('0.00')),
                 total_amount=validated_data.get('total_amount', amount_usd),
                 currency=validated_data.get('currency', 'USD'),
                 description=validated_data.get('description', ''),
                 metadata=validated_data.get('metadata', {}),
+                subscription=subscription,
+                bondcoin_transaction=bondcoin_transaction,
                 status='pending'
             )
-            
-            # Process based on transaction type
-            if transaction_type == 'subscription':
-                subscription_id = validated_data.get('subscription')
-                if subscription_id:
-                    subscription = UserSubscription.objects.get(id=subscription_id, user=request.user)
-                    payment_transaction.subscription = subscription
-                    payment_transaction.save()
-                    
-                    # Update subscription status
-                    subscription.status = 'active'
-                    subscription.save()
-                    
-                    # Create Bondcoin transaction for subscription payment
-                    BondcoinTransaction.objects.create(
-                        user=request.user,
-                        transaction_type='subscription',
-                        amount=-subscription.plan.price_bondcoins,
-                        subscription=subscription,
-                        payment_method='external_payment',
-                        description=f"Subscription: {subscription.plan.display_name}",
-                        status='completed'
-                    )
-                    
-                    # Update user's Bondcoin balance
-                    request.user.bondcoin_balance -= subscription.plan.price_bondcoins
-                    request.user.save(update_fields=['bondcoin_balance'])
-            
-            elif transaction_type == 'bondcoin_purchase':
-                bondcoin_transaction_id = validated_data.get('bondcoin_transaction')
-                if bondcoin_transaction_id:
-                    bondcoin_transaction = BondcoinTransaction.objects.get(id=bondcoin_transaction_id, user=request.user)
-                    payment_transaction.bondcoin_transaction = bondcoin_transaction
-                    payment_transaction.save()
-                    
-                    # Update Bondcoin transaction status
-                    bondcoin_transaction.status = 'completed'
-                    bondcoin_transaction.save()
-                    
-                    # Update user's Bondcoin balance
-                    request.user.bondcoin_balance += bondcoin_transaction.amount
-                    request.user.save(update_fields=['bondcoin_balance'])
-            
-            # Simulate payment processing (replace with actual payment provider integration)
-            payment_transaction.status = 'processing'
-            payment_transaction.save()
-            
-            # Simulate successful payment after 1 second
-            import time
-            time.sleep(1)
-            
-            payment_transaction.status = 'completed'
-            payment_transaction.processed_at = timezone.now()
-            payment_transaction.provider = 'stripe'  # Replace with actual provider
-            payment_transaction.provider_transaction_id = f"txn_{payment_transaction.id}_{int(timezone.now().timestamp())}"
-            payment_transaction.save()
+            enqueue_capture(payment_transaction)
             
             from .serializers import PaymentTransactionSerializer
             serializer = PaymentTransactionSerializer(payment_transaction)
             
             return Response({
-                "message": "Payment processed successfully",
+                "message": "Payment accepted for processing",
                 "status": "success",
-                "data": serializer.data
-            }, status=status.HTTP_201_CREATED)
+                "data": serializer.data,
+                "status_url": reverse('payment-transaction-detail', kwargs={'pk': payment_transaction.id})
+            }, status=status.HTTP_202_ACCEPTED)
             
         except Exception as e:
             return Response({
@@ -5479,137 +5493,59 @@ class ProcessPaymentView(APIView):
 
 
 class PaymentWebhookView(APIView):
-    """Handle payment webhooks from external providers"""
-    permission_classes = []  # No authentication required for webhooks
+    """
+    Receive payment webhooks from external providers.
+    Events are accepted only with a valid provider signature, stored
+    idempotently and acknowledged immediately; processing happens in the
+    background (see webhook_utils).
+    """
+    permission_classes = []  # Authenticated by the provider's signature instead
     
     def post(self, request, provider):
+        from .webhook_utils import check_webhook_signature, ingest_webhook
+        import json
+        
         try:
-            from .models import PaymentWebhook, PaymentTransaction
-            from .serializers import PaymentWebhookCreateSerializer
-            from django.utils import timezone
-            import json
-            
-            # Get webhook data
-            payload = request.body.decode('utf-8')
-            event_data = json.loads(payload) if payload else {}
-            
-            # Extract event information
-            event_id = event_data.get('id', f"webhook_{int(timezone.now().timestamp())}")
-            event_type = event_data.get('type', 'unknown')
-            
-            # Create webhook record
-            webhook_data = {
-                'provider': provider,
-                'event_type': event_type,
-                'event_id': event_id,
-                'payload': event_data
-            }
-            
-            webhook = PaymentWebhook.objects.create(**webhook_data)
-            
-            # Process webhook based on provider and event type
-            if provider == 'stripe':
-                self._process_stripe_webhook(webhook, event_data)
-            elif provider == 'paypal':
-                self._process_paypal_webhook(webhook, event_data)
-            
-            # Mark webhook as processed
-            webhook.processed = True
-            webhook.processed_at = timezone.now()
-            webhook.save()
-            
+            event_data = json.loads(request.body.decode('utf-8') or '{}')
+        except (UnicodeDecodeError, ValueError):
             return Response({
-                "message": "Webhook processed successfully",
-                "status": "success"
-            }, status=status.HTTP_200_OK)
-            
-        except Exception as e:
-            # Mark webhook as failed
-            if 'webhook' in locals():
-                webhook.processed = False
-                webhook.processing_error = str(e)
-                webhook.save()
-            
+                "message": "Invalid webhook payload",
+                "status": "error"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(event_data, dict):
             return Response({
-                "message": f"Webhook processing failed: {str(e)}",
+                "message": "Invalid webhook payload",
                 "status": "error"
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-    
-    def _process_stripe_webhook(self, webhook, event_data):
-        """Process Stripe webhook events"""
-        from .models import PaymentTransaction
-        from django.utils import timezone
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        event_type = event_data.get('type')
+        signature_error = check_webhook_signature(provider, request.headers, request.body, event_data)
+        if signature_error:
+            return Response({
+                "message": signature_error,
+                "status": "error"
+            }, status=status.HTTP_401_UNAUTHORIZED)
         
-        if event_type == 'payment_intent.succeeded':
-            # Handle successful payment
-            payment_intent = event_data.get('data', {}).get('object', {})
-            transaction_id = payment_intent.get('metadata', {}).get('transaction_id')
-            
-            if transaction_id:
-                try:
-                    transaction = PaymentTransaction.objects.get(id=transaction_id)
-                    transaction.status = 'completed'
-                    transaction.provider_transaction_id = payment_intent.get('id')
-                    transaction.provider_response = event_data
-                    transaction.processed_at = timezone.now()
-                    transaction.save()
-                except PaymentTransaction.DoesNotExist:
-                    pass
-        
-        elif event_type == 'payment_intent.payment_failed':
-            # Handle failed payment
-            payment_intent = event_data.get('data', {}).get('object', {})
-            transaction_id = payment_intent.get('metadata', {}).get('transaction_id')
-            
-            if transaction_id:
-                try:
-                    transaction = PaymentTransaction.objects.get(id=transaction_id)
-                    transaction.status = 'failed'
-                    transaction.provider_transaction_id = payment_intent.get('id')
-                    transaction.provider_response = event_data
-                    transaction.save()
-                except PaymentTransaction.DoesNotExist:
-                    pass
-    
-    def _process_paypal_webhook(self, webhook, event_data):
-        """Process PayPal webhook events"""
-        from .models import PaymentTransaction
-        from django.utils import timezone
+        webhook, created = ingest_webhook(provider, event_data, request.body)
         
-        event_type = event_data.get('event_type')
+        return Response({
+            "message": "Webhook received",
+            "status": "success",
+            "duplicate": not created
+        }, status=status.HTTP_200_OK)
+
+
+class PaymentWebhookMetricsView(APIView):
+    """Admin view of webhook processing backlog and lag per provider"""
+    permission_classes = [AdminJWTPermission]
+    
+    def get(self, request):
+        from .webhook_utils import get_webhook_metrics
         
-        if event_type == 'PAYMENT.SALE.COMPLETED':
-            # Handle completed payment
-            resource = event_data.get('resource', {})
-            transaction_id = resource.get('custom', {}).get('transaction_id')
-            
-            if transaction_id:
-                try:
-                    transaction = PaymentTransaction.objects.get(id=transaction_id)
-                    transaction.status = 'completed'
-                    transaction.provider_transaction_id = resource.get('id')
-                    transaction.provider_response = event_data
-                    transaction.processed_at = timezone.now()
-                    transaction.save()
-                except PaymentTransaction.DoesNotExist:
-                    pass
-        
-        elif event_type == 'PAYMENT.SALE.DENIED':
-            # Handle denied payment
-            resource = event_data.get('resource', {})
-            transaction_id = resource.get('custom', {}).get('transaction_id')
-            
-            if transaction_id:
-                try:
-                    transaction = PaymentTransaction.objects.get(id=transaction_id)
-                    transaction.status = 'failed'
-                    transaction.provider_transaction_id = resource.get('id')
-                    transaction.provider_response = event_data
-                    transaction.save()
-                except PaymentTransaction.DoesNotExist:
-                    pass
+        return Response({
+            "message": "Webhook metrics retrieved successfully",
+            "status": "success",
+            "providers": get_webhook_metrics()
+        }, status=status.HTTP_200_OK)
 
 
 class RefundPaymentView(APIView):
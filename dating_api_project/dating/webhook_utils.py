@@ -0,0 +1,298 @@
+"""
+Payment webhook pipeline - signature checks, idempotent ingestion, background processing
+
+The webhook endpoint is public, so every event must prove it comes from its
+provider before it is recorded: Stripe events by the HMAC-SHA256 signature
+in their Stripe-Signature header (STRIPE_WEBHOOK_SECRET), PayPal events by
+PayPal's verify-webhook-signature API (PAYPAL_WEBHOOK_ID and API
+credentials). Events of other or unconfigured providers are rejected.
+
+Ingestion only records the event: one idempotent insert keyed on
+(provider, event_id), so provider retries of an event already received are
+acknowledged without being stored or processed again. Processing runs on
+the background job pool in batches:
+
+- a batch of due events is claimed by leasing them (next_attempt_at moved
+  past the lease) so concurrent workers never process the same event
+- each event is applied in its own database transaction
+- failures are retried with exponential backoff up to WEBHOOK_MAX_ATTEMPTS
+- successes are marked processed with one UPDATE per batch
+"""
+
+import hashlib
+import hmac
+import json
+import logging
+import time
+from datetime import timedelta
+from typing import Optional
+
+import requests
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Max, Min, Q
+from django.utils import timezone
+
+from .models import PaymentWebhook
+from .payment_utils import complete_payment, fail_payment
+from .task_utils import submit_job
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_BATCH_SIZE = getattr(settings, 'WEBHOOK_BATCH_SIZE', 50)
+WEBHOOK_MAX_ATTEMPTS = getattr(settings, 'WEBHOOK_MAX_ATTEMPTS', 8)
+WEBHOOK_RETRY_BASE_DELAY = timedelta(seconds=getattr(settings, 'WEBHOOK_RETRY_BASE_DELAY', 30))
+WEBHOOK_RETRY_MAX_DELAY = timedelta(hours=6)
+# How long a claimed event is reserved for the worker processing it
+WEBHOOK_LEASE = timedelta(minutes=5)
+# Window of processed events the lag metrics are computed over
+WEBHOOK_METRICS_WINDOW = timedelta(hours=1)
+# Oldest Stripe signature timestamp accepted, against replayed events
+STRIPE_SIGNATURE_TOLERANCE = timedelta(minutes=5)
+PAYPAL_VERIFY_TIMEOUT = 10  # seconds
+# verify-webhook-signature field -> PayPal transmission header
+PAYPAL_SIGNATURE_HEADERS = {
+    'auth_algo': 'PAYPAL-AUTH-ALGO',
+    'cert_url': 'PAYPAL-CERT-URL',
+    'transmission_id': 'PAYPAL-TRANSMISSION-ID',
+    'transmission_sig': 'PAYPAL-TRANSMISSION-SIG',
+    'transmission_time': 'PAYPAL-TRANSMISSION-TIME',
+}
+
+
+def check_webhook_signature(provider: str, headers, raw_body: bytes, event_data: dict) -> Optional[str]:
+    """
+    Check that an event was sent by its provider.
+    Returns None if it was, otherwise why it is rejected.
+    """
+    if provider == 'stripe':
+        return check_stripe_signature(headers, raw_body)
+    if provider == 'paypal':
+        return check_paypal_signature(headers, event_data)
+    return f'Unknown webhook provider: {provider}'
+
+
+def check_stripe_signature(headers, raw_body: bytes) -> Optional[str]:
+    """Stripe-Signature is t=<timestamp>,v1=<HMAC-SHA256 of "<timestamp>.<body>">[,v1=...]"""
+    secret = getattr(settings, 'STRIPE_WEBHOOK_SECRET', '')
+    if not secret:
+        return 'Stripe webhooks are not configured'
+
+    timestamp, signatures = None, []
+    for item in headers.get('Stripe-Signature', '').split(','):
+        key, _, value = item.strip().partition('=')
+        if key == 't':
+            timestamp = value
+        elif key == 'v1':
+            signatures.append(value)
+    if not timestamp or not signatures:
+        return 'Missing webhook signature'
+    try:
+        age = time.time() - int(timestamp)
+    except ValueError:
+        return 'Invalid webhook signature'
+    if abs(age) > STRIPE_SIGNATURE_TOLERANCE.total_seconds():
+        return 'Webhook signature has expired'
+
+    expected = hmac.new(secret.encode(), timestamp.encode() + b'.' + raw_body, hashlib.sha256).hexdigest()
+    if not any(hmac.compare_digest(expected, signature) for signature in signatures):
+        return 'Invalid webhook signature'
+    return None
+
+
+def check_paypal_signature(headers, event_data: dict) -> Optional[str]:
+    """Ask PayPal to verify the event's transmission signature against our webhook id"""
+    webhook_id = getattr(settings, 'PAYPAL_WEBHOOK_ID', '')
+    client_id = getattr(settings, 'PAYPAL_CLIENT_ID', '')
+    client_secret = getattr(settings, 'PAYPAL_CLIENT_SECRET', '')
+    if not (webhook_id and client_id and client_secret):
+        return 'PayPal webhooks are not configured'
+
+    transmission = {field: headers.get(header) for field, header in PAYPAL_SIGNATURE_HEADERS.items()}
+    if not all(transmission.values()):
+        return 'Missing webhook signature'
+
+    api_base = getattr(settings, 'PAYPAL_API_BASE', 'https://api-m.paypal.com')
+    try:
+        token_response = requests.post(
+            f'{api_base}/v1/oauth2/token', auth=(client_id, client_secret),
+            data={'grant_type': 'client_credentials'}, timeout=PAYPAL_VERIFY_TIMEOUT
+        )
+        token_response.raise_for_status()
+        response = requests.post(
+            f'{api_base}/v1/notifications/verify-webhook-signature',
+            json=dict(transmission, webhook_id=webhook_id, webhook_event=event_data),
+            headers={'Authorization': f"Bearer {token_response.json()['access_token']}"},
+            timeout=PAYPAL_VERIFY_TIMEOUT
+        )
+        response.raise_for_status()
+        verification_status = response.json().get('verification_status')
+    except (requests.RequestException, ValueError, KeyError) as e:
+        logger.warning('PayPal webhook signature check failed: %s', e)
+        return 'Webhook signature could not be verified'
+    if verification_status != 'SUCCESS':
+        return 'Invalid webhook signature'
+    return None
+
+
+def ingest_webhook(provider: str, event_data: dict, raw_body: bytes = b''):
+    """
+    Record a webhook event exactly once and queue it for processing.
+    Returns (webhook, created); created is False for a redelivered event.
+    """
+    event_id = event_data.get('id') or 'sha256_' + hashlib.sha256(
+        raw_body or json.dumps(event_data, sort_keys=True).encode()
+    ).hexdigest()
+    event_type = event_data.get('type') or event_data.get('event_type') or 'unknown'
+
+    webhook, created = PaymentWebhook.objects.get_or_create(
+        provider=provider,
+        event_id=str(event_id)[:255],
+        defaults={'event_type': str(event_type)[:100], 'payload': event_data}
+    )
+    if created:
+        submit_job(process_due_webhooks)
+    return webhook, created
+
+
+def process_due_webhooks(batch_size: int = WEBHOOK_BATCH_SIZE) -> int:
+    """
+    Process every webhook that is due, batch by batch.
+    Returns the number of events processed successfully.
+    """
+    processed = 0
+    while True:
+        batch = claim_webhook_batch(batch_size)
+        if not batch:
+            return processed
+        processed += process_webhook_batch(batch)
+
+
+def claim_webhook_batch(batch_size: int = WEBHOOK_BATCH_SIZE):
+    """
+    Lease a batch of due, unprocessed events to this worker and count the attempt
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            PaymentWebhook.objects.select_for_update(skip_locked=True).filter(
+                Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now),
+                processed=False,
+                attempts__lt=WEBHOOK_MAX_ATTEMPTS
+            ).order_by('created_at')[:batch_size]
+        )
+        if batch:
+            PaymentWebhook.objects.filter(id__in=[webhook.id for webhook in batch]).update(
+                attempts=F('attempts') + 1,
+                next_attempt_at=now + WEBHOOK_LEASE
+            )
+    for webhook in batch:
+        webhook.attempts += 1
+    return batch
+
+
+def process_webhook_batch(batch) -> int:
+    """
+    Apply a claimed batch. Returns the number of events processed successfully.
+    """
+    succeeded = []
+    for webhook in batch:
+        try:
+            with transaction.atomic():
+                payment_id = apply_webhook_event(webhook)
+            succeeded.append((webhook.id, payment_id))
+        except Exception as e:
+            logger.warning('Webhook %s/%s failed (attempt %s): %s', webhook.provider, webhook.event_id, webhook.attempts, e)
+            delay = min(WEBHOOK_RETRY_BASE_DELAY * 2 ** (webhook.attempts - 1), WEBHOOK_RETRY_MAX_DELAY)
+            PaymentWebhook.objects.filter(id=webhook.id).update(
+                processing_error=str(e),
+                next_attempt_at=timezone.now() + delay if webhook.attempts < WEBHOOK_MAX_ATTEMPTS else None
+            )
+
+    if succeeded:
+        now = timezone.now()
+        PaymentWebhook.objects.filter(id__in=[webhook_id for webhook_id, _ in succeeded]).update(
+            processed=True, processed_at=now, processing_error=None, next_attempt_at=None
+        )
+        # Link events to the payments they concerned
+        for webhook_id, payment_id in succeeded:
+            if payment_id:
+                PaymentWebhook.objects.filter(id=webhook_id).update(transaction_id=payment_id)
+    return len(succeeded)
+
+
+def apply_webhook_event(webhook):
+    """
+    Apply one event to its payment. Returns the payment id it concerned, if any.
+    Payment state changes are conditional, so replays and events arriving
+    after the payment has moved on are no-ops.
+    """
+    from .models import PaymentTransaction
+
+    if webhook.provider == 'stripe':
+        event_type = webhook.payload.get('type')
+        provider_object = webhook.payload.get('data', {}).get('object', {})
+        transaction_id = provider_object.get('metadata', {}).get('transaction_id')
+        succeeded = event_type == 'payment_intent.succeeded'
+        failed = event_type == 'payment_intent.payment_failed'
+    elif webhook.provider == 'paypal':
+        event_type = webhook.payload.get('event_type')
+        provider_object = webhook.payload.get('resource', {})
+        transaction_id = (provider_object.get('custom') or {}).get('transaction_id')
+        succeeded = event_type == 'PAYMENT.SALE.COMPLETED'
+        failed = event_type == 'PAYMENT.SALE.DENIED'
+    else:
+        return None
+
+    if not transaction_id or not (succeeded or failed):
+        return None
+    if not PaymentTransaction.objects.filter(id=transaction_id).exists():
+        return None
+
+    fields = {
+        'provider': webhook.provider,
+        'provider_transaction_id': provider_object.get('id'),
+        'provider_response': webhook.payload,
+    }
+    if succeeded:
+        complete_payment(transaction_id, ('pending', 'processing'), **fields)
+    else:
+        fail_payment(transaction_id, ('pending', 'processing'), **fields)
+    return int(transaction_id)
+
+
+def get_webhook_metrics():
+    """
+    Per-provider processing metrics: backlog, oldest waiting event, events
+    that exhausted their retries, and the ingestion-to-processed lag of the
+    events processed in the last WEBHOOK_METRICS_WINDOW
+    """
+    now = timezone.now()
+    unprocessed = Q(processed=False, attempts__lt=WEBHOOK_MAX_ATTEMPTS)
+    recent = Q(processed=True, processed_at__gte=now - WEBHOOK_METRICS_WINDOW)
+    lag = ExpressionWrapper(F('processed_at') - F('created_at'), output_field=DurationField())
+
+    rows = PaymentWebhook.objects.values('provider').annotate(
+        backlog=Count('id', filter=unprocessed),
+        oldest_unprocessed_at=Min('created_at', filter=unprocessed),
+        dead=Count('id', filter=Q(processed=False, attempts__gte=WEBHOOK_MAX_ATTEMPTS)),
+        processed_recently=Count('id', filter=recent),
+        average_lag=Avg(lag, filter=recent),
+        max_lag=Max(lag, filter=recent),
+    ).order_by('provider')
+
+    return [
+        {
+            'provider': row['provider'],
+            'backlog': row['backlog'],
+            'oldest_unprocessed_age_seconds': (
+                (now - row['oldest_unprocessed_at']).total_seconds() if row['oldest_unprocessed_at'] else 0
+            ),
+            'dead_letters': row['dead'],
+            'processed_last_hour': row['processed_recently'],
+            'average_lag_seconds': row['average_lag'].total_seconds() if row['average_lag'] else None,
+            'max_lag_seconds': row['max_lag'].total_seconds() if row['max_lag'] else None,
+        }
+        for row in rows
+    ]